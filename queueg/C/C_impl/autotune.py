@@ -0,0 +1,194 @@
+
+
+
+
+from os import (
+    environ as os_environ,
+    replace as os_replace,
+    getpid as os_getpid,
+)
+from os.path import (
+    join as os_path_join,
+    exists as os_path_exists,
+    isfile as os_path_isfile,
+)
+import hashlib
+import json
+import socket
+import threading
+
+from mv1fw import (
+    create_dir,
+)
+
+from ..._impl.ossys.ossys import default_conf_stemlist
+from .compilecache import (
+    compiler_version,
+    dependencies,
+    file_digest,
+)
+
+
+# flag combinations tried by autotune(), in place of the optimization
+# flags of the always_compiler_args
+# (none changes the results: -ffast-math and the like are opt-in, via `candidates`)
+autotune_candidates = [
+    ["-O2"],
+    ["-O3"],
+    ["-O2", "-march=native"],
+    ["-O3", "-march=native"],
+    ["-O3", "-march=native", "-funroll-loops"],
+]
+
+# prefixes of the flags that a tuning replaces
+optimization_prefixes = ["-O", "-march=", "-mtune=", "-funroll-loops"]
+
+# file name of the tunings, in the QueueG cache
+tunings_file = "tunings.json"
+
+_lock = threading.Lock()
+
+
+
+def strip_optimization(compiler_args):
+    """
+    Compiler arguments, without the flags that a tuning replaces.
+
+    :meta private:
+    """
+    return [arg for arg in compiler_args if not any([arg.startswith(prefix) for prefix in optimization_prefixes])]
+
+
+
+class TuningStore:
+    """
+    Winning compiler flags found by :any:`CRunBase.autotune`,
+    per target (the compiler, the other compiler arguments, and the contents
+    of the sources and of their headers) and per host, kept in a JSON file in the QueueG cache.
+
+    Parameters:
+
+        path (optional string):
+            Path of the file. (Default: ``cache/tunings.json`` in the QueueG configuration directory)
+
+    :meta private:
+    """
+
+    def __init__(
+            self,
+            path = None,
+    ):
+        if path is None:
+            path = os_path_join(create_dir(os_environ["HOME"], default_conf_stemlist + ["cache"]), tunings_file)
+        self.path = path
+
+
+    @staticmethod
+    def key(compiler_name, source_names, compiler_args, include_paths, cwd):
+        """
+        Key of a target: the compiler version, the compiler arguments
+        other than the flags that a tuning replaces, and the contents
+        of the sources and of the headers they include
+        (as reported by the compiler, cf. ``-MM``).
+
+        Returns:
+
+            string, or None if a source cannot be read.
+
+        """
+        h = hashlib.sha256()
+        h.update(compiler_version(compiler_name).encode())
+        args = [compiler_name] + strip_optimization(compiler_args) + include_paths
+        h.update(json.dumps(args).encode())
+        for name in source_names:
+            path = os_path_join(cwd, name)
+            if not os_path_isfile(path):
+                return None
+            h.update(name.encode())
+            h.update(file_digest(path).encode())
+        # > a compiler that cannot list the headers: the key covers the sources only
+        headers = dependencies(compiler_name, source_names, strip_optimization(compiler_args), include_paths, cwd)
+        for path in (headers if headers is not None else []):
+            h.update(path.encode())
+            h.update(file_digest(path).encode())
+        return h.hexdigest()
+
+
+    def _read(self):
+        """
+        :meta private:
+        """
+        if not os_path_exists(self.path):
+            return {}
+        try:
+            with open(self.path, "r") as f:
+                return json.load(f)
+        except ValueError:
+            return {}
+
+
+    def tuned(self, host = None):
+        """
+        Whether some target has a tuning on a host.
+
+        Arguments:
+
+            host (optional string):
+                (Default: this host)
+
+        Returns:
+
+            boolean
+
+        """
+        host_ = host if host is not None else socket.gethostname()
+        return any([host_ in hosts for hosts in self._read().values()])
+
+
+    def lookup(self, key, host = None):
+        """
+        Tuning of a target on a host.
+
+        Arguments:
+
+            key (string):
+            host (optional string):
+                (Default: this host)
+
+        Returns:
+
+            dict with keys 'flags' and 'timings', or None.
+
+        """
+        host_ = host if host is not None else socket.gethostname()
+        tunings = self._read()
+        if key in tunings and host_ in tunings[key]:
+            return tunings[key][host_]
+        return None
+
+
+    def store(self, key, flags, timings, host = None):
+        """
+        Store the tuning of a target on a host.
+
+        Arguments:
+
+            key (string):
+            flags (list of string):
+                winning flags
+            timings (dict):
+                maps the candidate flags (joined by spaces) to a time in seconds.
+            host (optional string):
+                (Default: this host)
+
+        """
+        host_ = host if host is not None else socket.gethostname()
+        with _lock:
+            tunings = self._read()
+            tunings.setdefault(key, {})[host_] = {'flags': flags, 'timings': timings}
+            tmp = f"{self.path}.{os_getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp, "w") as f:
+                json.dump(tunings, f, indent=1)
+            os_replace(tmp, self.path)
+
+
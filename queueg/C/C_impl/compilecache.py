@@ -0,0 +1,261 @@
+
+
+
+
+from os import (
+    environ as os_environ,
+    replace as os_replace,
+    getpid as os_getpid,
+)
+from os.path import (
+    join as os_path_join,
+    exists as os_path_exists,
+    isfile as os_path_isfile,
+    abspath as os_path_abspath,
+)
+import hashlib
+import json
+import shutil
+import subprocess
+import threading
+
+from mv1fw import (
+    create_dir,
+)
+
+from ..._impl.ossys.ossys import default_conf_stemlist
+
+
+# compiler name -> output of `<compiler> --version`, per process
+_compiler_versions = {}
+
+
+
+def compiler_version(compiler_name):
+    """
+    Version string of a compiler (memoized).
+
+    :meta private:
+    """
+    if compiler_name not in _compiler_versions:
+        try:
+            cp = subprocess.run([compiler_name, "--version"], capture_output=True)
+            _compiler_versions[compiler_name] = cp.stdout.decode("utf-8", "replace")
+        except OSError:
+            _compiler_versions[compiler_name] = ""
+    return _compiler_versions[compiler_name]
+
+
+
+def file_digest(path):
+    """
+    :meta private:
+    """
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+
+def parse_depfile(text, cwd):
+    """
+    Files listed in make rules (cf. ``-MM``), as absolute paths.
+
+    :meta private:
+    """
+    tokens = text.replace("\\\n", " ").split()
+    return sorted({os_path_abspath(os_path_join(cwd, token)) for token in tokens if not token.endswith(":")})
+
+
+
+def dependencies(compiler_name, source_names, compiler_args, include_paths, cwd):
+    """
+    Files that the sources include, as listed by a preprocessor-only pass
+    (``-MM``, and ``-MG`` so that missing headers are no error), as absolute paths.
+
+    Returns:
+
+        list of string, or None if the compiler cannot list them.
+
+    :meta private:
+    """
+    cclist = [compiler_name, "-MM", "-MG"]
+    cclist += compiler_args
+    cclist += [f"-I{x}" for x in include_paths]
+    cclist += [name for name in source_names if not name.endswith(".h")]
+    try:
+        cp = subprocess.run(cclist, capture_output=True, cwd=cwd)
+    except OSError:
+        return None
+    if cp.returncode != 0:
+        return None
+    return [path for path in parse_depfile(cp.stdout.decode("utf-8", "replace"), cwd) if os_path_isfile(path)]
+
+
+
+class CompileCache:
+    """
+    Persistent cache of compiler outputs (executables, object files),
+    used by :any:`CRunBase` to skip compilations whose inputs have not changed.
+
+    Lookup is in two steps. The first key hashes the compiler
+    version, the arguments, the contents of the sources, and the contents
+    of the libraries found in the library paths. It leads to a manifest,
+    which lists the headers (as reported by the compiler, cf. ``-MM``)
+    of each output cached under that key, with their hashes.
+    An output is restored when all its headers are unchanged,
+    so that a hit costs no compiler process at all.
+
+    The cache lives in the QueueG configuration directory,
+    and can be disabled by setting ``compile_cache = false`` in the Conf file.
+
+    Parameters:
+
+        path (optional string):
+            Root of the cache. (Default: ``cache/cc`` in the QueueG configuration directory)
+
+    :meta private:
+    """
+
+    def __init__(
+            self,
+            path = None,
+    ):
+        if path is None:
+            path = create_dir(os_environ["HOME"], default_conf_stemlist + ["cache", "cc"])
+        self.path = path
+
+
+    def key(
+            self,
+            compiler_name,
+            source_names,
+            compiler_args,
+            include_paths,
+            library_paths,
+            library_handles,
+            cwd,
+            extra_files = None,
+    ):
+        """
+        First key of a compilation.
+        `extra_files` lists other inputs of the compiler
+        (e.g. profile data), whose contents are hashed as well.
+
+        Returns:
+
+            string, or None if a source cannot be read.
+
+        """
+        h = hashlib.sha256()
+        h.update(compiler_version(compiler_name).encode())
+        args = [compiler_name] + compiler_args + include_paths + library_paths + library_handles
+        h.update(json.dumps(args).encode())
+        for name in source_names:
+            path = os_path_join(cwd, name)
+            if not os_path_isfile(path):
+                return None
+            h.update(name.encode())
+            h.update(file_digest(path).encode())
+        # > libraries linked from the library paths (system libraries are covered by the compiler version)
+        for handle in library_handles:
+            for library_path in library_paths:
+                for ending in [".a", ".so"]:
+                    path = os_path_join(cwd, library_path, f"lib{handle}{ending}")
+                    if os_path_isfile(path):
+                        h.update(path.encode())
+                        h.update(file_digest(path).encode())
+        for path in (extra_files if extra_files is not None else []):
+            h.update(path.encode())
+            h.update(file_digest(path).encode())
+        return h.hexdigest()
+
+
+    def _manifest_path(self, key):
+        """
+        :meta private:
+        """
+        return os_path_join(self.path, key[:2], f"{key[2:]}.json")
+
+
+    def _read_manifest(self, key):
+        """
+        :meta private:
+        """
+        path = self._manifest_path(key)
+        if not os_path_exists(path):
+            return []
+        try:
+            with open(path, "r") as f:
+                return json.load(f)
+        except ValueError:
+            return []
+
+
+    def lookup(self, key, target_name):
+        """
+        Restore a cached output to ``target_name``, if there is one.
+
+        Returns:
+
+            boolean, whether it was restored (hit).
+
+        """
+        for entry in self._read_manifest(key):
+            headers = entry['headers']
+            if all([os_path_isfile(path) and file_digest(path) == headers[path] for path in headers]):
+                blob = os_path_join(self.path, key[:2], entry['output'])
+                if os_path_isfile(blob):
+                    shutil.copy2(blob, target_name)
+                    return True
+        return False
+
+
+    def store(
+            self,
+            key,
+            target_name,
+            compiler_name,
+            source_names,
+            compiler_args,
+            include_paths,
+            cwd,
+    ):
+        """
+        Cache a compiler output, after a successful compilation.
+        The headers are listed by a preprocessor-only pass (``-MM``).
+        """
+        # > -MM lists the user headers, without compiling
+        cclist = [compiler_name, "-MM"]
+        cclist += compiler_args
+        cclist += [f"-I{x}" for x in include_paths]
+        cclist += [name for name in source_names if not name.endswith(".h")]
+        try:
+            cp = subprocess.run(cclist, capture_output=True, cwd=cwd)
+        except OSError:
+            return
+        if cp.returncode != 0:
+            return
+        sources = {os_path_abspath(os_path_join(cwd, name)) for name in source_names}
+        headers = {}
+        for path in parse_depfile(cp.stdout.decode("utf-8", "replace"), cwd):
+            if path not in sources and os_path_isfile(path):
+                headers[path] = file_digest(path)
+        output = hashlib.sha256(json.dumps(headers, sort_keys=True).encode()).hexdigest()
+        directory = create_dir(self.path, key[:2])
+        blob = os_path_join(directory, output)
+        # > never expose a partial output: copy, then rename
+        # (one tmp name per thread: several runs may compile at once)
+        tmp = f"{blob}.{os_getpid()}.{threading.get_ident()}.tmp"
+        shutil.copy2(target_name, tmp)
+        os_replace(tmp, blob)
+        manifest = [entry for entry in self._read_manifest(key) if entry['output'] != output]
+        manifest.append({'headers': headers, 'output': output})
+        tmp = f"{self._manifest_path(key)}.{os_getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp, "w") as f:
+            json.dump(manifest, f)
+        os_replace(tmp, self._manifest_path(key))
+
+
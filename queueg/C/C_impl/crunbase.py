@@ -3,14 +3,23 @@
 
 
 from os import (
+    cpu_count as os_cpu_count,
     remove as os_remove,
-    chdir as os_chdir,
+    replace as os_replace,
     getcwd as os_getcwd,
+    getpid as os_getpid,
     chmod as os_chmod,
 )
-from os.path import join as os_path_join
+from os.path import (
+    join as os_path_join,
+    exists as os_path_exists,
+)
+from concurrent.futures import ThreadPoolExecutor
+import json
 import subprocess
 import shutil
+import time
+import threading
 
 from mv1fw import (
     create_dir,
@@ -18,6 +27,32 @@ from mv1fw import (
 )
 
 from ..._impl.conf import Conf
+from ..._impl.catalog import Catalog
+from ..._impl.blobstore import BlobStore
+from ..._impl.ossys.stream import run_logged
+from ..._impl.ossys.usage import (
+    run_measured,
+    write_resources,
+    resources_file,
+)
+from .compilecache import CompileCache
+from .objbuild import (
+    compile_objects,
+    archive_path,
+)
+from .autotune import (
+    TuningStore,
+    autotune_candidates,
+    strip_optimization,
+)
+from .pgo import (
+    profile_dir,
+    profile_files,
+    trained,
+    profile_marker,
+    profile_data_stem,
+    profile_build_stem,
+)
 
 
 
@@ -78,6 +113,13 @@ class CRunBase:
             Other options desired for
             a SLURM nonblocking execution.
             See e.g. `SLURM sbatch documentation <https://slurm.schedmd.com/sbatch.html>`_ .
+        parallel_build (boolean or integer):
+            Whether to compile each translation unit to an object
+            file separately, in parallel, and link the objects once.
+            Objects are kept between runs, and only the translation units
+            whose source or headers changed are recompiled.
+            An integer sets the number of concurrent compilers
+            (True: one per core). Default: False
         verbose (boolean):
             Whether to run verbosely. Default: False
     """
@@ -109,6 +151,7 @@ class CRunBase:
             job_time_limit = "1-00:00:00",
             partition = None,
             SLURM_args = None,
+            parallel_build = False,
             verbose = False,
     ):
         if location is None:
@@ -119,20 +162,35 @@ class CRunBase:
         # todo add self.source_names_fullpath and self.wdir_filenames_fullpath
         self.compiler_name = compiler_name if compiler_name is not None else "gcc"
         self.always_compiler_args = always_compiler_args if always_compiler_args is not None else ["std=c99", "-Wall", "-O3"]
-        self.exec_name = [] if exec_name is None else [exec_name] if exec_name is isinstance(exec_name, str) else exec_name
+        self.exec_name = [] if exec_name is None else [exec_name] if isinstance(exec_name, str) else exec_name
         self.include_path_handles = include_path_handles if include_path_handles is not None else []
         self.library_path_handles = library_path_handles if library_path_handles is not None else []
         self.library_handles = library_handles if library_handles is not None else []
-        self.conf = Conf()
+        self.conf = Conf.cached()
+        # > optional deduplication of copied files (cf. BlobStore)
+        self.blobs = BlobStore() if 'dedup' in self.conf and self.conf['dedup'] else None
+        # > compilation cache, unless disabled (cf. CompileCache)
+        self.compile_cache = None if 'compile_cache' in self.conf and not self.conf['compile_cache'] else CompileCache()
+        # > flags found by autotune(), used unless disabled (cf. TuningStore)
+        self.tunings = None if 'autotune' in self.conf and not self.conf['autotune'] else TuningStore()
+        self.tuned_flags = None
+        # training runs of profile-guided optimization, cf. start()
+        self.training_args = None
+        # > output of the compiler and of the program is streamed to the info
+        #   directory: optionally tee'd to the console (at most log_tee_rate lines
+        #   per second), and the last log_tail lines are shown at the end
+        self.log_tee = self.conf['log_tee'] if 'log_tee' in self.conf else False
+        self.log_tee_rate = self.conf['log_tee_rate'] if 'log_tee_rate' in self.conf else 100
+        self.log_tail = self.conf['log_tail'] if 'log_tail' in self.conf else 20
+        self.location = location
         self.path = location.get_path(
             create = True,
             explicit_conf = self.conf,
         )
+        # > the process-wide working directory is never changed,
+        #   every subprocess gets an explicit cwd,
+        #   so that several runs can share a process
         self.wdir = os_getcwd()
-        # > the class needs to be stateless, and we change
-        #   the working directory
-        # todo fix - we shouldn't do this ?
-        self.wdir_stateless = self.wdir
         if location.jumplist:
             self.wdir = os_path_join(self.wdir, *location.jumplist)
         # > whether to execute via slurm queue, in nonblocking mode.
@@ -147,6 +205,7 @@ class CRunBase:
         self.job_time_limit = job_time_limit
         self.partition = partition
         self.SLURM_args = SLURM_args if SLURM_args is not None else []
+        self.parallel_build = parallel_build
         self.v = verbose
         self.module_invocation = ""
         ######################
@@ -157,12 +216,20 @@ class CRunBase:
         self.info_stem = "etc"
         self.analysis_stem = "ans"
         self.lib_stem = "lib"
+        self.sweep_stem = "run"
         self.target_name = "_a"
         self.script_name = "swh"
         self.lm = True
         self.info_dir = None
         self.data_dir = None
         self.lib_dir = None
+        # static libraries being built, handle -> future of the cached archive path
+        self.archives = {}
+        self._archive_pool = None
+        # return code of the last run, if it was run (blocking)
+        self.returncode = None
+        # resource usage of the subprocesses of the last run, cf. resources.json
+        self.resources = []
         self.add_include_path_handles(self.include_path_handles)
         self.add_library_path_handles(self.library_path_handles)
         # set to stop flow of processing steps early (utility for subclasses)
@@ -178,6 +245,7 @@ class CRunBase:
         # > a somewhat ad-hoc initialization of the cog manager,
         #  because we don't have the convenience of actions.
         self.cog.clean_tree()
+        self.resources = []
         self.info_dir = create_dir(self.cog.engine_dir, self.info_stem)
         self.data_dir = create_dir(self.cog.engine_dir, self.dat_stem)
         # > store a copy of the source files
@@ -212,17 +280,13 @@ class CRunBase:
 
 
     def deinit(self):
-        # > restore working directory
-        # todo re-implement with no call to os_chdir.
-        #  Using os_chdir creates a ticking time bomb
-        #  when you are offering methods to subclasses and users
-        #  (like postrun, precompilation, postcompilation)
-        #  and it's opaque what the wdir is at any given moment/stage
-        #  of process flow.
-        os_chdir(self.wdir_stateless)
+        # > wait for the static libraries still building, and release their threads
+        if self._archive_pool is not None:
+            self._archive_pool.shutdown(wait=True)
+            self._archive_pool = None
 
 
-    def copy_files(self, names, directory):
+    def copy_files(self, names, directory, subdir = None):
         """
         Copy files described using relative filenames
         (relative to the input working directory)
@@ -236,6 +300,8 @@ class CRunBase:
                 list of relative filenames
             directory (string):
                 descriptor for a location in the output tree
+            subdir (optional string):
+                subdirectory of that location (e.g., for a run of a sweep)
 
         """
         # todo
@@ -245,20 +311,19 @@ class CRunBase:
             tgt_dir = self.data_dir
         else:
             raise ValueError
+        if subdir is not None:
+            tgt_dir = create_dir(tgt_dir, subdir)
         for file in names:
             # # todo windows
             fsplit = file.split('/')
             create_dir(tgt_dir, fsplit[:-1])
-            shutil.copy(
-                os_path_join(
-                    self.wdir,
-                    file,
-                ),
-                os_path_join(
-                    tgt_dir,
-                    file,
-                ),
-            )
+            src = os_path_join(self.wdir, file)
+            dst = os_path_join(tgt_dir, file)
+            if self.blobs is not None:
+                # > the program may write to its data directory
+                self.blobs.link(src, dst, writable=(directory == 'data'))
+            else:
+                shutil.copy(src, dst)
 
 
     def add_include_path_handles(self, include_path_handles):
@@ -310,6 +375,14 @@ class CRunBase:
         Compilers make (and then break) a lot of assumptions
         about these filenames.
 
+        The library is built in the background, so that several
+        libraries can be built at the same time: the start() method
+        waits for the libraries it links against.
+        The objects and the archive are cached across runs
+        (cf. ``parallel_build``), keyed on the contents of the
+        sources and headers and on the flags, so that an unchanged
+        library is not rebuilt.
+
         Arguments:
 
             handle:
@@ -323,15 +396,13 @@ class CRunBase:
             library_path_handles:
             compiler_args:
         """
-        # > if lib dir was not created, create it
-        self.lib_dir = create_dir(self.cog.engine_dir, self.lib_stem)
         # > "push" former state to "stack"
         restore_ips = self.include_paths
-        restore_lps = self.library_paths + [self.lib_dir]
+        restore_lps = self.library_paths
         restore_ls = self.library_handles + [handle]
         # > marshall compiler arguments
         compiler_args_ = []
-        compiler_args_ += self.always_compiler_args + ['-c']
+        compiler_args_ += self.always_compiler_args
         compiler_args_ += compiler_args if compiler_args is not None else []
         self.include_paths = include_paths if isinstance(include_paths, list) else [] if include_paths is None else include_paths
         self.library_paths = library_paths if isinstance(library_paths, list) else [] if library_paths is None else library_paths
@@ -340,34 +411,123 @@ class CRunBase:
             self.add_include_path_handles(include_path_handles)
         if library_path_handles is not None:
             self.add_library_path_handles(library_path_handles)
-        # > call compiler
-        self._compilation(
-            compiler_name=self.compiler_name,
-            target_name=os_path_join(self.lib_dir, handle + ".o"),
-            source_names=source_names,
-            compiler_args=compiler_args_,
-            include_paths=self.include_paths,
-            library_paths=self.library_paths,
-            library_handles=self.library_handles,
-        )
-        ofile = os_path_join(self.lib_dir, handle + ".o")
-        # todo ensure ^--this subprocess waits for v--that subprocess? 99% sure ok.
-        # ar -rcs libfoo.a foo.o
-        self._archive_generation(
-            target_name=os_path_join(self.lib_dir, "lib" + handle + ".a"),
-            source_names=[ofile]
-        )
-        # > restore state, but with the newly created library associated with the run target
+        include_paths_ = self.include_paths
+        # > restore state, but with the new library associated with the run target
         self.include_paths = restore_ips
         self.library_paths = restore_lps
         self.library_handles = restore_ls
-        os_remove(ofile)
+        # > build in the background
+        if self._archive_pool is None:
+            self._archive_pool = ThreadPoolExecutor()
+        self.archives[handle] = self._archive_pool.submit(
+            self._archive_build,
+            handle=handle,
+            source_names=source_names if isinstance(source_names, list) else [source_names],
+            compiler_args=compiler_args_,
+            include_paths=include_paths_,
+        )
+
+
+    def _archive_build(
+            self,
+            handle,
+            source_names,
+            compiler_args,
+            include_paths,
+    ):
+        """
+        Build a static library, or find it in the cache.
+        This runs in the background, possibly before the output tree exists,
+        so the outputs of the tools and the messages are returned
+        to be logged and printed later, from the main thread.
+
+        Returns:
+
+            quintuple (path of the cached archive or None if the build failed,
+            standard output, standard error, list of resource usages,
+            list of (message, function) pairs)
+
+        :meta private:
+        """
+        cc = self.compiler_name
+        objects, results = compile_objects(
+            compiler_name=cc,
+            source_names=source_names,
+            compiler_args=compiler_args,
+            include_paths=include_paths,
+            cwd=self.wdir,
+        )
+        msgs = [(f"lib{handle}: compiled {len(results)} of {len(objects)} translation units", cc)]
+        outs = []
+        errs = []
+        usages = []
+        failed = False
+        for name, returncode, out, err, usage in results:
+            usages.append(dict(step="archive", command=name, **usage))
+            if out:
+                outs.append(f"{name}:\n{out}")
+            if err:
+                errs.append(f"{name}:\n{err}")
+                msgs.append((f" 2> {name}:\n{err}", cc))
+            if returncode != 0:
+                failed = True
+        if failed:
+            return None, '\n'.join(outs), '\n'.join(errs), usages, msgs
+        target_name = archive_path(handle, objects)
+        if os_path_exists(target_name):
+            msgs.append((f"lib{handle}: (cached)", "ar"))
+            return target_name, '\n'.join(outs), '\n'.join(errs), usages, msgs
+        # > never expose a partial archive: ar, then rename
+        tmp = f"{target_name}.{os_getpid()}.{threading.get_ident()}.tmp"
+        if os_path_exists(tmp):
+            os_remove(tmp)
+        # ar -rcs libfoo.a foo.o
+        cclist = ["ar", "-rcs", tmp] + objects
+        msgs.append((f" < {' '.join(cclist)}", "ar"))
+        cp, usage = run_measured(cclist, capture_output=True)
+        usages.append(dict(step="archive", command="ar", **usage))
+        outs.append(cp.stdout.decode("utf-8").strip())
+        s = cp.stderr.decode("utf-8").strip()
+        if s:
+            msgs.append((f" 2> {s}", "ar"))
+            errs.append(s)
+        if cp.returncode != 0:
+            return None, '\n'.join(outs), '\n'.join(errs), usages, msgs
+        os_replace(tmp, target_name)
+        return target_name, '\n'.join(outs), '\n'.join(errs), usages, msgs
+
+
+    def _link_archives(self):
+        """
+        Wait for the static libraries that the target links against,
+        and place them in the library directory of the output tree.
+
+        :meta private:
+        """
+        handles = [handle for handle in self.archives if handle in self.library_handles]
+        if not handles:
+            return
+        self.lib_dir = create_dir(self.cog.engine_dir, self.lib_stem)
+        if self.lib_dir not in self.library_paths:
+            self.library_paths = self.library_paths + [self.lib_dir]
+        for handle in handles:
+            target_name, out, err, usages, msgs = self.archives[handle].result()
+            for msg, function in msgs:
+                self._msg(msg, function=function, always=True)
+            self.resources += usages
+            self._log(f"lib{handle}", "out", out)
+            self._log(f"lib{handle}", "err", err)
+            if target_name is None:
+                self._msg(f"lib{handle} could not be built.", function="ar", always=True)
+                continue
+            shutil.copy2(target_name, os_path_join(self.lib_dir, "lib" + handle + ".a"))
 
 
     def start(
             self,
             program_args = None,
             compiler_args = None,
+            training_args = None,
     ):
         """
         Compile and run.
@@ -382,30 +542,351 @@ class CRunBase:
                 Note: compiler options should appear inside of a list,
                 something like: ``['-v', '-Wall', '-g']`` for example,
                 including the dash symbol.
+            training_args (optional list of string, or list of (list of string)):
+                If set, the target is built with profile-guided optimization:
+                it is first built with ``-fprofile-generate``, and run
+                with these arguments (one list per training run, ``[]`` for
+                one run without arguments) in a scratch directory,
+                then rebuilt with ``-fprofile-use``.
+                The profile is cached, so that later runs
+                with the same sources, flags, and training skip the training.
         """
+        if training_args is not None and self.SLURM_nonblocking:
+            raise ValueError("Profile-guided optimization cannot train in nonblocking (batch) mode.")
         self.init()
-        compiler_args_ = self.always_compiler_args
-        compiler_args_ += compiler_args if compiler_args is not None else []
+        started = time.time()
+        self._record("running", started=started)
+        try:
+            compiler_args_ = self._compiler_args(compiler_args)
+            program_args_ = program_args if program_args is not None else []
+            if not self.stop_flow:
+                self._precompilation()
+            if not self.stop_flow:
+                self._build(compiler_args_, training_args)
+            if not self.stop_flow:
+                self._postcompilation()
+            if not self.stop_flow:
+                self._run(program_args_)
+            if not self.stop_flow:
+                self._postrun()
+            self.deinit()
+            if self.SLURM_nonblocking:
+                status = "queued"
+            else:
+                status = "done" if self.returncode == 0 else "failed"
+            usage = self._write_resources()
+        except BaseException:
+            # > a run that raised must not stay "running"
+            self._record("failed", duration=time.time() - started)
+            raise
+        self._record(status, duration=time.time() - started, usage=usage)
+
+
+    def sweep(
+            self,
+            program_args_list,
+            compiler_args = None,
+            max_workers = None,
+    ):
+        """
+        Compile once, then run the executable once per set
+        of program arguments, concurrently.
+
+        Each run has its own subdirectory of the data directory,
+        ``run0``, ``run1``, etc. (zero-padded), which is its working
+        directory, and where the ``wdir_filenames`` are copied.
+        The output of a run is logged in the info directory under
+        the name of the executable and of the subdirectory.
+        The exit codes and the timings are written to ``sweep.json``
+        in the info directory.
+
+        Example:
+
+        .. code-block:: python
+
+            run = CRun("cavity.c", location)
+            results = run.sweep([["-re", str(re)] for re in [100, 400, 1000]])
+
+        Arguments:
+
+            program_args_list (list of (list of string)):
+                one list of arguments per run.
+            compiler_args (optional list of string):
+                cf. start()
+            max_workers (optional integer):
+                number of concurrent runs. Default: the number of cores,
+                divided by the number of tasks of a run (cf. ``cluster_tasks``).
+
+        Returns:
+
+            list of dict, one per run, with keys
+            'args', 'path', 'returncode', 'duration' (seconds).
+
+        """
+        if self.SLURM_nonblocking:
+            raise ValueError("A sweep cannot run in nonblocking (batch) mode, submit each run instead.")
+        self.init()
+        started = time.time()
+        self._record("running", started=started)
+        try:
+            compiler_args_ = self._compiler_args(compiler_args)
+            results = []
+            if not self.stop_flow:
+                self._precompilation()
+            if not self.stop_flow:
+                self._build(compiler_args_)
+            if not self.stop_flow:
+                self._postcompilation()
+            if not self.stop_flow:
+                results = self._sweep_run(program_args_list, max_workers)
+            if not self.stop_flow:
+                self._postrun()
+            self.deinit()
+            self.returncode = next((r['returncode'] for r in results if r['returncode'] != 0), 0 if results else None)
+            status = "done" if self.returncode == 0 else "failed"
+            usage = self._write_resources()
+        except BaseException:
+            # > a run that raised must not stay "running"
+            self._record("failed", duration=time.time() - started)
+            raise
+        self._record(status, duration=time.time() - started, usage=usage)
+        return results
+
+
+    def _build(self, compiler_args, training_args = None):
+        """
+        Build the target in the data directory, once the static libraries
+        it links against are ready: with profile-guided optimization
+        if `training_args` is set (cf. start()), otherwise per translation
+        unit if ``parallel_build`` is set, otherwise in one compiler invocation.
+
+        :meta private:
+        """
+        self._link_archives()
+        compilation = self._parallel_compilation if self.parallel_build else self._compilation
+        if training_args is not None:
+            compilation = self._pgo_compilation
+            # > one list of arguments (possibly empty) is one training run
+            self.training_args = training_args if training_args and isinstance(training_args[0], list) else [training_args]
+        compilation(
+            compiler_name=self.compiler_name,
+            target_name=os_path_join(self.data_dir, self.target_name),
+            source_names=self.source_names,
+            compiler_args=compiler_args,
+            include_paths=self.include_paths,
+            library_paths=self.library_paths,
+            library_handles=self.library_handles,
+        )
+
+
+    def _sweep_run(self, program_args_list, max_workers):
+        """
+        Run the executable of a sweep, cf. sweep().
+
+        :meta private:
+        """
+        target = os_path_join(self.data_dir, self.target_name)
+        if not os_path_exists(target):
+            self._msg(f"no executable, the sweep is not run.", function="sweep", always=True)
+            return []
+        if max_workers is None:
+            cores_per_run = self.cluster_tasks[0]*self.cluster_tasks[1]
+            max_workers = max(1, (os_cpu_count() or 1) // cores_per_run)
+        width = len(str(max(len(program_args_list) - 1, 0)))
+        runs = []
+        for i, program_args in enumerate(program_args_list):
+            args = program_args if isinstance(program_args, list) else [program_args]
+            name = f"{self.sweep_stem}{i:0{width}d}"
+            path = create_dir(self.data_dir, name)
+            self.copy_files(self.wdir_filenames, directory='data', subdir=name)
+            runs.append((name, path, [str(x) for x in args]))
+        self._msg(f"{len(runs)} runs, {max_workers} at a time", function="sweep", always=True)
+
+        def run(item):
+            name, path, args = item
+            t = time.time()
+            returncode, _, err, usage = run_logged(
+                args=self.exec_name + [target] + args,
+                out_path=self._log_path(f"{self.target_name}.{name}", "out"),
+                err_path=self._log_path(f"{self.target_name}.{name}", "err"),
+                cwd=path,
+                tail=self.log_tail,
+            )
+            self.resources.append(dict(step="run", command=name, **usage))
+            duration = time.time() - t
+            self._msg(f"{name} {' '.join(args)}: return code {returncode}, {duration:.2f} s", function="sweep", always=True)
+            if err:
+                self._msg(f" 2> " + '\n'.join(err), function="sweep", always=True)
+            return {'args': args, 'path': path, 'returncode': returncode, 'duration': duration}
+
+        with ThreadPoolExecutor(max_workers=max_workers) as pool:
+            results = list(pool.map(run, runs))
+        with open(self.cog.filename(handle="sweep", ending="json", stem=self.info_stem), "w") as f:
+            json.dump(results, f, indent=1)
+        os_remove(target)
+        self._msg(f"output path:\n{self.path}", function="sweep", always=True)
+        return results
+
+
+    def autotune(
+            self,
+            program_args = None,
+            candidates = None,
+            repeat = 3,
+            compiler_args = None,
+    ):
+        """
+        Find the fastest optimization flags for the target on this host.
+
+        The target is built once per candidate combination of flags
+        (replacing the optimization flags of ``always_compiler_args``,
+        e.g. ``-O3``), using the compilation cache, then each build runs
+        a short representative workload `repeat` times.
+        The flags of the fastest build (least wall time over the repetitions)
+        are stored per target (compiler, other compiler arguments, and contents
+        of the sources and headers) and per host, and the later calls of start()
+        and sweep() on this host with the same arguments use them,
+        until a source or header changes. Set ``autotune = false`` in the Conf file
+        to ignore stored tunings.
+
+        Example:
+
+        .. code-block:: python
+
+            run = BasiliskRun("cavity.c", location)
+            run.autotune(program_args=["-steps", "50"])
+            run.start()
+
+        Arguments:
+
+            program_args (optional list of string):
+                arguments selecting a short workload.
+            candidates (optional list of (list of string)):
+                flag combinations to try. (Default: -O2, -O3, with -march=native,
+                -funroll-loops, cf. ``autotune_candidates``. Flags that may change
+                the results, such as -ffast-math, are only tried if given here.)
+            repeat (integer):
+                number of timed runs per build. (Default: 3)
+            compiler_args (optional list of string):
+                other arguments, passed to every build.
+
+        Returns:
+
+            list of string, the winning flags, or None if no build ran.
+
+        """
+        if self.SLURM_nonblocking:
+            raise ValueError("Autotuning cannot run in nonblocking (batch) mode.")
+        candidates_ = candidates if candidates is not None else autotune_candidates
         program_args_ = program_args if program_args is not None else []
+        base = strip_optimization(self.always_compiler_args)
+        base += compiler_args if compiler_args is not None else []
+        self.init()
+        key = TuningStore.key(self.compiler_name, self.source_names, base, self.include_paths, self.wdir)
+        timings = {}
+        winner = None
         if not self.stop_flow:
             self._precompilation()
         if not self.stop_flow:
-            self._compilation(
-                compiler_name=self.compiler_name,
-                target_name=os_path_join(self.data_dir, self.target_name),
-                source_names=self.source_names,
-                compiler_args=compiler_args_,
-                include_paths=self.include_paths,
-                library_paths=self.library_paths,
-                library_handles=self.library_handles,
-            )
-        if not self.stop_flow:
-            self._postcompilation()
-        if not self.stop_flow:
-            self._run(program_args_)
+            self._link_archives()
+            compilation = self._parallel_compilation if self.parallel_build else self._compilation
+            for i, flags in enumerate(candidates_):
+                target_name = f"{self.target_name}.tune{i}"
+                target = os_path_join(self.data_dir, target_name)
+                compilation(
+                    compiler_name=self.compiler_name,
+                    target_name=target,
+                    source_names=self.source_names,
+                    compiler_args=base + flags,
+                    include_paths=self.include_paths,
+                    library_paths=self.library_paths,
+                    library_handles=self.library_handles,
+                )
+                if not os_path_exists(target):
+                    self._msg(f"{' '.join(flags)}: no executable", function="autotune", always=True)
+                    continue
+                times = []
+                for _ in range(repeat):
+                    returncode, _, _, usage = run_logged(
+                        args=self.exec_name + [target] + program_args_,
+                        out_path=self._log_path(target_name, "out"),
+                        err_path=self._log_path(target_name, "err"),
+                        cwd=self.data_dir,
+                        tail=0,
+                    )
+                    self.resources.append(dict(step="autotune", command=target_name, **usage))
+                    if returncode != 0:
+                        self._msg(f"{' '.join(flags)}: return code {returncode}", function="autotune", always=True)
+                        times = []
+                        break
+                    times.append(usage['wall'])
+                os_remove(target)
+                if times:
+                    timings[' '.join(flags)] = min(times)
+                    self._msg(f"{' '.join(flags)}: {min(times):.3f} s", function="autotune", always=True)
+                    if winner is None or min(times) < timings[' '.join(winner)]:
+                        winner = flags
         if not self.stop_flow:
             self._postrun()
         self.deinit()
+        write_resources(os_path_join(self.info_dir, resources_file), self.resources)
+        if winner is not None:
+            self._msg(f"winner: {' '.join(winner)}", function="autotune", always=True)
+            if key is not None:
+                (self.tunings if self.tunings is not None else TuningStore()).store(key, winner, timings)
+        return winner
+
+
+    def _compiler_args(self, compiler_args):
+        """
+        Compiler arguments of the target: the ``always_compiler_args``,
+        with the optimization flags replaced by the tuning
+        of the target on this host, if there is one (cf. autotune()),
+        then `compiler_args`.
+
+        :meta private:
+        """
+        compiler_args_ = list(self.always_compiler_args)
+        self.tuned_flags = None
+        # > no tuning on this host: no key (it costs a preprocessor pass)
+        if self.tunings is not None and self.tunings.tuned():
+            base = compiler_args_ + (compiler_args if compiler_args is not None else [])
+            key = TuningStore.key(self.compiler_name, self.source_names, base, self.include_paths, self.wdir)
+            tuning = self.tunings.lookup(key) if key is not None else None
+            if tuning is not None:
+                self.tuned_flags = tuning['flags']
+                compiler_args_ = strip_optimization(compiler_args_) + self.tuned_flags
+                self._msg(f"tuned flags: {' '.join(self.tuned_flags)}", function=self.compiler_name, always=True)
+        compiler_args_ += compiler_args if compiler_args is not None else []
+        return compiler_args_
+
+
+    def _record(self, status, started = None, duration = None, usage = None):
+        """
+        Record the run in the :any:`Catalog`.
+        """
+        Catalog().record(
+            location=self.location,
+            status=status,
+            started=started,
+            duration=duration,
+            path=self.path,
+            usage=usage,
+        )
+
+
+    def _write_resources(self):
+        """
+        Write the resource usage of the subprocesses of the run
+        (compiler, archiver, program) to ``resources.json``
+        in the info directory.
+
+        Returns:
+
+            dict, the totals.
+
+        """
+        return write_resources(os_path_join(self.info_dir, resources_file), self.resources)
 
 
     def _precompilation(self):
@@ -429,6 +910,7 @@ class CRunBase:
             include_paths,
             library_paths,
             library_handles,
+            extra_files = None,
     ):
         """
         Run the compiler executable.
@@ -445,8 +927,17 @@ class CRunBase:
             include_paths (list of string):
             library_paths (list of string):
             library_handles (list of string):
+            extra_files (optional list of string):
+                other inputs of the compiler, for the compilation cache
+                (e.g. profile data, cf. _pgo_compilation())
+
+        Returns:
+
+            integer, the return code of the compiler (0 if the output was cached),
+            or None if it could not be run.
+
         """
-        os_chdir(self.wdir)
+        # Note: the compiler is run inside the input working directory.
         cc = compiler_name
         # todo for some reason this isn't working with the subprocess idiom...
         #  I will try adding this module load to my bashrc on the machine of interest... :/
@@ -478,68 +969,219 @@ class CRunBase:
         else:
             self._msg(f"libraries: {' '.join(library_handles)}", function=cc, always=True)
         self._msg(f" < {' '.join(cclist)}", function=cc, always=True)
-        try:
-            cp = subprocess.run(
-                args=cclist,
-                capture_output=True,
-                # Needed if calling module
-                # shell=True,
+        key = None
+        if self.compile_cache is not None and target_name is not None:
+            key = self.compile_cache.key(
+                compiler_name=cc,
+                source_names=source_names,
+                compiler_args=compiler_args,
+                include_paths=include_paths,
+                library_paths=library_paths,
+                library_handles=library_handles,
+                cwd=self.wdir,
+                extra_files=extra_files,
             )
-            s = cp.stdout.decode("utf-8").strip()
-            self._msg(f" > {s}", function=cc, always=True)
-            self._log(cc, "out", s)
-            s = cp.stderr.decode("utf-8").strip()
-            if len(s) > 0:
-                self._msg(f" 2> {s}", function=cc, always=True)
-            self._log(cc, "err", s)
+            if key is not None and self.compile_cache.lookup(key, target_name):
+                self._msg(f" > (cached)", function=cc, always=True)
+                self._log(cc, "out", "(cached)")
+                self._log(cc, "err", "")
+                return 0
+        returncode = None
+        try:
+            returncode = self._run_logged(cc, cclist, function=cc, cwd=self.wdir, step="compile")
+            if key is not None and returncode == 0 and os_path_exists(target_name):
+                self.compile_cache.store(
+                    key=key,
+                    target_name=target_name,
+                    compiler_name=cc,
+                    source_names=source_names,
+                    compiler_args=compiler_args,
+                    include_paths=include_paths,
+                    cwd=self.wdir,
+                )
         except subprocess.CalledProcessError as exc:
             self._msg(f" return code {exc.returncode}\n{exc}", function=cc, always=True)
         # todo check if target_name exists, if not, stop.
+        return returncode
 
 
-    def _archive_generation(
+    def _parallel_compilation(
             self,
+            compiler_name,
             target_name,
             source_names,
+            compiler_args,
+            include_paths,
+            library_paths,
+            library_handles,
+            object_dir = None,
     ):
         """
-        Create an archive.
-        Consult the man pages for `ar` for more information.
-
-        Arguments:
-
-            target_name (string):
-                This should be "libfoo.a" or the like, not "foo" (not the library handle).
-            source_names (list of string):
-                Object file(s) (their names in cwd, or full paths).
-
+        Compile each translation unit to an object file, in parallel,
+        reusing the objects that are up to date (cf. ``parallel_build``),
+        then link the objects once.
+        Same arguments as :any:`CRunBase._compilation`, and the directory
+        of the objects `object_dir` (default: cf. ``objbuild.object_dir``).
         """
-        # todo sources? can there be more than one?
-
-        cc = "ar" # todo for now
-        compiler_args = ["-rcs"] # todo for now
-        cclist = [cc]
-        cclist += compiler_args
-        cclist += [target_name]
-        cclist += source_names
-        self._msg(f"source: {' '.join(source_names)}", function=cc, always=True)
-        self._msg(f" < {' '.join(cclist)}", function=cc, always=True)
-        try:
-            cp = subprocess.run(
-                args=cclist,
-                capture_output=True,
-            )
+        cc = compiler_name
+        max_workers = None if self.parallel_build is True else self.parallel_build
+        objects, results = compile_objects(
+            compiler_name=cc,
+            source_names=source_names,
+            compiler_args=compiler_args,
+            include_paths=include_paths,
+            cwd=self.wdir,
+            max_workers=max_workers,
+            directory=object_dir,
+        )
+        self._msg(f"compiled {len(results)} of {len(objects)} translation units", function=cc, always=True)
+        outs = []
+        errs = []
+        failed = False
+        for name, returncode, out, err, usage in results:
+            self.resources.append(dict(step="compile", command=name, **usage))
+            if out:
+                outs.append(f"{name}:\n{out}")
+            if err:
+                errs.append(f"{name}:\n{err}")
+                self._msg(f" 2> {name}:\n{err}", function=cc, always=True)
+            if returncode != 0:
+                failed = True
+                self._msg(f" {name}: return code {returncode}", function=cc, always=True)
+        if not failed:
+            # > link once
+            cclist = [cc]
+            cclist += compiler_args
+            cclist += objects
+            cclist += [f"-L{x}" for x in library_paths]
+            cclist += [f"-l{x}" for x in library_handles]
+            if target_name is not None:
+                cclist += [f"-o{target_name}"]
+            self._msg(f" < {' '.join(cclist)}", function=cc, always=True)
+            cp, usage = run_measured(cclist, cwd=self.wdir, capture_output=True)
+            self.resources.append(dict(step="link", command=cc, **usage))
             s = cp.stdout.decode("utf-8").strip()
-            self._msg(f" > {s}", function=cc, always=True)
-            self._log(cc, "out", s)
+            if s:
+                outs.append(s)
             s = cp.stderr.decode("utf-8").strip()
-            if len(s) > 0:
+            if s:
+                errs.append(s)
                 self._msg(f" 2> {s}", function=cc, always=True)
-            self._log(cc, "err", s)
-        except subprocess.CalledProcessError as exc:
-            self._msg(f" return code {exc.returncode}\n{exc}", function=cc, always=True)
+        self._log(cc, "out", '\n'.join(outs))
+        self._log(cc, "err", '\n'.join(errs))
 
 
+    def _pgo_compilation(
+            self,
+            compiler_name,
+            target_name,
+            source_names,
+            compiler_args,
+            include_paths,
+            library_paths,
+            library_handles,
+    ):
+        """
+        Compile with profile-guided optimization, training
+        with ``self.training_args`` unless the profile is cached (cf. start()).
+        Same arguments as :any:`CRunBase._compilation`.
+
+        The profile data are named by the compiler after the path of
+        the executable (or of the objects, cf. ``parallel_build``),
+        so both builds target the same paths in the profile directory,
+        and the result is copied to `target_name`.
+        Several training runs (or MPI ranks) add up in the same profile,
+        the profiling runtime merges them. The optimized build is cached
+        on the contents of the profile data.
+        """
+        cc = compiler_name
+        compilation = self._parallel_compilation if self.parallel_build else self._compilation
+        prof_dir = profile_dir(
+            compiler_name=cc,
+            source_names=source_names,
+            compiler_args=compiler_args,
+            include_paths=include_paths,
+            library_paths=library_paths,
+            library_handles=library_handles,
+            training_args=self.training_args,
+            exec_name=self.exec_name,
+            cwd=self.wdir,
+        )
+        if prof_dir is None:
+            self._msg(f"a source is missing, compiling without profile.", function="pgo", always=True)
+            compilation(cc, target_name, source_names, compiler_args, include_paths, library_paths, library_handles)
+            return
+        data_dir = os_path_join(prof_dir, profile_data_stem)
+        build_dir = create_dir(prof_dir, profile_build_stem)
+        build_target = os_path_join(build_dir, self.target_name)
+
+        def build(profile_args, extra_files = None):
+            if self.parallel_build:
+                # > the objects of both builds at the same paths, never reused across them
+                obj_dir = os_path_join(build_dir, "obj")
+                shutil.rmtree(obj_dir, ignore_errors=True)
+                self._parallel_compilation(
+                    compiler_name=cc,
+                    target_name=build_target,
+                    source_names=source_names,
+                    compiler_args=compiler_args + profile_args,
+                    include_paths=include_paths,
+                    library_paths=library_paths,
+                    library_handles=library_handles,
+                    object_dir=create_dir(obj_dir),
+                )
+            else:
+                self._compilation(
+                    compiler_name=cc,
+                    target_name=build_target,
+                    source_names=source_names,
+                    compiler_args=compiler_args + profile_args,
+                    include_paths=include_paths,
+                    library_paths=library_paths,
+                    library_handles=library_handles,
+                    extra_files=extra_files,
+                )
+
+        if not trained(prof_dir):
+            shutil.rmtree(data_dir, ignore_errors=True)
+            build([f"-fprofile-generate={data_dir}"])
+            if not os_path_exists(build_target):
+                return
+            # > train in a scratch directory, with the files of the working directory
+            scratch = create_dir(self.data_dir, ".pgo")
+            self.copy_files(self.wdir_filenames, directory='data', subdir=".pgo")
+            timings = []
+            for i, args in enumerate(self.training_args):
+                args_ = [str(x) for x in args]
+                self._msg(f" < {' '.join(self.exec_name + [build_target] + args_)}", function="pgo", always=True)
+                returncode, _, err, usage = run_logged(
+                    args=self.exec_name + [build_target] + args_,
+                    out_path=self._log_path(f"{self.target_name}.pgo{i}", "out"),
+                    err_path=self._log_path(f"{self.target_name}.pgo{i}", "err"),
+                    cwd=scratch,
+                    tail=self.log_tail,
+                )
+                self.resources.append(dict(step="pgo", command=f"{self.target_name}.pgo{i}", **usage))
+                if returncode != 0:
+                    self._msg(f"training run {i}: return code {returncode}\n" + '\n'.join(err), function="pgo", always=True)
+                    timings = None
+                    break
+                timings.append(usage['wall'])
+            shutil.rmtree(scratch, ignore_errors=True)
+            os_remove(build_target)
+            if timings is None:
+                self._msg(f"training failed, compiling without profile.", function="pgo", always=True)
+                compilation(cc, target_name, source_names, compiler_args, include_paths, library_paths, library_handles)
+                return
+            with open(os_path_join(prof_dir, profile_marker), "w") as f:
+                json.dump({'training_args': self.training_args, 'timings': timings}, f)
+        else:
+            self._msg(f"profile: {prof_dir} (cached)", function="pgo", always=True)
+        # > the profile data are an input of the optimized build
+        build([f"-fprofile-use={data_dir}"], extra_files=profile_files(data_dir))
+        if os_path_exists(build_target):
+            shutil.copy2(build_target, target_name)
+            os_remove(build_target)
 
 
     def _run(self, program_args):
@@ -552,28 +1194,17 @@ class CRunBase:
             program_args (list of string):
 
         """
-        # Note: the executable was placed in the data directory.
-        # > chdir to data directory
-        os_chdir(self.data_dir)
+        # Note: the executable was placed in the data directory,
+        #  and it is run inside the data directory.
         if not self.SLURM_nonblocking:
             # > run and block until completion
             alist = self.exec_name + [f"./{self.target_name}"] + program_args
             self._msg(f" < {' '.join(alist)}", function="run", always=True)
             try:
-                cp = subprocess.run(
-                    args=alist,
-                    capture_output=True,
-                    )
-                s = cp.stdout.decode("utf-8").strip()
-                self._msg(f" > {s}", function="run", always=True)
-                self._log(self.target_name, "out", s)
-                s = cp.stderr.decode("utf-8").strip()
-                if s:
-                    self._msg(f" 2> {s}", function="run", always=True)
-                self._log(self.target_name, "err", s)
+                self.returncode = self._run_logged(self.target_name, alist, function="run", cwd=self.data_dir, step="run")
             except subprocess.CalledProcessError as exc:
                 self._msg(f"return code {exc.returncode}\n{exc}", function="run", always=True)
-            os_remove(f"./{self.target_name}")
+            os_remove(os_path_join(self.data_dir, self.target_name))
         else:
             # > non-blocking execution via SLURM.
             slurm_args = []
@@ -601,6 +1232,7 @@ class CRunBase:
                 cp = subprocess.run(
                     args=alist,
                     capture_output=True,
+                    cwd=self.data_dir,
                     # shell=True,
                 )
                 s = cp.stdout.decode("utf-8").strip()
@@ -615,8 +1247,6 @@ class CRunBase:
             # > talk to the user
             self._msg(f"Submitted job to SLURM queue.", function="run", always=True)
         self._msg(f"output path:\n{self.path}", function="run", always=True)
-        # > restore state
-        os_chdir(self.wdir)
 
 
 
@@ -631,14 +1261,55 @@ class CRunBase:
             print(message)
 
 
-    def _log(self, command, tag, body):
-        out = self.cog.filename(
+    def _log_path(self, command, tag):
+        return self.cog.filename(
             handle=f"{command}.{tag}",
             ending="txt",
             stem=self.info_stem,
         )
-        with open(out, "w") as f:
+
+
+    def _log(self, command, tag, body):
+        with open(self._log_path(command, tag), "w") as f:
             f.write(body)
 
 
+    def _run_logged(self, command, args, function, cwd, step):
+        """
+        Run a command in the directory `cwd`, streaming its output to the log files of `command`
+        in the info directory (cf. :any:`run_logged`),
+        then show the last lines of its output.
+        Its resource usage is accounted under `step`.
+
+        Returns:
+
+            integer, the return code
+
+        :meta private:
+        """
+        echo = None
+        if self.log_tee:
+            def echo(tag, line):
+                self._msg(f" {'>' if tag == 'out' else '2>'} {line}", function=function, always=True)
+        returncode, out, err, usage = run_logged(
+            args=args,
+            out_path=self._log_path(command, "out"),
+            err_path=self._log_path(command, "err"),
+            cwd=cwd,
+            echo=echo,
+            rate=self.log_tee_rate,
+            tail=self.log_tail,
+        )
+        self.resources.append(dict(step=step, command=command, **usage))
+        if not self.log_tee:
+            s = '\n'.join(out)
+            self._msg(f" > {s}", function=function, always=True)
+            s = '\n'.join(err)
+            if s:
+                self._msg(f" 2> {s}", function=function, always=True)
+        if returncode != 0:
+            self._msg(f" return code {returncode}", function=function, always=True)
+        return returncode
+
+
 
@@ -0,0 +1,181 @@
+
+
+
+
+from os import (
+    environ as os_environ,
+    stat as os_stat,
+    cpu_count as os_cpu_count,
+    replace as os_replace,
+    remove as os_remove,
+    getpid as os_getpid,
+)
+from os.path import (
+    join as os_path_join,
+    splitext as os_path_splitext,
+    abspath as os_path_abspath,
+)
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import quote as urllib_quote
+import hashlib
+import json
+import threading
+
+from mv1fw import (
+    create_dir,
+)
+
+from ..._impl.ossys.ossys import default_conf_stemlist
+from ..._impl.ossys.usage import run_measured
+from .compilecache import (
+    compiler_version,
+    parse_depfile,
+    file_digest,
+)
+
+
+# endings of the sources that are compiled to objects
+# (others, such as headers, are not translation units)
+translation_unit_endings = [".c", ".cc", ".cpp", ".cxx", ".C"]
+
+
+
+def object_dir(compiler_name, compiler_args, include_paths, cwd):
+    """
+    Persistent directory of the objects of a build,
+    one per working directory, compiler (and its version) and flags
+    (so that objects built otherwise are never reused).
+
+    :meta private:
+    """
+    key = json.dumps([compiler_name, compiler_version(compiler_name), compiler_args, include_paths, os_path_abspath(cwd)])
+    digest = hashlib.sha1(key.encode()).hexdigest()
+    return create_dir(os_environ["HOME"], default_conf_stemlist + ["cache", "obj", digest])
+
+
+
+def object_name(source_name):
+    """
+    File name of the object of a source, one per source:
+    the path of the source, percent-encoded (so that no two
+    sources share an object, e.g. ``a/b.c`` and ``a__b.c``,
+    or ``foo.c`` and ``foo.cpp``), with the ending ``.o``.
+
+    :meta private:
+    """
+    return urllib_quote(source_name, safe='') + ".o"
+
+
+
+def stale(obj, dep, cwd):
+    """
+    Whether an object must be rebuilt: like make,
+    when it is missing or older than one of its dependencies
+    (the source and the headers listed in its dependency file).
+    Equal times count as older, since file systems
+    with coarse timestamps cannot order them.
+
+    :meta private:
+    """
+    try:
+        age = os_stat(obj).st_mtime_ns
+        with open(dep, "r") as f:
+            deps = parse_depfile(f.read(), cwd)
+        for path in deps:
+            if os_stat(path).st_mtime_ns >= age:
+                return True
+    except OSError:
+        return True
+    return False
+
+
+
+def compile_objects(
+        compiler_name,
+        source_names,
+        compiler_args,
+        include_paths,
+        cwd,
+        max_workers = None,
+        directory = None,
+):
+    """
+    Compile each translation unit to an object, in parallel,
+    reusing the objects that are up to date.
+
+    Arguments:
+
+        compiler_name (string):
+        source_names (list of string):
+            relative to ``cwd``
+        compiler_args (list of string):
+        include_paths (list of string):
+        cwd (string):
+            working directory of the compiler.
+        max_workers (optional integer):
+            number of concurrent compilers (default: one per core)
+        directory (optional string):
+            directory of the objects (default: cf. object_dir())
+
+    Returns:
+
+        pair (objects, results), where `objects` is the list of object paths,
+            and `results` a list of tuples (source, return code, stdout, stderr,
+            resource usage), one per compiled translation unit.
+
+    :meta private:
+    """
+    obj_dir = directory if directory is not None else object_dir(compiler_name, compiler_args, include_paths, cwd)
+    units = [name for name in source_names if os_path_splitext(name)[1] in translation_unit_endings]
+    objects = []
+    jobs = []
+    for name in units:
+        obj = os_path_join(obj_dir, object_name(name))
+        dep = obj[:-2] + ".d"
+        objects.append(obj)
+        if stale(obj, dep, cwd):
+            # > objects are shared by the builds from the same working directory:
+            #   compile to private names, then rename
+            tmp = f".{os_getpid()}.{threading.get_ident()}.tmp"
+            cclist = [compiler_name] + compiler_args + ["-c", "-MMD", "-MF", dep + tmp]
+            cclist += [f"-I{x}" for x in include_paths]
+            cclist += [name, f"-o{obj}{tmp}"]
+            jobs.append((name, cclist, obj, dep, tmp))
+
+    def run(job):
+        name, cclist, obj, dep, tmp = job
+        cp, usage = run_measured(cclist, cwd=cwd, capture_output=True)
+        for path in [obj, dep]:
+            if cp.returncode == 0:
+                os_replace(path + tmp, path)
+            else:
+                try:
+                    os_remove(path + tmp)
+                except OSError:
+                    pass
+        return name, cp.returncode, cp.stdout.decode("utf-8").strip(), cp.stderr.decode("utf-8").strip(), usage
+
+    workers = max_workers if max_workers is not None else (os_cpu_count() or 1)
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        results = list(pool.map(run, jobs))
+    return objects, results
+
+
+
+def archive_path(handle, objects):
+    """
+    Path of the cached static library made of some objects,
+    in the QueueG cache, keyed on the contents of the objects
+    (which reflect the sources, the headers, and the flags).
+
+    :meta private:
+    """
+    h = hashlib.sha256()
+    h.update(handle.encode())
+    for obj in objects:
+        h.update(file_digest(obj).encode())
+    digest = h.hexdigest()
+    directory = create_dir(os_environ["HOME"], default_conf_stemlist + ["cache", "ar", digest[:2]])
+    return os_path_join(directory, f"{digest[2:]}.a")
+
+
@@ -0,0 +1,105 @@
+
+
+
+
+from os import (
+    environ as os_environ,
+)
+from os.path import (
+    join as os_path_join,
+    exists as os_path_exists,
+    isfile as os_path_isfile,
+)
+import hashlib
+import json
+
+from mv1fw import (
+    create_dir,
+)
+
+from ..._impl.ossys.ossys import default_conf_stemlist
+from ..._impl.ossys.scan import scan_tree
+from .compilecache import (
+    compiler_version,
+    dependencies,
+    file_digest,
+)
+
+
+# file written in a profile directory once the training succeeded
+profile_marker = "profile.json"
+
+# subdirectories of a profile directory: profile data, builds
+profile_data_stem = "data"
+profile_build_stem = "build"
+
+
+
+def profile_dir(
+        compiler_name,
+        source_names,
+        compiler_args,
+        include_paths,
+        library_paths,
+        library_handles,
+        training_args,
+        exec_name,
+        cwd,
+):
+    """
+    Directory of the profile of a target, in the QueueG cache,
+    keyed on the compiler version, the arguments, the contents
+    of the sources, of the headers they include (cf. ``-MM``),
+    and of the libraries linked from the library paths, and the training runs.
+
+    Returns:
+
+        string, or None if a source cannot be read.
+
+    :meta private:
+    """
+    h = hashlib.sha256()
+    h.update(compiler_version(compiler_name).encode())
+    h.update(json.dumps([compiler_name, compiler_args, include_paths, library_paths, library_handles, training_args, exec_name]).encode())
+    for name in source_names:
+        path = os_path_join(cwd, name)
+        if not os_path_isfile(path):
+            return None
+        h.update(name.encode())
+        h.update(file_digest(path).encode())
+    headers = dependencies(compiler_name, source_names, compiler_args, include_paths, cwd)
+    for path in (headers if headers is not None else []):
+        h.update(path.encode())
+        h.update(file_digest(path).encode())
+    # > static libraries built by the run (cf. add_archive) and other libraries of the library paths
+    for handle in library_handles:
+        for library_path in library_paths:
+            for ending in [".a", ".so"]:
+                path = os_path_join(cwd, library_path, f"lib{handle}{ending}")
+                if os_path_isfile(path):
+                    h.update(path.encode())
+                    h.update(file_digest(path).encode())
+    return create_dir(os_environ["HOME"], default_conf_stemlist + ["cache", "pgo", h.hexdigest()])
+
+
+
+def profile_files(data_dir):
+    """
+    Files of the profile data, as sorted absolute paths.
+
+    :meta private:
+    """
+    files, _ = scan_tree(data_dir, hidden=True)
+    return sorted([os_path_join(data_dir, rel) for rel in files])
+
+
+
+def trained(prof_dir):
+    """
+    Whether the training of a profile directory succeeded.
+
+    :meta private:
+    """
+    return os_path_exists(os_path_join(prof_dir, profile_marker))
+
+
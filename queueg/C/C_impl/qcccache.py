@@ -0,0 +1,165 @@
+
+
+
+
+from os import (
+    environ as os_environ,
+    replace as os_replace,
+    getpid as os_getpid,
+    listdir as os_listdir,
+)
+from os.path import (
+    join as os_path_join,
+    isfile as os_path_isfile,
+    isdir as os_path_isdir,
+    abspath as os_path_abspath,
+)
+import hashlib
+import json
+import shutil
+import threading
+
+from mv1fw import (
+    create_dir,
+)
+
+from ..._impl.ossys.ossys import default_conf_stemlist
+from ..._impl.ossys.scan import scan_tree
+from .compilecache import (
+    compiler_version,
+    dependencies,
+    file_digest,
+)
+
+
+# preprocessor listing the headers of a script (cf. dependencies)
+qcc_preprocessor = "cpp"
+
+# prefixes of the qcc arguments that the preprocessor takes
+preprocessor_prefixes = ["-D", "-U", "-I"]
+
+
+
+def tree_hash(path):
+    """
+    Hash of a directory tree (e.g. the Basilisk tree),
+    from the paths, sizes and modification times of its files,
+    so that no file is read. The tree is scanned at every call,
+    so that a rebuild (e.g. of ``$BASILISK``) during a session is seen.
+
+    :meta private:
+    """
+    files, _ = scan_tree(path)
+    h = hashlib.sha256()
+    for rel in sorted(files):
+        age, size = files[rel]
+        h.update(f"{rel}\0{age}\0{size}\n".encode())
+    return h.hexdigest()
+
+
+
+class QccCache:
+    """
+    Persistent cache of the C sources generated by
+    the Basilisk translator (``qcc -source``),
+    used by :any:`BasiliskRun` and :any:`BasiliskMPIRun` to skip the
+    translation of an unchanged script. The generated source is then
+    compiled through the :any:`CompileCache`, so an unchanged case
+    starts running at once.
+
+    The key hashes the qcc version, the qcc arguments and include paths,
+    the contents of the script and of the headers it includes
+    (as reported by the preprocessor, cf. ``-MM``, or else the headers
+    next to the script), and the Basilisk tree (``$BASILISK``,
+    or else the include paths), cf. :any:`tree_hash`.
+
+    The cache lives in the QueueG configuration directory, and is disabled
+    along with the compilation cache (``compile_cache = false`` in the Conf file).
+
+    Parameters:
+
+        path (optional string):
+            Root of the cache. (Default: ``cache/qcc`` in the QueueG configuration directory)
+
+    :meta private:
+    """
+
+    def __init__(
+            self,
+            path = None,
+    ):
+        if path is None:
+            path = create_dir(os_environ["HOME"], default_conf_stemlist + ["cache", "qcc"])
+        self.path = path
+
+
+    def key(
+            self,
+            script,
+            qcc_args,
+            include_paths,
+            cwd,
+    ):
+        """
+        Key of a translation.
+
+        Returns:
+
+            string, or None if the script cannot be read.
+
+        """
+        path = os_path_join(cwd, script)
+        if not os_path_isfile(path):
+            return None
+        h = hashlib.sha256()
+        h.update(compiler_version("qcc").encode())
+        h.update(json.dumps([script, qcc_args, include_paths]).encode())
+        h.update(file_digest(path).encode())
+        # > headers, as listed by the preprocessor (with the Basilisk tree as include path)
+        trees = [os_environ["BASILISK"]] if "BASILISK" in os_environ else include_paths
+        cpp_args = [arg for arg in qcc_args if any([arg.startswith(prefix) for prefix in preprocessor_prefixes])]
+        headers = dependencies(qcc_preprocessor, [script], cpp_args, include_paths + [tree for tree in trees if tree not in include_paths], cwd)
+        if headers is None:
+            # > else the local headers, included with quotes
+            directory = os_path_join(cwd, *script.split('/')[:-1])
+            headers = [os_path_join(directory, name) for name in sorted(os_listdir(directory)) if name.endswith(".h")]
+        for header in headers:
+            if header != os_path_abspath(path) and os_path_isfile(header):
+                h.update(header.encode())
+                h.update(file_digest(header).encode())
+        for tree in trees:
+            if os_path_isdir(tree):
+                h.update(tree.encode())
+                h.update(tree_hash(tree).encode())
+        return h.hexdigest()
+
+
+    def lookup(self, key, target_name):
+        """
+        Restore a cached translation to ``target_name``, if there is one.
+
+        Returns:
+
+            boolean, whether it was restored (hit).
+
+        """
+        blob = os_path_join(self.path, key[:2], f"{key[2:]}.c")
+        if not os_path_isfile(blob):
+            return False
+        shutil.copyfile(blob, target_name)
+        return True
+
+
+    def store(self, key, target_name):
+        """
+        Cache a translation, after a successful run of qcc.
+        """
+        directory = create_dir(self.path, key[:2])
+        blob = os_path_join(directory, f"{key[2:]}.c")
+        # > never expose a partial output: copy, then rename
+        # (one tmp name per thread: several runs may translate at once)
+        tmp = f"{blob}.{os_getpid()}.{threading.get_ident()}.tmp"
+        shutil.copyfile(target_name, tmp)
+        os_replace(tmp, blob)
+
+
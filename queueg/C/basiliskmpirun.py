@@ -2,9 +2,13 @@
 
 
 from .mpirun import MPIRun
+from .C_impl.qcccache import QccCache
 
 from os import \
     remove as os_remove
+from os.path import \
+    join as os_path_join, \
+    exists as os_path_exists
 
 from sys import platform
 
@@ -57,6 +61,8 @@ class BasiliskMPIRun(MPIRun):
             raise NotImplementedError
         self.qcc_args = ["-source", "-Wall", "-D_XOPEN_SOURCE=700", "-O3", "-D_MPI=1"]
         self.qcc_args += qcc_args if isinstance(qcc_args, list) else []
+        # > qcc translations are cached along with the compilations
+        self.qcc_cache = QccCache() if self.compile_cache is not None else None
         self.add_include_path_handles("basiliskmpirun_include")
         self.add_library_path_handles("basiliskmpirun_lib")
 
@@ -64,15 +70,26 @@ class BasiliskMPIRun(MPIRun):
 
 
     def _precompilation(self):
-        self._compilation(
-            compiler_name="qcc",
-            target_name=None,
-            source_names=[self.basilisk_script],
-            compiler_args = self.qcc_args,
-            include_paths=self.include_paths,
-            library_paths=[],
-            library_handles=[],
-        )
+        # > qcc writes the C source next to the script,
+        #   unless an unchanged translation is cached
+        translation = os_path_join(self.wdir, f"_{self.basilisk_script}")
+        key = None
+        if self.qcc_cache is not None:
+            key = self.qcc_cache.key(self.basilisk_script, self.qcc_args, self.include_paths, self.wdir)
+        if key is not None and self.qcc_cache.lookup(key, translation):
+            self._msg(f"source: {self.basilisk_script} (cached)", function="qcc", always=True)
+        else:
+            returncode = self._compilation(
+                compiler_name="qcc",
+                target_name=None,
+                source_names=[self.basilisk_script],
+                compiler_args = self.qcc_args,
+                include_paths=self.include_paths,
+                library_paths=[],
+                library_handles=[],
+            )
+            if key is not None and returncode == 0 and os_path_exists(translation):
+                self.qcc_cache.store(key, translation)
         self.source_names[0] = f"_{self.basilisk_script}"
 
 
@@ -84,7 +101,7 @@ class BasiliskMPIRun(MPIRun):
         # > copy qcc source(s) to info directory (for record-keeping)
         self.copy_files([f"_{self.basilisk_script}"], directory='info')
         # > remove qcc sources from working directory
-        os_remove(f"_{self.basilisk_script}")
+        os_remove(os_path_join(self.wdir, f"_{self.basilisk_script}"))
         # This almost certainly isn't necessary, but:
         # > restore the state to the expected one in the superclass
         self.source_names[0] = self.basilisk_script
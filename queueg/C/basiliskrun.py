@@ -2,9 +2,13 @@
 
 
 from .C_impl.crunbase import CRunBase
+from .C_impl.qcccache import QccCache
 
 from os import \
     remove as os_remove
+from os.path import \
+    join as os_path_join, \
+    exists as os_path_exists
 
 
 
@@ -78,18 +82,31 @@ class BasiliskRun(CRunBase):
         self.qcc_args = ["-source", "-Wall", "-O3"]
         self.qcc_args += qcc_args if isinstance(qcc_args, list) else []
         self.emit_c_source_only = emit_c_source_only
+        # > qcc translations are cached along with the compilations
+        self.qcc_cache = QccCache() if self.compile_cache is not None else None
 
 
     def _precompilation(self):
-        self._compilation(
-            compiler_name="qcc",
-            target_name=None,
-            source_names=[self.basilisk_script],
-            compiler_args = self.qcc_args,
-            include_paths=self.include_paths,
-            library_paths=[],
-            library_handles=[],
-        )
+        # > qcc writes the C source next to the script,
+        #   unless an unchanged translation is cached
+        translation = os_path_join(self.wdir, f"_{self.basilisk_script}")
+        key = None
+        if self.qcc_cache is not None:
+            key = self.qcc_cache.key(self.basilisk_script, self.qcc_args, self.include_paths, self.wdir)
+        if key is not None and self.qcc_cache.lookup(key, translation):
+            self._msg(f"source: {self.basilisk_script} (cached)", function="qcc", always=True)
+        else:
+            returncode = self._compilation(
+                compiler_name="qcc",
+                target_name=None,
+                source_names=[self.basilisk_script],
+                compiler_args = self.qcc_args,
+                include_paths=self.include_paths,
+                library_paths=[],
+                library_handles=[],
+            )
+            if key is not None and returncode == 0 and os_path_exists(translation):
+                self.qcc_cache.store(key, translation)
         self.source_names[0] = f"_{self.basilisk_script}"
         if self.emit_c_source_only:
             self.stop_flow = True
@@ -102,7 +119,7 @@ class BasiliskRun(CRunBase):
         # > copy qcc source(s) to info directory (for record-keeping)
         self.copy_files([f"_{self.basilisk_script}"], directory='info')
         # > remove qcc sources from working directory
-        os_remove(f"_{self.basilisk_script}")
+        os_remove(os_path_join(self.wdir, f"_{self.basilisk_script}"))
         # This almost certainly isn't necessary, but:
         # > restore the state to the expected one in the superclass
         self.source_names[0] = self.basilisk_script
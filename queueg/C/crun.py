@@ -24,6 +24,9 @@ class CRun(CRunBase):
             Pass a filename or list of filenames that should be copied
             to the working directory of the program's execution
             from the repository from where the code is launched.
+        parallel_build (boolean or integer):
+            Compile each translation unit separately, in parallel,
+            reusing unchanged objects, cf. :any:`CRunBase`. Default: False
     """
 
     def __init__(
@@ -35,6 +38,7 @@ class CRun(CRunBase):
             include_path_handles = None,
             library_path_handles = None,
             library_handles = None,
+            parallel_build = False,
     ):
         super().__init__(
             filename = filename,
@@ -47,6 +51,7 @@ class CRun(CRunBase):
             include_path_handles = ["crun_include"] if include_path_handles is None else ["crun_include"]+include_path_handles,
             library_path_handles = ["crun_lib"] if library_path_handles is None else ["crun_lib"]+library_path_handles,
             library_handles = ["m"] if library_handles is None else ["m"]+library_handles,
+            parallel_build = parallel_build,
         )
 
 
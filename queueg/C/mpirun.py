@@ -5,7 +5,75 @@
 
 
 
+from os import (
+    remove as os_remove,
+)
+from os.path import (
+    join as os_path_join,
+    exists as os_path_exists,
+)
+import json
+import time
+
+from mv1fw import (
+    create_dir,
+)
+
 from .C_impl.crunbase import CRunBase
+from .._impl.ossys.stream import run_logged
+
+
+# options of MPI launchers that set the number of processes
+process_count_options = ["-n", "-np", "--np"]
+
+
+
+def mpi_launcher(exec_name, n):
+    """
+    The launcher `exec_name` (e.g. ``["mpiexec", "-n", "4"]``),
+    with its number of processes set to `n`
+    (an option ``-n n`` is added after the launcher if it has none).
+
+    :meta private:
+    """
+    launcher = list(exec_name)
+    for i, arg in enumerate(launcher[:-1]):
+        if arg in process_count_options:
+            launcher[i+1] = str(n)
+            return launcher
+    return launcher[:1] + ["-n", str(n)] + launcher[1:]
+
+
+
+def scaling_metrics(rows, weak):
+    """
+    Set the speedup and the efficiency of the rows of a scaling study
+    (None for a failed configuration), relative to the first
+    configuration that ran, cf. :any:`MPIRun.scaling`.
+
+    Returns:
+
+        list of dict, the rows that ran.
+
+    :meta private:
+    """
+    done = [row for row in rows if row['time'] is not None]
+    for row in rows:
+        row['speedup'] = None
+        row['efficiency'] = None
+    if not done:
+        return done
+    n0 = done[0]['n']
+    t0 = done[0]['time']
+    for row in done:
+        if weak:
+            row['efficiency'] = t0/row['time']
+            row['speedup'] = row['efficiency']*row['n']/n0
+        else:
+            row['speedup'] = t0/row['time']
+            row['efficiency'] = row['speedup']*n0/row['n']
+    return done
+
 
 
 class MPIRun(CRunBase):
@@ -104,3 +172,183 @@ class MPIRun(CRunBase):
         self.add_library_handles("petsc")
 
 
+    def scaling(
+            self,
+            ns,
+            program_args = None,
+            sizes = None,
+            repeat = 3,
+            compiler_args = None,
+            plot = True,
+    ):
+        """
+        Strong or weak scaling study: compile once, then run
+        with each number of processes in turn, `repeat` times,
+        and tabulate the speedup and the efficiency,
+        relative to the first number of processes.
+
+        For a strong scaling study (the default), every run solves the same problem.
+        For a weak scaling study, `sizes` gives the arguments setting
+        the problem size for each number of processes.
+        The time of a configuration is the least wall time of its repetitions.
+        Strong scaling: speedup = T(n0)/T(n), efficiency = speedup * n0/n.
+        Weak scaling: efficiency = T(n0)/T(n), speedup = efficiency * n/n0 (scaled speedup).
+
+        The results are written to the location of the run:
+        ``scaling.txt`` (table), ``scaling.json``, and unless `plot` is False,
+        ``scaling.speedup.png`` and ``scaling.efficiency.png``.
+        Each configuration runs in its own subdirectory of the data directory,
+        with the launcher of the run (cf. ``exec_name``) set to its number of processes,
+        after the module invocation of the run.
+
+        Example:
+
+        .. code-block:: python
+
+            run = BasiliskMPIRun("cavity.c", location)
+            # strong scaling
+            run.scaling([1, 2, 4, 8, 16], program_args=["-level", "9"])
+            # weak scaling
+            run.scaling([1, 4, 16], sizes=[["-level", "8"], ["-level", "9"], ["-level", "10"]])
+
+        Arguments:
+
+            ns (list of integer):
+                numbers of processes.
+            program_args (optional list of string):
+                arguments of every run.
+            sizes (optional list of (list of string)):
+                for a weak scaling study, one list of arguments per number of processes,
+                appended to `program_args`.
+            repeat (integer):
+                number of runs per configuration. (Default: 3)
+            compiler_args (optional list of string):
+                cf. start()
+            plot (boolean):
+                whether to plot the speedup and the efficiency. (Default: True)
+
+        Returns:
+
+            list of dict, one per number of processes, with keys
+            'n', 'args', 'times', 'time', 'speedup', 'efficiency'
+            (time, speedup and efficiency are None if a run failed).
+
+        """
+        if self.SLURM_nonblocking:
+            raise ValueError("A scaling study cannot run in nonblocking (batch) mode.")
+        if sizes is not None and len(sizes) != len(ns):
+            raise ValueError("sizes must give one list of arguments per number of processes.")
+        self.init()
+        started = time.time()
+        self._record("running", started=started)
+        # > the launcher of the run, with n processes, after the module invocation if any
+        def launch(n):
+            launcher = mpi_launcher(self.exec_name, n)
+            if not self.module_invocation:
+                return launcher
+            return ["bash", "-c", f"{self.module_invocation}\nexec \"$@\"", "bash"] + launcher
+        try:
+            compiler_args_ = self._compiler_args(compiler_args)
+            program_args_ = program_args if program_args is not None else []
+            rows = []
+            if not self.stop_flow:
+                self._precompilation()
+            if not self.stop_flow:
+                self._build(compiler_args_)
+            if not self.stop_flow:
+                self._postcompilation()
+            target = os_path_join(self.data_dir, self.target_name)
+            if not self.stop_flow and os_path_exists(target):
+                for i, n in enumerate(ns):
+                    args = [str(x) for x in program_args_ + (sizes[i] if sizes is not None else [])]
+                    name = f"n{n}"
+                    path = create_dir(self.data_dir, name)
+                    self.copy_files(self.wdir_filenames, directory='data', subdir=name)
+                    times = []
+                    for _ in range(repeat):
+                        returncode, _, err, usage = run_logged(
+                            args=launch(n) + [target] + args,
+                            out_path=self._log_path(f"{self.target_name}.{name}", "out"),
+                            err_path=self._log_path(f"{self.target_name}.{name}", "err"),
+                            cwd=path,
+                            tail=self.log_tail,
+                        )
+                        self.resources.append(dict(step="scaling", command=name, **usage))
+                        if returncode != 0:
+                            self._msg(f"{name}: return code {returncode}\n" + '\n'.join(err), function="scaling", always=True)
+                            times = []
+                            break
+                        times.append(usage['wall'])
+                    if times:
+                        self._msg(f"{name} {' '.join(args)}: {min(times):.3f} s", function="scaling", always=True)
+                    rows.append({'n': n, 'args': args, 'times': times, 'time': min(times) if times else None})
+                os_remove(target)
+                self._scaling_report(rows, weak=sizes is not None, plot=plot)
+            if not self.stop_flow:
+                self._postrun()
+            self.deinit()
+            self.returncode = 0 if rows and all([row['time'] is not None for row in rows]) else 1
+            status = "done" if self.returncode == 0 else "failed"
+            usage = self._write_resources()
+        except BaseException:
+            # > a study that raised must not stay "running"
+            self._record("failed", duration=time.time() - started)
+            raise
+        self._record(status, duration=time.time() - started, usage=usage)
+        return rows
+
+
+    def _scaling_report(self, rows, weak, plot):
+        """
+        Compute the speedup and the efficiency of a scaling study,
+        and write its table, and plots, to the location of the run.
+
+        :meta private:
+        """
+        done = scaling_metrics(rows, weak)
+        if not done:
+            return
+        n0 = done[0]['n']
+        kind = "weak" if weak else "strong"
+        lines = [f"# {kind} scaling, relative to n = {n0}", "# n time speedup efficiency args"]
+        for row in rows:
+            if row['time'] is None:
+                lines.append(f"{row['n']} - - - {' '.join(row['args'])}")
+            else:
+                lines.append(f"{row['n']} {row['time']:.6f} {row['speedup']:.4f} {row['efficiency']:.4f} {' '.join(row['args'])}")
+        table = '\n'.join(lines) + '\n'
+        self._msg(f"\n{table}", function="scaling", always=True)
+        with open(self.location.filename("scaling.txt"), "w") as f:
+            f.write(table)
+        with open(self.location.filename("scaling.json"), "w") as f:
+            json.dump({'kind': kind, 'runs': rows}, f, indent=1)
+        if plot and len(done) > 1:
+            # > plotting is imported on demand (matplotlib)
+            from numpy import array as numpy_array
+            from mv1fw.visutil import Figure
+            fig = Figure()
+            ns = [row['n'] for row in done]
+            xlim = (min(ns), max(ns))
+            fig.multiseries(
+                filename=self.location.filename("scaling.speedup.png"),
+                title=f"{kind} scaling",
+                text="",
+                XYs=[
+                    numpy_array([[row['n'], row['speedup']] for row in done]),
+                    numpy_array([[n, n/n0] for n in ns]),
+                ],
+                inlabel="n",
+                outlabels=["speedup", "ideal"],
+                xlim=xlim,
+                ylim=None,
+            )
+            fig.multiseries(
+                filename=self.location.filename("scaling.efficiency.png"),
+                title=f"{kind} scaling",
+                text="",
+                XYs=[numpy_array([[row['n'], row['efficiency']] for row in done])],
+                inlabel="n",
+                outlabels=["efficiency"],
+                xlim=xlim,
+                ylim=(0.0, max(1.0, max([row['efficiency'] for row in done]))),
+            )
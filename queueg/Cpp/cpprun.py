@@ -23,6 +23,9 @@ class CppRun(CRunBase):
             Output path.
         cpp_version (string): integer specifying
             C++ version, e.g. '17', '20'.
+        parallel_build (boolean or integer):
+            Compile each translation unit separately, in parallel,
+            reusing unchanged objects, cf. :any:`CRunBase`. Default: False
 
     """
 
@@ -32,6 +35,7 @@ class CppRun(CRunBase):
             location,
             source_names = None,
             cpp_version = '17',
+            parallel_build = False,
     ):
         super().__init__(
             filename = filename,
@@ -43,6 +47,7 @@ class CppRun(CRunBase):
             include_path_handles = ["cpprun_include"],
             library_path_handles = ["cpprun_lib"],
             library_handles = ["m"],
+            parallel_build = parallel_build,
         )
 
 
@@ -3,7 +3,6 @@
 
 
 from os import (
-    chdir as os_chdir,
     getcwd as os_getcwd,
     chmod as os_chmod,
     remove as os_remove,
@@ -11,6 +10,7 @@ from os import (
 from os.path import join as os_path_join
 import subprocess
 import shutil
+import time
 
 
 from mv1fw import (
@@ -20,6 +20,13 @@ from mv1fw import (
 )
 
 from ..._impl.conf import Conf
+from ..._impl.catalog import Catalog
+from ..._impl.blobstore import BlobStore
+from ..._impl.ossys.usage import (
+    run_measured,
+    write_resources,
+    resources_file,
+)
 
 
 
@@ -93,16 +100,18 @@ class PythonRunBase:
             # everything below the runtag
             # in the project tree should be left alone (not cleaned).
             location.update_runtag('run')
-        conf = Conf()
+        conf = Conf.cached()
+        # > optional deduplication of copied files (cf. BlobStore)
+        self.blobs = BlobStore() if 'dedup' in conf and conf['dedup'] else None
+        self.location = location
         self.path = location.get_path(
             create = True,
             explicit_conf = conf,
         )
+        # > store the working directory at instantiation: the process-wide
+        #   working directory is never changed, every subprocess gets an explicit cwd,
+        #   so that several runs can share a process
         self.wdir = os_getcwd()
-        # The class is stateless (for repeated runs). We change the working directory
-        # in order to run Python files that implicitly drop files in the working directory.
-        # > store the working directory at instantiation
-        self.wdir_stateless = self.wdir
         if location.jumplist:
             self.wdir = os_path_join(self.wdir, *location.jumplist)
         # > for printing only
@@ -131,6 +140,10 @@ class PythonRunBase:
         self.script_name = "swh"
         self.info_dir = None
         self.data_dir = None
+        # return code of the last run, if it was run (blocking)
+        self.returncode = None
+        # resource usage of the subprocesses of the last run, cf. resources.json
+        self.resources = []
 
         # todo accord with other runbase types
         self.log = Logger()
@@ -152,11 +165,38 @@ class PythonRunBase:
 
         """
         self._init()
-        venv_args_ = venv_args if venv_args is not None else []
-        program_args_ = program_args if program_args is not None else []
-        self._prerun()
-        self._run(program_args_, venv_args_)
-        self._postrun()
+        started = time.time()
+        self._record("running", started=started)
+        try:
+            venv_args_ = venv_args if venv_args is not None else []
+            program_args_ = program_args if program_args is not None else []
+            self._prerun()
+            self._run(program_args_, venv_args_)
+            self._postrun()
+            if self.SLURM_nonblocking:
+                status = "queued"
+            else:
+                status = "done" if self.returncode == 0 else "failed"
+            usage = write_resources(os_path_join(self.info_dir, resources_file), self.resources)
+        except BaseException:
+            # > a run that raised must not stay "running"
+            self._record("failed", duration=time.time() - started)
+            raise
+        self._record(status, duration=time.time() - started, usage=usage)
+
+
+    def _record(self, status, started = None, duration = None, usage = None):
+        """
+        Record the run in the :any:`Catalog`.
+        """
+        Catalog().record(
+            location=self.location,
+            status=status,
+            started=started,
+            duration=duration,
+            path=self.path,
+            usage=usage,
+        )
 
     def _init(self):
         # > create output tree, now deleting all old data, if any exists
@@ -166,17 +206,13 @@ class PythonRunBase:
         # > a somewhat ad-hoc initialization of the cog manager,
         #  because we don't have the convenience of actions.
         self.cog.clean_tree()
+        self.resources = []
         self.info_dir = create_dir(self.cog.engine_dir, self.info_stem)
         self.data_dir = create_dir(self.cog.engine_dir, self.dat_stem)
         # > store a copy of the source files
         self.copy_files(self.source_names, directory='info')
 
 
-    def _deinit(self):
-        # > restore working directory, assuming even postrun might change it
-        os_chdir(self.wdir_stateless)
-
-
     def copy_files(self, names, directory):
         """
         Copy files described using relative filenames
@@ -203,16 +239,13 @@ class PythonRunBase:
             # todo windows
             fsplit = file.split('/')
             create_dir(tgt_dir, fsplit[:-1])
-            shutil.copy(
-                os_path_join(
-                    self.wdir,
-                    file,
-                ),
-                os_path_join(
-                    tgt_dir,
-                    file,
-                ),
-            )
+            src = os_path_join(self.wdir, file)
+            dst = os_path_join(tgt_dir, file)
+            if self.blobs is not None:
+                # > the program may write to its data directory
+                self.blobs.link(src, dst, writable=(directory == 'data'))
+            else:
+                shutil.copy(src, dst)
 
     def _prerun(self):
         pass
@@ -235,7 +268,7 @@ class PythonRunBase:
         target_name = self.source_names[0]
         # > quick and dirty solution todo fix
         self.copy_files(self.source_names, directory='data')
-        os_chdir(self.data_dir)
+        # Note: the script is run inside the data directory.
         if self.venv_manager == "conda":
             python_invoc = ["conda", "run", f"-n{self.env}", "python"]
         elif self.venv_manager == "venv":
@@ -255,10 +288,9 @@ class PythonRunBase:
             alist = python_invoc + [target_name] + program_args
             self._msg(f" < {' '.join(alist)}", function="run", always=True)
             try:
-                cp = subprocess.run(
-                    alist,
-                    capture_output=True,
-                )
+                cp, usage = run_measured(alist, cwd=self.data_dir, capture_output=True)
+                self.resources.append(dict(step="run", command=target_name, **usage))
+                self.returncode = cp.returncode
                 s = cp.stdout.decode("utf-8").strip()
                 self._msg(f" > {s}", function="run", always=True)
                 self._log(target_name, "out", s)
@@ -285,7 +317,7 @@ class PythonRunBase:
             script_list = ["srun"] + slurm_args + python_invoc + [target_name] + program_args
             script = f"#!/bin/bash\n\n{' '.join(script_list)}\n"
             # > create batch script
-            script_name = os_path_join(self.script_name)
+            script_name = os_path_join(self.data_dir, self.script_name)
             with open(script_name, "w") as f:
                 f.write(script)
             # > chmod +x
@@ -297,6 +329,7 @@ class PythonRunBase:
                 cp = subprocess.run(
                     alist,
                     capture_output=True,
+                    cwd=self.data_dir,
                 )
                 s = cp.stdout.decode("utf-8").strip()
                 self._msg(f" > {s}", function="run", always=True)
@@ -313,7 +346,6 @@ class PythonRunBase:
         # todo unmake subdirs in data dir from this copy - this is a placeholder to inspire something better later
         for srcn in self.source_names:
             os_remove(os_path_join(self.data_dir, srcn))
-        os_chdir(self.wdir)
 
 
     def _msg(self, body, function = None, always = False, as_is = False):
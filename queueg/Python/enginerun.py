@@ -11,12 +11,19 @@ from os import (
 from os.path import join as os_path_join
 import datetime
 import subprocess
+import time
 
 from mv1fw import (
     Logger,
 )
 
 from .._impl.conf import Conf
+from .._impl.catalog import Catalog
+from .._impl.ossys.usage import (
+    run_measured,
+    write_resources,
+    resources_file,
+)
 
 
 insertx = \
@@ -190,7 +197,8 @@ class EngineRun:
             # everything below the runtag
             # in the project tree should be left alone (not cleaned).
             location.update_runtag('run')
-        conf = Conf()
+        conf = Conf.cached()
+        self.location = location
         self.path = location.get_path(
             create = True,
             explicit_conf = conf,
@@ -263,6 +271,8 @@ class EngineRun:
         # todo accord with other runbase types
         self.log = Logger()
         self.log_err = Logger()
+        # resource usage of the cases run, cf. resources.json
+        self.resources = []
 
 
     def start(self):
@@ -281,6 +291,7 @@ class EngineRun:
 
 
     def _init(self):
+        self.resources = []
         # > truncate message if implicit runtag
         handle = '/'.join(self.handle_list if not self.implicit_runtag else self.handle_list[:-1])
         init_msg = f"Starting {handle}.\n"
@@ -342,15 +353,35 @@ class EngineRun:
         self._store_logs()
 
 
+    def _record(self, code, status, started = None, duration = None, usage = None):
+        """
+        Record the run of a case in the :any:`Catalog`.
+        """
+        Catalog().record(
+            location=self.location,
+            code=code if code else None,
+            status=status,
+            started=started,
+            duration=duration,
+            path=self.path,
+            usage=usage,
+        )
+
+
     def _start_subprocess(self, code):
         program_args = [self.path, self.reference_path, code]
+        started = time.time()
+        self._record(code, "running", started=started)
         try:
             # This will wait for the subprocess to finish.
             # See https://docs.python.org/3/library/subprocess.html#subprocess.run
-            cp = subprocess.run(
+            cp, usage = run_measured(
                 ["conda", "run", f"-n{self.env}", "python", os_path_join(self.wdir, filenamex)] + program_args,
                 capture_output=True,
-                )
+            )
+            self.resources.append(dict(step="run", command=code, **usage))
+            # > the usage of the cases run so far, next to the logs
+            write_resources(os_path_join(self.path, resources_file), self.resources)
             mr = self.multiple_runs()
             if mr:
                 self.log(f"Finished running case {code}.")
@@ -362,8 +393,14 @@ class EngineRun:
             # write the partial logs, helpful for long-running jobs
             # todo empty buffer and append, instead of cascading rewrites
             self._store_logs()
+            self._record(code, "done" if cp.returncode == 0 else "failed", duration=time.time() - started, usage=usage)
         except subprocess.CalledProcessError as exc:
             self.log(f"subprocess return code {exc.returncode}\n{exc}")
+            self._record(code, "failed", duration=time.time() - started)
+        except BaseException:
+            # > a run that raised must not stay "running"
+            self._record(code, "failed", duration=time.time() - started)
+            raise
 
 
 
@@ -427,6 +464,8 @@ class EngineRun:
             self._msg(f"return code {exc.returncode}\n{exc}", function="run", always=True)
         # > talk to the user
         self._msg(f"Submitted job to SLURM queue.")
+        for code in caselist:
+            self._record(code, "queued")
 
 
 
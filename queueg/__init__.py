@@ -1,9 +1,13 @@
 __all__ = [
     "experiment",
     #
+    "BlobStore",
     "Case",
+    "Catalog",
     "Conf",
     "Location",
+    "LocationSet",
+    "Retention",
     "Sync",
     "Test",
     "today",
@@ -48,78 +52,85 @@ __all__ = [
     "sortdown",
 ]
 
-# exposing the visutil sublibrary in mv1fw via queueg
-# because it is often useful in ad-hoc post-processing tasks
-from mv1fw.visutil import (
-    Figure,
-    Animation,
-    Graph,
-)
-from mv1fw import (
-    create_dir,
-    sortdown,
-)
-
-
-from ._impl import (
-    Case,
-    Conf,
-    Location,
-    Sync,
-    Test,
-    today,
-    thismonth,
-    thisyear,
-    Mode,
-    direct,
-    indirect,
-    Post,
-)
-
-
-from . import experiment
-
-
-
-
-from .C import (
-    CRun,
-    MPIRun,
-    BasiliskRun,
-    BasiliskMPIRun,
-)
-
-from .Cpp import (
-    CppRun,
-)
-
-from .Python import (
-    EngineRun,
-    PythonRun,
-)
-
-from .PyPinnch import (
-    PyPinnchRun,
-)
-
-
-# todo I wanted X.ossys but gave up
-from ._impl.ossys.ossys import (
-    ttyRead,
-    prompt_user,
-    copy,
-    now,
-    zip_something_up,
-    default_conf_stemlist,
-    conf_file,
-    default_index_stem,
-    current_jobs,
-)
-from ._impl.ossys.age import Age
-from ._impl.ossys.cmd import (
-    cmd_stat_fmt,
-    cmd_ls_fmt,
-)
+from importlib import import_module
+
+
+# Attributes are loaded on first access (PEP 562),
+# so that `import queueg` stays fast: the heavy dependencies
+# (paramiko, numpy, scipy, and matplotlib through mv1fw.visutil)
+# are only imported by the scripts that use them.
+# Each attribute is mapped to the module that defines it.
+_lazy = {
+    # exposing the visutil sublibrary in mv1fw via queueg
+    # because it is often useful in ad-hoc post-processing tasks
+    "Figure": "mv1fw.visutil",
+    "Animation": "mv1fw.visutil",
+    "Graph": "mv1fw.visutil",
+    "create_dir": "mv1fw",
+    "sortdown": "mv1fw",
+    #
+    "BlobStore": "._impl.blobstore",
+    "Case": "._impl.case",
+    "Catalog": "._impl.catalog",
+    "Conf": "._impl.conf",
+    "Location": "._impl.location",
+    "LocationSet": "._impl.location",
+    "Retention": "._impl.retention",
+    "Sync": "._impl.sync",
+    "Test": "._impl.test",
+    "today": "._impl.today",
+    "thismonth": "._impl.today",
+    "thisyear": "._impl.today",
+    "Mode": "._impl.mode",
+    "direct": "._impl.mode",
+    "indirect": "._impl.mode",
+    "Post": "._impl.post",
+    #
+    "CRun": ".C.crun",
+    "MPIRun": ".C.mpirun",
+    "BasiliskRun": ".C.basiliskrun",
+    "BasiliskMPIRun": ".C.basiliskmpirun",
+    #
+    "CppRun": ".Cpp.cpprun",
+    #
+    "EngineRun": ".Python.enginerun",
+    "PythonRun": ".Python.pythonrun",
+    #
+    "PyPinnchRun": ".PyPinnch.pypinnchrun",
+    #
+    # todo I wanted X.ossys but gave up
+    "ttyRead": "._impl.ossys.ossys",
+    "prompt_user": "._impl.ossys.ossys",
+    "copy": "._impl.ossys.ossys",
+    "now": "._impl.ossys.ossys",
+    "zip_something_up": "._impl.ossys.ossys",
+    "default_conf_stemlist": "._impl.ossys.ossys",
+    "conf_file": "._impl.ossys.ossys",
+    "default_index_stem": "._impl.ossys.ossys",
+    "current_jobs": "._impl.ossys.ossys",
+    "Age": "._impl.ossys.age",
+    "cmd_stat_fmt": "._impl.ossys.cmd",
+    "cmd_ls_fmt": "._impl.ossys.cmd",
+}
+
+
+# Subpackages, bound as attributes when first accessed.
+_subpackages = ["experiment", "C", "Cpp", "Python", "PyPinnch"]
+
+
+def __getattr__(name):
+    if name in _subpackages:
+        return import_module(f".{name}", __name__)
+    if name in _lazy:
+        value = getattr(import_module(_lazy[name], __name__), name)
+        # > later accesses do not come back here
+        globals()[name] = value
+        return value
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
 
 
 def version():
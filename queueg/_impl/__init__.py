@@ -1,7 +1,11 @@
 __all__ = [
+    "BlobStore",
     "Case",
+    "Catalog",
     "Conf",
     "Location",
+    "LocationSet",
+    "Retention",
     "Sync",
     "Test",
     "today",
@@ -13,12 +17,37 @@ __all__ = [
     "Post",
 ]
 
-from .case import Case
-from .conf import Conf
-from .location import Location
-from .sync import Sync
-from .test import Test
+from importlib import import_module
+
+# light, and eager: the submodule has the same name as the function
 from .today import today, thismonth, thisyear
-from .mode import Mode, direct, indirect
-from .post import Post
+
+# loaded on first access, cf. queueg.__getattr__
+_lazy = {
+    "BlobStore": ".blobstore",
+    "Case": ".case",
+    "Catalog": ".catalog",
+    "Conf": ".conf",
+    "Location": ".location",
+    "LocationSet": ".location",
+    "Retention": ".retention",
+    "Sync": ".sync",
+    "Test": ".test",
+    "Mode": ".mode",
+    "direct": ".mode",
+    "indirect": ".mode",
+    "Post": ".post",
+}
+
+
+def __getattr__(name):
+    if name in _lazy:
+        value = getattr(import_module(_lazy[name], __name__), name)
+        globals()[name] = value
+        return value
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
 
@@ -0,0 +1,213 @@
+
+
+
+
+import fcntl
+import hashlib
+import shutil
+import stat
+import threading
+from os import (
+    link as os_link,
+    remove as os_remove,
+    replace as os_replace,
+    chmod as os_chmod,
+    getpid as os_getpid,
+    stat as os_stat,
+    listdir as os_listdir,
+)
+from os.path import (
+    join as os_path_join,
+    exists as os_path_exists,
+    lexists as os_path_lexists,
+    isdir as os_path_isdir,
+)
+
+from mv1fw import (
+    create_dir,
+)
+
+from .conf import Conf
+
+
+# stem of the blob store, in the inventory directory
+blob_stem = "blobs"
+
+# ioctl request of a reflink (copy-on-write clone) on Linux,
+# supported by btrfs, XFS, and a few others
+FICLONE = 0x40049409
+
+
+
+def reflink(src, dst):
+    """
+    Clone a file without copying its data,
+    if the file system supports it. Raises OSError otherwise.
+
+    :meta private:
+    """
+    try:
+        with open(src, "rb") as fsrc, open(dst, "wb") as fdst:
+            fcntl.ioctl(fdst.fileno(), FICLONE, fsrc.fileno())
+    except OSError:
+        if os_path_exists(dst):
+            os_remove(dst)
+        raise
+
+
+
+def blob_digest(rel):
+    """
+    Hash of the content of a blob, from its path relative to the store
+    (cf. :any:`BlobStore.blob_path`).
+
+    :meta private:
+    """
+    stem, _, name = rel.rpartition('/')
+    return stem + name.split('.')[0]
+
+
+
+class BlobStore:
+    """
+    Content-addressed store of files, in the inventory directory.
+    Each distinct content is stored once, under its hash,
+    and linked into the trees that use it: runs of a sweep that
+    copy the same inputs share a single copy on disk.
+
+    The store is used by the Run classes, to copy source files and
+    working directory files into the output tree,
+    when the Conf file sets ``dedup = true``.
+
+    A blob is keyed on the content and on the mode of the files
+    it holds: read-only blobs (mode 0o444) are named by the hash alone,
+    and blobs of other modes (e.g. 0o644, or 0o755 for scripts)
+    by the hash and the mode, so that a content used with two modes
+    is stored twice. A file linked from the store is a reflink
+    (copy-on-write) where the file system supports it, otherwise a hard link
+    to the blob of its mode, unless it will be written to (cf. link()),
+    in which case it is a plain copy.
+
+    Parameters:
+
+        path (optional string):
+            Root of the store. (Default: ``blobs`` in the inventory directory)
+        algorithm (string):
+            Hash algorithm, cf. hashlib. (Default: "sha256")
+
+    """
+
+    def __init__(
+            self,
+            path = None,
+            algorithm = "sha256",
+    ):
+        if path is None:
+            path = create_dir(Conf.cached()['inventory_dir'], blob_stem)
+        self.path = path
+        self.algorithm = algorithm
+
+
+    def digest(self, src):
+        """
+        Hash of a file, hex string.
+        """
+        h = hashlib.new(self.algorithm)
+        with open(src, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                h.update(chunk)
+        return h.hexdigest()
+
+
+    def blob_path(self, digest, mode = 0o444):
+        """
+        Path of the blob of a given hash and mode. Blobs are spread
+        over subdirectories named by the first two hex digits.
+        """
+        name = digest[2:] if mode == 0o444 else f"{digest[2:]}.{mode:o}"
+        return os_path_join(self.path, digest[:2], name)
+
+
+    def __contains__(self, digest):
+        # > stored with any mode
+        directory = os_path_join(self.path, digest[:2])
+        if not os_path_isdir(directory):
+            return False
+        return any([name == digest[2:] or name.startswith(f"{digest[2:]}.") and not name.endswith(".tmp") for name in os_listdir(directory)])
+
+
+    def put(self, src, mode = 0o444):
+        """
+        Store a file, if its content is not stored already with this mode.
+
+        Arguments:
+
+            src (string):
+                path of the file
+            mode (integer):
+                mode of the blob (Default: 0o444, read-only)
+
+        Returns:
+
+            string, the hash of the file
+
+        """
+        digest = self.digest(src)
+        blob = self.blob_path(digest, mode)
+        if not os_path_exists(blob):
+            create_dir(self.path, digest[:2])
+            # > never expose a partial blob: copy, then rename
+            # (one tmp name per thread: runs of a sweep store concurrently)
+            tmp = f"{blob}.{os_getpid()}.{threading.get_ident()}.tmp"
+            shutil.copyfile(src, tmp)
+            os_chmod(tmp, mode)
+            os_replace(tmp, blob)
+        return digest
+
+
+    def link(
+            self,
+            src,
+            dst,
+            writable = False,
+    ):
+        """
+        Store a file, and link it to a destination
+        (replacing the destination if it exists).
+
+        Arguments:
+
+            src (string):
+                path of the file
+            dst (string):
+                path of the destination
+            writable (boolean):
+                Whether the destination will be written to.
+                If so, it is never a hard link. (Default: False)
+
+        Returns:
+
+            string, the hash of the file
+
+        """
+        mode = stat.S_IMODE(os_stat(src).st_mode)
+        digest = self.put(src, mode)
+        blob = self.blob_path(digest, mode)
+        if os_path_lexists(dst):
+            os_remove(dst)
+        try:
+            reflink(blob, dst)
+            shutil.copymode(src, dst)
+            return digest
+        except OSError:
+            pass
+        if not writable:
+            try:
+                os_link(blob, dst)
+                return digest
+            except OSError:
+                # e.g. another file system
+                pass
+        shutil.copyfile(blob, dst)
+        shutil.copymode(src, dst)
+        return digest
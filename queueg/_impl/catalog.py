@@ -0,0 +1,371 @@
+
+
+
+
+import sqlite3
+import time
+from contextlib import closing
+from os.path import (
+    join as os_path_join,
+)
+
+from .conf import Conf
+from .ossys.scan import scan_tree
+from .ossys.usage import resources_file
+
+
+# file name of the catalog, in the index directory
+catalog_file = "catalog.sqlite3"
+
+schema = """\
+CREATE TABLE IF NOT EXISTS runs (
+    path TEXT NOT NULL,
+    code TEXT NOT NULL DEFAULT '',
+    locale TEXT,
+    project TEXT,
+    date TEXT,
+    year INTEGER,
+    month INTEGER,
+    day INTEGER,
+    handle TEXT,
+    runtag TEXT,
+    status TEXT,
+    started REAL,
+    duration REAL,
+    size INTEGER,
+    cpu_user REAL,
+    cpu_sys REAL,
+    maxrss INTEGER,
+    inblock INTEGER,
+    oublock INTEGER,
+    nvcsw INTEGER,
+    nivcsw INTEGER,
+    updated REAL,
+    PRIMARY KEY (path, code)
+);
+CREATE INDEX IF NOT EXISTS runs_handle ON runs (handle);
+CREATE INDEX IF NOT EXISTS runs_date ON runs (year, month, day);
+CREATE INDEX IF NOT EXISTS runs_code ON runs (code);
+"""
+
+# columns of the resource accounting (added to older catalogs on open),
+# and the fields of a resource usage they hold, cf. ossys.usage
+usage_columns = {
+    "cpu_user": "user",
+    "cpu_sys": "sys",
+    "maxrss": "maxrss",
+    "inblock": "inblock",
+    "oublock": "oublock",
+    "nvcsw": "nvcsw",
+    "nivcsw": "nivcsw",
+}
+
+# subdirectories of the output tree of a run (data, and info or etc),
+# by which runs are found on disk, cf. find_runs
+run_marker_dirs = ["dat", "etc", "info"]
+
+# columns that can be queried, cf. Catalog.query
+query_columns = [
+    "path",
+    "code",
+    "locale",
+    "project",
+    "date",
+    "year",
+    "month",
+    "day",
+    "handle",
+    "runtag",
+    "status",
+]
+
+
+
+def split_location(location):
+    """
+    Split the stems of a :any:`Location` into
+    its project, datestamp and handle (cf. the documentation
+    of :any:`Location`): the handle is the last stems,
+    and the datestamp the numerical stems before it.
+
+    Returns:
+
+        triple of lists of string (project, date, handle)
+
+    :meta private:
+    """
+    stemlist = location.stemlist
+    h = len(stemlist) - location.handle_length
+    d = h
+    while d > 0 and stemlist[d-1].isdigit():
+        d -= 1
+    return stemlist[:d], stemlist[d:h], stemlist[h:]
+
+
+
+def find_runs(
+        path,
+        max_workers = None,
+):
+    """
+    Find the runs in a directory tree, with one scan (cf. :any:`scan_tree`):
+    the directories holding the output tree of a run,
+    i.e., a data or info directory (cf. ``run_marker_dirs``),
+    or the resource accounting of a run (``resources.json``).
+    The root itself may be a run. Runs may be nested
+    (e.g., the runtags of a run's handle), and the size of a run
+    does not include the runs nested in it.
+
+    Returns:
+
+        dict mapping the path of every run to its size in bytes.
+
+    :meta private:
+    """
+    files, dirs = scan_tree(path, max_workers=max_workers, hidden=True)
+    dirs_ = set(dirs)
+    inside = set()
+    stems = set()
+    # > parents before children
+    for stem in dirs:
+        parts = stem.split('/') if stem else []
+        if any(['/'.join(parts[:i]) in inside for i in range(1, len(parts) + 1)]):
+            # > in the output tree of a run
+            continue
+        prefix = f"{stem}/" if stem else ""
+        if any([f"{prefix}{name}" in dirs_ for name in run_marker_dirs]) or f"{prefix}{resources_file}" in files:
+            stems.add(stem)
+            inside |= {f"{prefix}{name}" for name in run_marker_dirs}
+    sizes = {stem: 0 for stem in stems}
+    for rel in files:
+        # > the innermost run holding the file
+        parts = rel.split('/')
+        for i in range(len(parts) - 1, -1, -1):
+            stem = '/'.join(parts[:i])
+            if stem in stems:
+                sizes[stem] += files[rel][1]
+                break
+    return {(os_path_join(path, stem) if stem else path): sizes[stem] for stem in sorted(stems)}
+
+
+
+class Catalog:
+    """
+    Catalog of the runs in the index, kept in an SQLite
+    database in the index directory (cf. the Conf file).
+    The Run classes record each run when it starts and when it ends,
+    and :any:`Sync.pull` records the runs it pulls,
+    so that runs can be found without walking the directory tree.
+
+    Example:
+
+    .. code-block:: python
+
+        # all runs of handle 'cavity/re100' in May, with case code A2
+        for run in Catalog().query(handle='cavity/re100', month=5, code='A2'):
+            print(run['path'], run['status'], run['duration'])
+
+    Parameters:
+
+        path (optional string):
+            Path of the database. (Default: ``catalog.sqlite3`` in the index directory)
+
+    """
+
+    def __init__(
+            self,
+            path = None,
+    ):
+        if path is None:
+            path = os_path_join(Conf.cached()['index_dir'], catalog_file)
+        self.path = path
+        with closing(self._connect()) as db:
+            db.executescript(schema)
+            columns = {row['name'] for row in db.execute("PRAGMA table_info(runs)")}
+            with db:
+                for column in usage_columns:
+                    if column not in columns:
+                        kind = "REAL" if column.startswith("cpu") else "INTEGER"
+                        try:
+                            db.execute(f"ALTER TABLE runs ADD COLUMN {column} {kind}")
+                        except sqlite3.OperationalError as exc:
+                            # > another process opening the catalog added it first
+                            if "duplicate column" not in str(exc):
+                                raise
+
+
+    def _connect(self):
+        """
+        :meta private:
+        """
+        # > runs of a sweep may record concurrently
+        db = sqlite3.connect(self.path, timeout=30.0)
+        db.row_factory = sqlite3.Row
+        return db
+
+
+    def record(
+            self,
+            location,
+            code = None,
+            status = "created",
+            started = None,
+            duration = None,
+            size = None,
+            path = None,
+            usage = None,
+    ):
+        """
+        Record a run, or update its record.
+
+        Arguments:
+
+            location (:any:`Location`):
+                location of the run.
+            code (optional string):
+                :any:`Case` code of the run.
+            status (string):
+                for example "running", "done", "failed", "queued", "pulled".
+            started (optional float):
+                start time, in seconds since the Epoch.
+                If None, the start time already recorded is kept.
+            duration (optional float):
+                duration of the run, in seconds.
+            size (optional integer):
+                size of the run, in bytes.
+                If None and the run is not running, the size of
+                the files under `path` is measured.
+            path (optional string):
+                path of the run (default: the path of the location).
+            usage (optional dict):
+                resource usage of the run (CPU time, maximum resident set size,
+                block I/O, context switches), cf. ``resources.json``.
+
+        """
+        path_ = path if path is not None else location.get_path()
+        project, date, handle = split_location(location)
+        if size is None and status != "running":
+            files, _ = scan_tree(path_)
+            size = sum([files[rel][1] for rel in files])
+        ymd = [int(stem) for stem in date] + [None, None, None]
+        usage_ = usage if usage is not None else {}
+        usage_values = tuple([usage_.get(usage_columns[column]) for column in usage_columns])
+        with closing(self._connect()) as db:
+            with db:
+                db.execute(
+                    "INSERT INTO runs (path, code, locale, project, date, year, month, day, "
+                    "handle, runtag, status, started, duration, size, "
+                    f"{', '.join(usage_columns)}, updated) "
+                    f"VALUES ({', '.join(['?']*(15 + len(usage_columns)))}) "
+                    "ON CONFLICT (path, code) DO UPDATE SET "
+                    "status = excluded.status, "
+                    "started = COALESCE(excluded.started, started), "
+                    "duration = COALESCE(excluded.duration, duration), "
+                    "size = COALESCE(excluded.size, size), "
+                    + ''.join([f"{column} = COALESCE(excluded.{column}, {column}), " for column in usage_columns])
+                    + "updated = excluded.updated",
+                    (
+                        path_,
+                        code if code is not None else "",
+                        location.locale,
+                        '/'.join(project),
+                        '/'.join(date),
+                        ymd[0],
+                        ymd[1],
+                        ymd[2],
+                        '/'.join(handle),
+                        location.runtag,
+                        status,
+                        started,
+                        duration,
+                        size,
+                    ) + usage_values + (
+                        time.time(),
+                    ),
+                )
+
+
+    def query(
+            self,
+            **kwargs,
+    ):
+        """
+        Find runs.
+
+        Arguments:
+
+            kwargs:
+                Conditions, one per column: path, code, locale, project,
+                date, year, month, day, handle, runtag, status.
+                Strings containing ``*`` are matched as glob patterns,
+                e.g., ``handle='cavity/*'``.
+
+        Returns:
+
+            list of dict, one per run, newest first.
+
+        """
+        where = []
+        values = []
+        for column in kwargs:
+            if column not in query_columns:
+                raise ValueError(f"Unknown catalog column {column}.")
+            value = kwargs[column]
+            if isinstance(value, str) and '*' in value:
+                where.append(f"{column} GLOB ?")
+            else:
+                where.append(f"{column} = ?")
+            values.append(value)
+        sql = "SELECT * FROM runs"
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        sql += " ORDER BY updated DESC"
+        with closing(self._connect()) as db:
+            return [dict(row) for row in db.execute(sql, values)]
+
+
+    def update(
+            self,
+            path,
+            status = None,
+            size = None,
+    ):
+        """
+        Update the status or the size of the records of a run,
+        for every :any:`Case` code.
+
+        Arguments:
+
+            path (string):
+                path of the run.
+            status (optional string):
+            size (optional integer):
+
+        """
+        with closing(self._connect()) as db:
+            with db:
+                db.execute(
+                    "UPDATE runs SET status = COALESCE(?, status), size = COALESCE(?, size), "
+                    "updated = ? WHERE path = ?",
+                    (status, size, time.time(), path),
+                )
+
+
+    def remove(
+            self,
+            path,
+    ):
+        """
+        Forget a run (every :any:`Case` code).
+
+        Arguments:
+
+            path (string):
+                path of the run.
+
+        """
+        with closing(self._connect()) as db:
+            with db:
+                db.execute("DELETE FROM runs WHERE path = ?", (path,))
+
+
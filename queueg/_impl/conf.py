@@ -4,6 +4,7 @@
 
 from os import (
     environ as os_environ,
+    stat as os_stat,
 )
 from os.path import (
     join as os_path_join,
@@ -22,6 +23,7 @@ from .ossys.ossys import (
 )
 
 
+import threading
 import tomli
 
 # todo 'pyp39' - we have to assume use of env called pyp39.
@@ -56,6 +58,9 @@ class Conf:
     Includes parsing, exception-handling,
     and some user notifications.
 
+    Most callers should use :any:`Conf.cached`,
+    which parses the conf file once per process.
+
     Parameters:
         explicit_path (string):
             read a conf file on a nonstandard path (cf. Sync)
@@ -76,6 +81,59 @@ class Conf:
         self._load(explicit_path)
 
 
+    # process-wide cache (cf. cached), guarded by _lock
+    _cache = {}
+    _lock = threading.Lock()
+
+
+    @classmethod
+    def cached(cls):
+        """
+        The process-wide Conf, parsed once and re-read only when
+        the conf file changes (its last-modified timestamp, or
+        its location through QUEUEG_CONF_DIR). Thread-safe.
+
+        The returned Conf is shared: it must not be modified.
+
+        Returns:
+            :any:`Conf`
+        """
+        conf_file_path = cls._conf_file_path()
+        with cls._lock:
+            entry = cls._cache.get(conf_file_path)
+            mtime = cls._mtime(conf_file_path)
+            if entry is None or mtime is None or entry[0] != mtime:
+                conf = cls()
+                # > the first read may have written the file
+                entry = (cls._mtime(conf_file_path), conf)
+                cls._cache[conf_file_path] = entry
+            return entry[1]
+
+
+    @staticmethod
+    def _conf_file_path():
+        """
+        Path of the conf file, as read by _load.
+
+        :meta private:
+        """
+        conf_dir_v = "QUEUEG_CONF_DIR"
+        if conf_dir_v in os_environ:
+            return os_path_join(os_environ[conf_dir_v], conf_file)
+        return os_path_join(os_environ["HOME"], *default_conf_stemlist, conf_file)
+
+
+    @staticmethod
+    def _mtime(path):
+        """
+        :meta private:
+        """
+        try:
+            return os_stat(path).st_mtime_ns
+        except OSError:
+            return None
+
+
     def __getitem__(self, x):
         # todo error handling, or let python error handling take care of it?
         return self.confdict[x]
@@ -4,6 +4,8 @@ from os import (
     getcwd as os_getcwd,
     listdir as os_listdir,
     remove as os_remove,
+    makedirs as os_makedirs,
+    mkdir as os_mkdir,
 )
 from os.path import (
     join as os_path_join,
@@ -11,6 +13,7 @@ from os.path import (
     split as os_path_split,
     isdir as os_path_isdir,
     isfile as os_path_isfile,
+    normpath as os_path_normpath,
 )
 
 from mv1fw import (
@@ -344,7 +347,7 @@ class Location:
             base = os_getcwd()
             stemlist = []
         else:
-            conf = explicit_conf if explicit_conf is not None else Conf()
+            conf = explicit_conf if explicit_conf is not None else Conf.cached()
             base = conf[f'{self.locale}_dir']
             stemlist = self.stemlist
         if create:
@@ -458,6 +461,94 @@ class Location:
 
 
 
+    def derive(
+            self,
+            runtag = None,
+            jump = None,
+    ):
+        """
+        A new location, extending this one with a jump
+        and/or replacing its runtag, without resolving
+        the handle again (cf. :any:`LocationSet`).
+
+        Arguments:
+
+            runtag (optional string):
+                runtag of the new location (default: the same runtag)
+            jump (optional string):
+                jump appended to the handle, cf. :any:`Location`.
+
+        Returns:
+
+                :any:`Location`
+
+        """
+        out = Location.__new__(Location)
+        out.locale = self.locale
+        out.stemlist = list(self.stemlist)
+        out.handle_length = self.handle_length
+        out.jumplist = list(self.jumplist) if self.jumplist is not None else None
+        out.runtag = self.runtag if runtag is None else runtag
+        if jump is not None:
+            jumplist = jump.split('/')
+            out.stemlist += jumplist
+            out.handle_length += len(jumplist)
+            out.jumplist = (out.jumplist or []) + jumplist
+        return out
+
+
+    @classmethod
+    def from_path(
+            cls,
+            path,
+            locale = 'index',
+            explicit_conf = None,
+    ):
+        """
+        The location of a path in a locale, read from its stems:
+        the project is the stems before the first numeric stem,
+        the datestamp the numeric stems that follow,
+        and the handle the remaining stems (the runtag,
+        if any, cannot be told apart and is part of the handle).
+
+        Arguments:
+
+            path (string):
+                an absolute path in the locale.
+            locale (string):
+                cf. :any:`Location`. (Default: 'index')
+            explicit_conf (optional :any:`Conf`):
+                cf. :any:`Location.get_path`.
+
+        Returns:
+
+                :any:`Location`, or None if the path is not
+                in the locale, or has no datestamp or no handle.
+
+        """
+        conf = explicit_conf if explicit_conf is not None else Conf.cached()
+        root = os_path_normpath(conf[f'{locale}_dir'])
+        path_ = os_path_normpath(path)
+        if not path_.startswith(root.rstrip('/') + '/'):
+            return None
+        stemlist = path_[len(root.rstrip('/')) + 1:].split('/')
+        d = 0
+        while d < len(stemlist) and not stemlist[d].isdigit():
+            d += 1
+        h = d
+        while h < len(stemlist) and stemlist[h].isdigit():
+            h += 1
+        if d == len(stemlist) or h == len(stemlist):
+            return None
+        out = cls.__new__(cls)
+        out.locale = locale
+        out.stemlist = stemlist
+        out.handle_length = len(stemlist) - h
+        out.jumplist = None
+        out.runtag = None
+        return out
+
+
     def get_handle_list(self):
         """
         Obtain the handle list, including the runtag.
@@ -473,3 +564,111 @@ class Location:
         if self.runtag:
             out += [self.runtag]
         return out
+
+
+
+
+
+class LocationSet:
+    """
+    A batch of locations sharing a base :any:`Location`,
+    for sweeps: one location per runtag, per jump,
+    or per pair (jump, runtag).
+    The handle of the base is resolved once, the root path is
+    computed once, and :any:`LocationSet.get_paths` creates
+    the whole directory tree at once, with one ``mkdir``
+    per missing directory.
+
+    Example:
+
+    .. code-block:: python
+
+        locations = LocationSet(
+            Location(project='sweeps', dateYMD=today()),
+            runtags = [f"r{i}" for i in range(10000)],
+        )
+        paths = locations.get_paths(create=True)
+
+    Parameters:
+
+        location (:any:`Location`):
+            the base location.
+        runtags (optional list of string):
+            runtags, cf. :any:`Location`.
+        jumps (optional list of string):
+            jumps, cf. :any:`Location`.
+            If runtags are given too, every jump is combined with every runtag.
+
+    """
+
+    def __init__(
+            self,
+            location,
+            runtags = None,
+            jumps = None,
+    ):
+        self.location = location
+        self.runtags = runtags if runtags is not None else [None]
+        self.jumps = jumps if jumps is not None else [None]
+        self.locations = [
+            location.derive(runtag=runtag, jump=jump)
+            for jump in self.jumps
+            for runtag in self.runtags
+        ]
+
+
+    def __len__(self):
+        return len(self.locations)
+
+
+    def __iter__(self):
+        return iter(self.locations)
+
+
+    def __getitem__(self, i):
+        return self.locations[i]
+
+
+    def get_paths(
+            self,
+            create = False,
+            explicit_conf = None,
+    ):
+        """
+        Paths of all the locations, cf. :any:`Location.get_path`.
+
+        Arguments:
+
+            create (boolean):
+                Whether to create the directories. Default: False
+            explicit_conf (optional :any:`Conf`):
+                cf. :any:`Location.get_path`.
+
+        Returns:
+
+                list of string, one path per location, in order.
+
+        """
+        # > shared prefix, resolved once
+        root = self.location.get_root_path(create=create, explicit_conf=explicit_conf)
+        base_jump = len(self.location.jumplist) if self.location.jumplist is not None else 0
+        paths = []
+        stems = set()
+        for location in self.locations:
+            stemlist = location.jumplist[base_jump:] if location.jumplist is not None else []
+            if location.runtag is not None:
+                stemlist = stemlist + [location.runtag]
+            paths.append(os_path_join(root, *stemlist))
+            for i in range(1, len(stemlist) + 1):
+                stems.add(tuple(stemlist[:i]))
+        if create:
+            os_makedirs(root, exist_ok=True)
+            # > parents before children, one mkdir per directory
+            for stem in sorted(stems, key=len):
+                try:
+                    os_mkdir(os_path_join(root, *stem))
+                except FileExistsError:
+                    pass
+        return paths
+
+
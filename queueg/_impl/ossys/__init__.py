@@ -11,6 +11,15 @@ __all__ = [
     "Age",
     "cmd_stat_fmt",
     "cmd_ls_fmt",
+    "scan_tree",
+    "remove_tree",
+    "run_logged",
+    "tail_lines",
+    "run_measured",
+    "wait_measured",
+    "total_usage",
+    "write_resources",
+    "resources_file",
 ]
 
 
@@ -28,6 +37,14 @@ from .age import Age
 from .cmd import \
     cmd_stat_fmt, \
     cmd_ls_fmt
+from .scan import scan_tree, remove_tree
+from .stream import run_logged, tail_lines
+from .usage import \
+    run_measured, \
+    wait_measured, \
+    total_usage, \
+    write_resources, \
+    resources_file
 
 
 
@@ -3,12 +3,11 @@
 
 
 import datetime
+import stat
 
 from os import \
-    popen as os_popen
-from os.path import \
-    exists as os_path_exists
-from .cmd import cmd_stat_fmt
+    stat as os_stat, \
+    DirEntry as os_DirEntry
 
 # the number of seconds since the Epoch,
 # 1970-01-01 00:00:00 +0000  (UTC)
@@ -24,6 +23,9 @@ class Age:
     Often referred to as the "last modified" timestamp.
     (By timestamp we mean the datetime.)
     If the file does not exist, the age is 0.
+    Local files are read with a single ``stat`` system call,
+    at nanosecond resolution (cf. ``ns``),
+    and many files at once with :any:`Age.batch`.
 
     Parameters:
         path (string):
@@ -31,6 +33,18 @@ class Age:
             If None, a time of "now" (current datetime) is created. (default: None)
         age (string or integer):
             An age as timestamp, in seconds since Epoch.
+
+    Attributes:
+        dtint (integer):
+            The age in seconds since Epoch.
+        ns (integer):
+            The age in nanoseconds since Epoch.
+        resolution (integer):
+            The resolution of the age, in nanoseconds:
+            1 for a local file, 1000000000 for an age in seconds.
+            Two ages are compared at the coarser of their resolutions,
+            so that a file read locally and the same file
+            seen remotely (in seconds) are equal.
     """
 
     #     todo somewhat deprecated, after learning about strftime,
@@ -42,19 +56,18 @@ class Age:
             age = None,
     ):
         if path is not None:
-            # S string output
-            # m date modified
-            # t format, passed to strftime
-            if os_path_exists(path):
-                cmd = cmd_stat_fmt(path)
-                stat_ = os_popen(cmd).read().strip()
-                self.dtint = int(stat_)
-            else:
-                self.dtint = 0
+            try:
+                self._set_ns(os_stat(path))
+            except OSError:
+                self._set_ns(None)
         elif age is not None:
             self.dtint = int(age) if age != '' else 0
+            self.ns = self.dtint * 1000000000
+            self.resolution = 1000000000
         else:
             self.dtint = int(datetime.datetime.now().strftime(fmt))
+            self.ns = self.dtint * 1000000000
+            self.resolution = 1000000000
 
         # some nonsense
         """
@@ -70,10 +83,67 @@ class Age:
         :return: boolean
         """
 
+
+    def _set_ns(self, st):
+        """
+        Set the age from a stat result, 0 unless a regular file.
+
+        :meta private:
+        """
+        self.resolution = 1
+        if st is not None and stat.S_ISREG(st.st_mode):
+            self.ns = st.st_mtime_ns
+            self.dtint = self.ns // 1000000000
+        else:
+            self.ns = 0
+            self.dtint = 0
+
+
+    @classmethod
+    def batch(cls, paths):
+        """
+        Ages of many files in one pass, without
+        going through :any:`Age` construction path by path.
+        Directory entries (as yielded by ``os.scandir``)
+        are accepted in place of paths; their stat result
+        is reused when the scan has already read it.
+
+        Arguments:
+            paths (list of string or os.DirEntry):
+
+        Returns:
+            list of :any:`Age`, in the order of ``paths``.
+        """
+        out = []
+        for path in paths:
+            age = cls.__new__(cls)
+            try:
+                if isinstance(path, os_DirEntry):
+                    age._set_ns(path.stat())
+                else:
+                    age._set_ns(os_stat(path))
+            except OSError:
+                age._set_ns(None)
+            out.append(age)
+        return out
+
+
+    def _common(self, b):
+        """
+        Both ages, at the coarser of their resolutions.
+
+        :meta private:
+        """
+        resolution = max(self.resolution, b.resolution)
+        return self.ns // resolution, b.ns // resolution
+
+
     def __lt__(self, b):
-        return self.dtint < b.dtint
+        x, y = self._common(b)
+        return x < y
     def __eq__(self, b):
-        return self.dtint == b.dtint
+        x, y = self._common(b)
+        return x == y
 
     def __str__(self):
         return str(datetime.datetime.fromtimestamp(self.dtint))
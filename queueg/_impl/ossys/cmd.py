@@ -24,14 +24,14 @@ def cmd_stat_fmt(path, uname = None):
         raise ValueError
     if uname is None:
         if platform.startswith('linux'):
-            return f"test -f {path} && stat -c %X {path}"
+            return f"test -f {path} && stat -c %Y {path}"
         elif platform.startswith('darwin'):
             return f"test -f {path} && stat -f %m {path}"
         else:
             raise NotImplementedError
     else:
         if uname == 'Linux':
-            return f"test -f {path} && stat -c %X {path}"
+            return f"test -f {path} && stat -c %Y {path}"
         elif uname == 'Darwin':
             return f"test -f {path} && stat -f %m {path}"
         else:
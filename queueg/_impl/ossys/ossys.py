@@ -5,9 +5,16 @@
 import os
 import sys
 import tty, termios
-import re
+import json
+import tarfile
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
-from zipfile import ZipFile
+from zipfile import (
+    ZipFile,
+    ZipInfo,
+    ZIP_DEFLATED,
+)
 
 
 
@@ -17,6 +24,14 @@ conf_file = "config.toml"
 default_index_stem = "QueueGindex"
 default_inventory_stem = "QueueGinventory"
 
+# archive constants (cf. zip_something_up)
+archive_formats = ["zip", "tar.zst", "tar"]
+# files larger than this are compressed as they are read,
+# instead of being read ahead
+zip_stream_threshold = 1 << 26
+# bytes read ahead, in all, while a zip archive is written
+zip_read_ahead = 1 << 26
+
 # sync constant strings
 current_jobs = "current_jobs.txt"
 # pretty print of job status
@@ -120,16 +135,70 @@ def copy(filename, stem1 = '.', stem2 = '.'):
 
 
 
+def _read(file):
+    """
+    Read a file, in a reading thread.
+
+    :meta private:
+    """
+    with open(file, "rb") as f:
+        return f.read()
+
+
+
+def _walk_sources(sources, zip_root, skip_unix_hidden):
+    """
+    Walk the sources, yielding (file, arcname, stat result)
+    while walking.
+
+    :meta private:
+    """
+    for root_dir in sources:
+        stems = sources[root_dir]
+        root_dir = os.path.abspath(root_dir)
+        for stem in stems:
+            skip_dirs = stems[stem]
+            tgt_dir = os.path.abspath(os.path.join(root_dir, stem))
+            for path, subdirs, fnames in os.walk(tgt_dir):
+                for skip_dir in skip_dirs:
+                    if skip_dir in subdirs:
+                        subdirs.remove(skip_dir)
+                for fname in fnames:
+                    if skip_unix_hidden and fname[0] == '.':
+                        continue
+                    file = os.path.join(path, fname)
+                    try:
+                        # > prevent attempting to write aliases (broken links)
+                        st = os.stat(file)
+                    except OSError:
+                        continue
+                    yield file, os.path.join(zip_root, os.path.relpath(file, root_dir)), st
+
+
+
 def zip_something_up(
         sources,
         zip_root,
         zip_path = '.',
         skip_unix_hidden = True,
         dryrun = False,
+        fmt = "zip",
+        level = None,
+        max_workers = None,
+        incremental = False,
 ):
     """
     Create archive using ``sources`` information,
     with the option to skip over unwanted subdirectories and hidden files.
+    Files are archived while the sources are walked.
+    For a zip archive, files are read ahead by a pool of threads
+    (reading dominates on network file systems), and deflated in order
+    as they are written, except for large files, which are
+    compressed as they are read. The compression of a zip archive
+    is single-core: zipfile deflates each entry as it writes it.
+    For a large archive where the compression dominates, use ``fmt="tar.zst"``:
+    a tar+zstd archive is compressed by the multithreaded zstd compressor,
+    which needs the ``zstandard`` package.
 
     Arguments:
 
@@ -149,41 +218,131 @@ def zip_something_up(
         dryrun (boolean):
             Print target files detected and quit early.
             (Default: False)
+        fmt (string):
+            "zip", "tar.zst" or "tar". (Default: "zip")
+        level (optional integer):
+            Compression level. (Default: 6 for zip, 3 for zstd)
+        max_workers (optional integer):
+            Number of threads reading ahead (zip, which compresses on one core)
+            or compressing (zstd). (Default: one per core)
+        incremental (boolean):
+            Archive only the files added or changed since the last archive
+            of the same name, in a new archive ``<zip_root>.<n>.<fmt>``.
+            The files of each archive are recorded in a manifest
+            ``<zip_root>.manifest.json`` next to the archives. (Default: False)
+
+    Returns:
+
+        string, path of the archive (None for a dry run).
 
     :meta private:
     """
-    files_dict = {}
-    for root_dir in sources:
-        stems = sources[root_dir]
-        root_dir = os.path.abspath(root_dir)
-        files_dict[root_dir] = []
-        for stem in stems:
-            skip_dirs = stems[stem]
-            tgt_dir = os.path.abspath(os.path.join(root_dir, stem))
-            files = []
-            for path, subdirs, fnames in os.walk(tgt_dir):
-                for skip_dir in skip_dirs:
-                    if skip_dir in subdirs:
-                        subdirs.remove(skip_dir)
-                for fname in fnames:
-                    if skip_unix_hidden and fname[0] == '.':
-                        pass
-                    else:
-                        file = os.path.abspath(os.path.join(path, fname))
-                        files.append(file)
-            files_dict[root_dir] += files
+    if fmt not in archive_formats:
+        raise ValueError(f"Unrecognized archive format {fmt}.")
+    manifest_path = os.path.join(zip_path, f"{zip_root}.manifest.json")
+    manifest = {}
+    if incremental and os.path.exists(manifest_path):
+        with open(manifest_path, "r") as f:
+            manifest = json.load(f)
+    entries = (
+        (file, arcname, st)
+        for file, arcname, st in _walk_sources(sources, zip_root, skip_unix_hidden)
+        if manifest.get(arcname) != [st.st_mtime_ns, st.st_size]
+    )
     if dryrun:
-        print(f"[zip_something_up] Files:\n{files_dict}")
+        files = [file for file, _, _ in entries]
+        print(f"[zip_something_up] Files:\n{files}")
         print(f"[zip_something_up] dryrun {dryrun}, no zip file was created")
+        return None
+    target_name = zip_root
+    if incremental and manifest:
+        n = 1
+        while os.path.exists(os.path.join(zip_path, f"{zip_root}.{n}.{fmt}")):
+            n += 1
+        target_name = f"{zip_root}.{n}"
+    target_path = os.path.join(zip_path, f"{target_name}.{fmt}")
+    if fmt == "zip":
+        archived = _zip_impl(target_path, entries, 6 if level is None else level, max_workers)
     else:
-        with ZipFile(f"{zip_path}/{zip_root}.zip", 'w') as target:
-            for root_dir in files_dict:
-                files = files_dict[root_dir]
-                for file in files:
-                    # > prevent attempting to write aliases
-                    if os.path.exists(file):
-                        arcname = re.sub(root_dir, zip_root, file)
-                        target.write(file, arcname=arcname)
+        archived = _tar_impl(target_path, entries, fmt, 3 if level is None else level, max_workers)
+    if incremental:
+        manifest.update(archived)
+        with open(manifest_path, "w") as f:
+            json.dump(manifest, f)
+    return target_path
+
+
+
+def _zip_impl(target_path, entries, level, max_workers):
+    """
+    Write a zip archive, reading ahead in a pool of threads.
+    The entries are deflated one at a time, in this thread, by zipfile
+    (its public API takes no compressed data): only reading is parallel.
+
+    Returns:
+
+        dict mapping each archived name to [mtime (ns), size].
+
+    :meta private:
+    """
+    archived = {}
+    workers = max_workers if max_workers is not None else (os.cpu_count() or 1)
+    pending = deque()
+    ahead = [0]
+    with ZipFile(target_path, 'w') as target, ThreadPoolExecutor(max_workers=workers) as pool:
+        def drain(bound):
+            # > in order, with at most `bound` bytes read ahead
+            while pending and ahead[0] > bound:
+                file, arcname, size, future = pending.popleft()
+                ahead[0] -= size
+                zinfo = ZipInfo.from_file(file, arcname)
+                zinfo.compress_type = ZIP_DEFLATED
+                target.writestr(zinfo, future.result(), compresslevel=level)
+        for file, arcname, st in entries:
+            archived[arcname] = [st.st_mtime_ns, st.st_size]
+            if st.st_size > zip_stream_threshold:
+                # > large files are not read into memory
+                drain(-1)
+                target.write(file, arcname=arcname, compress_type=ZIP_DEFLATED, compresslevel=level)
+            else:
+                # (empty files count too, so that the queue stays bounded)
+                pending.append((file, arcname, st.st_size + 1, pool.submit(_read, file)))
+                ahead[0] += st.st_size + 1
+                drain(zip_read_ahead)
+        drain(-1)
+    return archived
+
+
+
+def _tar_impl(target_path, entries, fmt, level, max_workers):
+    """
+    Write a tar archive, optionally through a zstd compressor.
+
+    Returns:
+
+        dict mapping each archived name to [mtime (ns), size].
+
+    :meta private:
+    """
+    archived = {}
+    if fmt == "tar.zst":
+        try:
+            import zstandard
+        except ImportError:
+            raise ImportError("Archive format tar.zst needs the zstandard package (pip install zstandard).")
+    with open(target_path, "wb") as f:
+        if fmt == "tar.zst":
+            threads = max_workers if max_workers is not None else -1
+            stream = zstandard.ZstdCompressor(level=level, threads=threads).stream_writer(f)
+        else:
+            stream = f
+        with tarfile.open(fileobj=stream, mode="w|") as tar:
+            for file, arcname, st in entries:
+                archived[arcname] = [st.st_mtime_ns, st.st_size]
+                tar.add(file, arcname=arcname, recursive=False)
+        if stream is not f:
+            stream.close()
+    return archived
 
 
 
@@ -0,0 +1,169 @@
+
+
+
+
+from os import (
+    scandir as os_scandir,
+    cpu_count as os_cpu_count,
+    remove as os_remove,
+    rmdir as os_rmdir,
+)
+from os.path import (
+    isdir as os_path_isdir,
+    join as os_path_join,
+)
+from concurrent.futures import (
+    ThreadPoolExecutor,
+    wait,
+    FIRST_COMPLETED,
+)
+
+
+
+def _scan_dir(path, stem, hidden = False):
+    """
+    List one directory.
+
+    :meta private:
+    """
+    files = {}
+    subdirs = []
+    try:
+        with os_scandir(path) as it:
+            for entry in it:
+                # > hidden artifacts are not listed (cf. ls)
+                if entry.name[0] == '.' and not hidden:
+                    continue
+                rel = f"{stem}/{entry.name}" if stem else entry.name
+                if entry.is_dir(follow_symlinks=False):
+                    subdirs.append((entry.path, entry.name, rel))
+                else:
+                    st = entry.stat(follow_symlinks=False)
+                    files[rel] = (int(st.st_mtime), st.st_size)
+    except OSError:
+        # unreadable directory: skip it, like ls does
+        pass
+    return stem, files, subdirs
+
+
+
+def scan_tree(
+        path,
+        pass_dirs = None,
+        max_workers = None,
+        hidden = False,
+):
+    """
+    Scan a local directory tree in-process, with a pool
+    of threads listing subdirectories concurrently.
+    On network file systems (NFS, Lustre, ...) the latency of
+    each listing dominates, so listing many directories
+    at once is much faster than a serial walk.
+
+    Gives the same result as parsing ``ls -lR`` (cf. :any:`cmd_ls_fmt`):
+    hidden artifacts are skipped, symbolic links are not followed,
+    and ages are last-modified timestamps in seconds since the Epoch.
+
+    Arguments:
+
+        path (string):
+            root of the directory tree
+        pass_dirs (optional list of string):
+            Names of directories to skip. They are skipped
+            during the walk: their contents are never listed.
+        max_workers (optional integer):
+            Number of threads. (Default: four per core, at most 32)
+        hidden (boolean):
+            List hidden artifacts too. (Default: False)
+
+    Returns:
+
+        pair (files, dirs), where `files` is a dict mapping
+            the path of every file relative to `path`
+            to a pair (age, size), and `dirs` is the list of
+            the directories, relative to `path`, that were scanned
+            (the root is the empty string).
+
+    :meta private:
+    """
+    if not os_path_isdir(path):
+        return {}, []
+    pass_dirs_ = set(pass_dirs) if pass_dirs is not None else set()
+    workers = max_workers if max_workers is not None else min(32, 4 * (os_cpu_count() or 1))
+    files = {}
+    dirs = []
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        pending = {pool.submit(_scan_dir, path, "", hidden)}
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                stem, dfiles, subdirs = future.result()
+                dirs.append(stem)
+                files.update(dfiles)
+                for subpath, name, rel in subdirs:
+                    if name not in pass_dirs_:
+                        pending.add(pool.submit(_scan_dir, subpath, rel, hidden))
+    # > the walk order is not deterministic
+    dirs.sort()
+    files = dict(sorted(files.items()))
+    return files, dirs
+
+
+
+def _remove_quietly(path):
+    """
+    :meta private:
+    """
+    try:
+        os_remove(path)
+        return True
+    except OSError:
+        return False
+
+
+
+def remove_tree(
+        path,
+        dry_run = False,
+        max_workers = None,
+):
+    """
+    Remove a local directory tree, with a pool of threads
+    scanning it (cf. :any:`scan_tree`) and removing its files concurrently.
+    Like ``rm -rf``, hidden artifacts are removed too,
+    and symbolic links are removed, not followed.
+    Artifacts that cannot be removed are left in place.
+
+    Arguments:
+
+        path (string):
+            root of the directory tree
+        dry_run (boolean):
+            Only measure the tree. (Default: False)
+        max_workers (optional integer):
+            Number of threads, cf. :any:`scan_tree`.
+
+    Returns:
+
+        integer, the number of bytes reclaimed
+            (or that would be reclaimed, for a dry run).
+
+    :meta private:
+    """
+    files, dirs = scan_tree(path, max_workers=max_workers, hidden=True)
+    if dry_run:
+        return sum([files[rel][1] for rel in files])
+    rels = list(files)
+    workers = max_workers if max_workers is not None else min(32, 4 * (os_cpu_count() or 1))
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        removed = pool.map(_remove_quietly, [os_path_join(path, rel) for rel in rels])
+        nbytes = sum([files[rel][1] for rel, ok in zip(rels, removed) if ok])
+    # > deepest directories first; the root is the empty stem, last
+    for stem in sorted(dirs, key=lambda stem: -stem.count('/') if stem else 1):
+        try:
+            os_rmdir(os_path_join(path, stem) if stem else path)
+        except OSError:
+            pass
+    return nbytes
+
+
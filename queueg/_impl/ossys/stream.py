@@ -0,0 +1,148 @@
+
+
+
+
+from collections import deque
+import subprocess
+import threading
+import time
+
+from .usage import wait_measured
+
+
+# longest line kept in memory at once, in bytes
+# (longer lines are written in pieces)
+stream_chunk = 1 << 16
+
+
+
+def tail_lines(path, n):
+    """
+    Last lines of a file, read from its end.
+
+    Arguments:
+
+        path (string):
+        n (integer):
+            number of lines
+
+    Returns:
+
+        list of string
+
+    """
+    if n <= 0:
+        return []
+    with open(path, "rb") as f:
+        f.seek(0, 2)
+        pos = f.tell()
+        data = b""
+        while pos > 0 and data.count(b"\n") <= n:
+            step = min(stream_chunk, pos)
+            pos -= step
+            f.seek(pos)
+            data = f.read(step) + data
+    return data.decode("utf-8", "replace").splitlines()[-n:]
+
+
+
+def _pump(pipe, path, ring, echo, tag, rate):
+    """
+    Copy a pipe to a file, line by line, keeping the last lines
+    in a ring buffer, and echoing at most `rate` lines per second.
+
+    :meta private:
+    """
+    allowance = rate
+    last = time.monotonic()
+    suppressed = 0
+    with open(path, "wb") as f:
+        for line in iter(lambda: pipe.readline(stream_chunk), b""):
+            f.write(line)
+            ring.append(line)
+            if echo is None:
+                continue
+            # > token bucket
+            now = time.monotonic()
+            allowance = min(rate, allowance + (now - last) * rate)
+            last = now
+            if allowance >= 1:
+                if suppressed:
+                    echo(tag, f"({suppressed} lines not shown)")
+                    suppressed = 0
+                echo(tag, line.decode("utf-8", "replace").rstrip("\n"))
+                allowance -= 1
+            else:
+                suppressed += 1
+    if suppressed:
+        echo(tag, f"({suppressed} lines not shown)")
+    pipe.close()
+
+
+
+def run_logged(
+        args,
+        out_path,
+        err_path,
+        cwd = None,
+        echo = None,
+        rate = 100,
+        tail = 20,
+):
+    """
+    Run a command, streaming its standard output and standard error
+    to files, with bounded memory, whatever the amount of output.
+
+    Without `echo`, the files are handed to the process directly,
+    and the last lines are read back from the files at the end.
+    With `echo`, the output goes through pipes and is copied to the files
+    by two threads, which tee it to `echo` at a limited rate
+    and keep the last lines in ring buffers.
+
+    Arguments:
+
+        args (list of string):
+            command
+        out_path (string):
+            file for the standard output
+        err_path (string):
+            file for the standard error
+        cwd (optional string):
+            working directory of the command
+        echo (optional callable):
+            called as ``echo(tag, line)``, with tag "out" or "err",
+            to show the output as it comes.
+        rate (number):
+            maximum number of lines echoed per second, per stream.
+            Lines beyond are counted, not shown. (Default: 100)
+        tail (integer):
+            number of last lines to return, per stream. (Default: 20)
+
+    Returns:
+
+        quadruple (return code, last lines of stdout, last lines of stderr,
+        resource usage, cf. :any:`wait_measured`)
+
+    """
+    started = time.monotonic()
+    if echo is None:
+        with open(out_path, "wb") as fout, open(err_path, "wb") as ferr:
+            p = subprocess.Popen(args=args, stdout=fout, stderr=ferr, cwd=cwd)
+            usage = wait_measured(p, started)
+        return p.returncode, tail_lines(out_path, tail), tail_lines(err_path, tail), usage
+    p = subprocess.Popen(args=args, stdout=subprocess.PIPE, stderr=subprocess.PIPE, cwd=cwd)
+    rings = [deque(maxlen=tail), deque(maxlen=tail)]
+    threads = [
+        threading.Thread(target=_pump, args=(p.stdout, out_path, rings[0], echo, "out", rate)),
+        threading.Thread(target=_pump, args=(p.stderr, err_path, rings[1], echo, "err", rate)),
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    usage = wait_measured(p, started)
+    out, err = [[line.decode("utf-8", "replace").rstrip("\n") for line in ring] if tail > 0 else [] for ring in rings]
+    return p.returncode, out, err, usage
+
+
+
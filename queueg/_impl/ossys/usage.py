@@ -0,0 +1,151 @@
+
+
+
+
+from os import (
+    waitstatus_to_exitcode as os_waitstatus_to_exitcode,
+)
+try:
+    from os import wait4 as os_wait4
+except ImportError:
+    # e.g. Windows
+    os_wait4 = None
+import json
+import subprocess
+import sys
+import threading
+import time
+
+
+# file name of the resource accounting of a run, in its info directory
+resources_file = "resources.json"
+
+# fields of a resource usage, in the order they are reported
+usage_fields = [
+    "wall",
+    "user",
+    "sys",
+    "maxrss",
+    "inblock",
+    "oublock",
+    "nvcsw",
+    "nivcsw",
+]
+
+
+
+def wait_measured(p, started):
+    """
+    Wait for a child process and measure its resource usage
+    (cf. ``os.wait4``, and ``getrusage(2)``).
+    The return code is set on `p`, as by ``p.wait()``.
+
+    Arguments:
+
+        p (subprocess.Popen):
+        started (float):
+            ``time.monotonic()`` when the process was started.
+
+    Returns:
+
+        dict, with keys wall (seconds), user and sys (CPU seconds),
+        maxrss (maximum resident set size, bytes),
+        inblock and oublock (block input and output operations),
+        nvcsw and nivcsw (voluntary and involuntary context switches).
+        Only wall is measured on systems without ``os.wait4``.
+
+    """
+    if os_wait4 is None:
+        p.wait()
+        return {"wall": time.monotonic() - started}
+    _, status, ru = os_wait4(p.pid, 0)
+    p.returncode = os_waitstatus_to_exitcode(status)
+    # > ru_maxrss is in kilobytes on Linux, in bytes on macOS
+    scale = 1 if sys.platform == "darwin" else 1024
+    return {
+        "wall": time.monotonic() - started,
+        "user": ru.ru_utime,
+        "sys": ru.ru_stime,
+        "maxrss": ru.ru_maxrss*scale,
+        "inblock": ru.ru_inblock,
+        "oublock": ru.ru_oublock,
+        "nvcsw": ru.ru_nvcsw,
+        "nivcsw": ru.ru_nivcsw,
+    }
+
+
+
+def run_measured(
+        args,
+        cwd = None,
+        capture_output = False,
+):
+    """
+    Like ``subprocess.run``, measuring the resource usage of the process.
+
+    Returns:
+
+        pair (``subprocess.CompletedProcess``, usage), cf. :any:`wait_measured`.
+
+    """
+    started = time.monotonic()
+    pipe = subprocess.PIPE if capture_output else None
+    p = subprocess.Popen(args=args, cwd=cwd, stdout=pipe, stderr=pipe)
+    out = [None, None]
+    threads = []
+    if capture_output:
+        # > drain both pipes, so that the process never blocks on a full pipe
+        def read(i, stream):
+            out[i] = stream.read()
+            stream.close()
+        threads = [
+            threading.Thread(target=read, args=(0, p.stdout)),
+            threading.Thread(target=read, args=(1, p.stderr)),
+        ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    usage = wait_measured(p, started)
+    return subprocess.CompletedProcess(args, p.returncode, out[0], out[1]), usage
+
+
+
+def total_usage(entries):
+    """
+    Totals of a list of resource usages (the maximum, for maxrss).
+
+    Returns:
+
+        dict
+
+    """
+    total = {}
+    for entry in entries:
+        for field in usage_fields:
+            if field in entry:
+                if field == "maxrss":
+                    total[field] = max(total.get(field, 0), entry[field])
+                else:
+                    total[field] = total.get(field, 0) + entry[field]
+    return total
+
+
+
+def write_resources(path, entries):
+    """
+    Write the resource accounting of a run, a list of entries,
+    one per subprocess (with keys step, command, and the fields of a usage),
+    with their totals, to a JSON file.
+
+    Returns:
+
+        dict, the totals.
+
+    """
+    total = total_usage(entries)
+    with open(path, "w") as f:
+        json.dump({"steps": entries, "total": total}, f, indent=1)
+    return total
+
+
@@ -0,0 +1,385 @@
+
+
+
+
+import datetime
+import time
+from fnmatch import fnmatchcase
+from os.path import (
+    dirname as os_path_dirname,
+    getmtime as os_path_getmtime,
+    join as os_path_join,
+)
+
+from .conf import Conf
+from .location import Location
+from .catalog import (
+    Catalog,
+    find_runs,
+    split_location,
+    query_columns,
+)
+from .ossys.scan import (
+    scan_tree,
+    remove_tree,
+)
+from .syncplan import pp_bytes
+
+
+
+class RetentionReport:
+    """
+    Result of :any:`Retention.apply`.
+
+    Attributes:
+
+        dry_run (boolean):
+            Whether anything was actually removed.
+        removed (list of string):
+            Paths of the runs removed entirely.
+        pruned (list of string):
+            Paths of the subdirectories removed from runs that were kept.
+        kept (list of string):
+            Paths of the runs kept.
+        nbytes (integer):
+            Number of bytes reclaimed
+            (or that would be reclaimed, for a dry run).
+
+    :meta private:
+    """
+
+    def __init__(self, dry_run):
+        self.dry_run = dry_run
+        self.removed = []
+        self.pruned = []
+        self.kept = []
+        self.nbytes = 0
+
+
+    def __str__(self):
+        verb = "would reclaim" if self.dry_run else "reclaimed"
+        lines = [
+            f"remove: {len(self.removed)} runs, prune: {len(self.pruned)} directories, keep: {len(self.kept)} runs",
+            f"{verb}: {pp_bytes(self.nbytes)}",
+        ]
+        lines += [f"\t- {path}" for path in self.removed]
+        lines += [f"\t~ {path}" for path in self.pruned]
+        return '\n'.join(lines)
+
+
+
+class Retention:
+    """
+    Retention policy and garbage collection for the runs
+    of a locale (the index, by default). The runs are found on disk
+    (cf. :any:`find_runs`), so that runs that the :any:`Catalog`
+    does not know are found too, and described by the stems of their path.
+
+    The age of a run is given by the datestamp of its
+    :any:`Location` (Y/M/D stems, missing stems counting as the first
+    month or day), or by its start time (or last modification)
+    if it has no datestamp, or one that is not a date.
+
+    A run is kept if it is one of the ``keep_last`` newest runs
+    of its handle, or if it is younger than ``keep_days``.
+    If neither is given, no run is removed, and only ``prune`` applies.
+    A run holding other runs (e.g., runtags in its handle)
+    is removed only along with all of them.
+    If a ``quota`` is given, runs that are not kept are removed,
+    oldest first, only while the runs take more than the quota.
+    Then, in the runs that remain, ``prune`` removes the named
+    subdirectories of the runs that are old enough.
+
+    Example:
+
+    .. code-block:: python
+
+        retention = Retention(
+            keep_last = 5,
+            keep_days = 7,
+            prune = {'dat': 30},
+        )
+        # dry run
+        print(retention.apply(dry_run=True, project='sweeps'))
+        # for real
+        print(retention.apply(project='sweeps'))
+
+    Parameters:
+
+        keep_last (optional integer):
+            Number of runs to keep per handle.
+        keep_days (optional number):
+            Keep the runs younger than this many days.
+        prune (optional dict[string] of number):
+            Maps a subdirectory name (e.g. ``'dat'``) to an age in days:
+            subdirectories of that name are removed from
+            the runs that are at least that old.
+        quota (optional integer):
+            Number of bytes the runs may take.
+        catalog (optional :any:`Catalog`):
+            (Default: the catalog of the index directory)
+        max_workers (optional integer):
+            Number of threads scanning and removing files, cf. :any:`scan_tree`.
+        verbose (boolean):
+            Whether to run verbosely. Default: False
+
+    """
+
+    def __init__(
+            self,
+            keep_last = None,
+            keep_days = None,
+            prune = None,
+            quota = None,
+            catalog = None,
+            max_workers = None,
+            verbose = False,
+    ):
+        self.keep_last = keep_last
+        self.keep_days = keep_days
+        self.prune = prune if prune is not None else {}
+        self.quota = quota
+        self.catalog = catalog if catalog is not None else Catalog()
+        self.max_workers = max_workers
+        self.v = verbose
+
+
+    def apply(
+            self,
+            dry_run = False,
+            locale = 'index',
+            **kwargs,
+    ):
+        """
+        Apply the policy.
+
+        Arguments:
+
+            dry_run (boolean):
+                Only report what would be removed. (Default: False)
+            locale (string):
+                Locale whose runs the policy applies to, cf. :any:`Location`.
+                (Default: 'index')
+            kwargs:
+                Conditions selecting the runs the policy applies to,
+                cf. :any:`Catalog.query`. E.g., ``project='sweeps'``.
+                (Default: all the runs in the locale)
+
+        Returns:
+
+            :any:`RetentionReport`
+
+        """
+        report = RetentionReport(dry_run)
+        runs, sizes = self._runs(locale, kwargs)
+        now = time.time()
+        ages = {path: (now - self._timestamp(runs[path])) / 86400.0 for path in runs}
+        # > oldest first
+        paths = sorted(runs, key=lambda path: -ages[path])
+        # > runs nested in each run (e.g. runtags), which go with it
+        nested = {path: [] for path in runs}
+        for path in runs:
+            stem = os_path_dirname(path)
+            while stem != os_path_dirname(stem):
+                if stem in nested:
+                    nested[stem].append(path)
+                stem = os_path_dirname(stem)
+        kept = self._protected(runs, ages, paths)
+        # > a run is removed only along with every run nested in it
+        total = sum([sizes[path] for path in paths])
+        removed = set()
+        for path in sorted([path for path in paths if path not in kept], key=lambda path: -path.count('/')):
+            if not all([other in removed for other in nested[path]]):
+                continue
+            removed.add(path)
+        candidates = [path for path in paths if path in removed]
+        if self.quota is not None:
+            # > remove only what it takes to meet the quota
+            selected = set()
+            for path in candidates:
+                if total <= self.quota:
+                    break
+                if not all([other in selected for other in nested[path]]):
+                    continue
+                selected.add(path)
+                total -= sizes[path]
+            candidates = [path for path in candidates if path in selected]
+        # > innermost first, so that each run is measured once
+        for path in sorted(candidates, key=lambda path: -path.count('/')):
+            self._msg(f"remove {path} ({ages[path]:.0f} days)", function=self.apply.__name__)
+            if dry_run:
+                report.nbytes += sizes[path]
+            else:
+                report.nbytes += remove_tree(path, max_workers=self.max_workers)
+                self.catalog.remove(path)
+            report.removed.append(path)
+        for path in paths:
+            if path in report.removed:
+                continue
+            report.kept.append(path)
+            nbytes = 0
+            for stem in self._prune_dirs(path, ages[path], nested[path]):
+                self._msg(f"prune {stem}", function=self.apply.__name__)
+                nbytes += remove_tree(stem, dry_run=dry_run, max_workers=self.max_workers)
+                report.pruned.append(stem)
+            if nbytes > 0 and not dry_run and runs[path]['size'] is not None:
+                self.catalog.update(path, size=max(0, runs[path]['size'] - nbytes))
+            report.nbytes += nbytes
+        self._msg(str(report), function=self.apply.__name__, always=not dry_run)
+        return report
+
+
+    def _runs(self, locale, conditions):
+        """
+        The runs of a locale selected by `conditions`:
+        the runs found on disk (cf. :any:`find_runs`), described
+        by the :any:`Catalog` if it knows them, otherwise
+        by the stems of their paths (cf. :any:`Location.from_path`).
+
+        Returns:
+
+            pair (runs, sizes), dicts mapping the path of each run
+            to its description (as a record of the catalog),
+            and to its size in bytes, without the runs nested in it.
+
+        :meta private:
+        """
+        conf = Conf.cached()
+        sizes = find_runs(conf[f'{locale}_dir'], max_workers=self.max_workers)
+        # > one record per run, rows of other case codes share the path
+        records = {}
+        for run in self.catalog.query():
+            if run['path'] not in records:
+                records[run['path']] = run
+        selected = {run['path'] for run in self.catalog.query(**conditions)}
+        runs = {}
+        for path in sizes:
+            if path in records:
+                if path in selected:
+                    runs[path] = records[path]
+                continue
+            location = Location.from_path(path, locale=locale, explicit_conf=conf)
+            if location is None:
+                continue
+            run = self._describe(path, location, sizes[path])
+            if self._match(run, conditions):
+                runs[path] = run
+        return runs, {path: sizes[path] for path in runs}
+
+
+    @staticmethod
+    def _describe(path, location, size):
+        """
+        A run unknown to the catalog, described as a record of the catalog.
+
+        :meta private:
+        """
+        project, date, handle = split_location(location)
+        ymd = [int(stem) for stem in date] + [None, None, None]
+        return {
+            'path': path,
+            'code': '',
+            'locale': location.locale,
+            'project': '/'.join(project),
+            'date': '/'.join(date),
+            'year': ymd[0],
+            'month': ymd[1],
+            'day': ymd[2],
+            'handle': '/'.join(handle),
+            'runtag': None,
+            'status': None,
+            'started': None,
+            'size': size,
+            'updated': os_path_getmtime(path),
+        }
+
+
+    @staticmethod
+    def _match(run, conditions):
+        """
+        Whether a run meets conditions, as :any:`Catalog.query` does.
+
+        :meta private:
+        """
+        for column in conditions:
+            if column not in query_columns:
+                raise ValueError(f"Unknown catalog column {column}.")
+            value = conditions[column]
+            if isinstance(value, str) and '*' in value:
+                if not isinstance(run[column], str) or not fnmatchcase(run[column], value):
+                    return False
+            elif run[column] != value:
+                return False
+        return True
+
+
+    def _protected(self, runs, ages, paths):
+        """
+        Paths of the runs that the keep policies protect.
+        Without keep policy, every run is protected.
+
+        :meta private:
+        """
+        if self.keep_last is None and self.keep_days is None:
+            return set(paths)
+        kept = set()
+        if self.keep_days is not None:
+            kept |= {path for path in paths if ages[path] < self.keep_days}
+        if self.keep_last is not None:
+            handles = {}
+            # > newest first
+            for path in reversed(paths):
+                run = runs[path]
+                key = (run['locale'], run['project'], run['handle'])
+                handles[key] = handles.get(key, 0) + 1
+                if handles[key] <= self.keep_last:
+                    kept.add(path)
+        return kept
+
+
+    def _prune_dirs(self, path, age, nested):
+        """
+        Subdirectories of a run that the prune policy removes,
+        outside of the runs nested in it.
+
+        :meta private:
+        """
+        names = {name for name in self.prune if age >= self.prune[name]}
+        if not names:
+            return []
+        _, dirs = scan_tree(path, max_workers=self.max_workers, hidden=True)
+        out = []
+        for stem in dirs:
+            parts = stem.split('/')
+            if parts[-1] in names and not any([part in names for part in parts[:-1]]):
+                out.append(os_path_join(path, stem))
+        return [stem for stem in out if not any([stem.startswith(other + '/') for other in nested])]
+
+
+    @staticmethod
+    def _timestamp(run):
+        """
+        Time of a run, in seconds since the Epoch.
+
+        :meta private:
+        """
+        if run['year']:
+            try:
+                date = datetime.datetime(run['year'], run['month'] or 1, run['day'] or 1)
+                return date.timestamp()
+            except (ValueError, OverflowError, OSError):
+                # > numerical stems that are not a date (e.g. month 42)
+                pass
+        return run['started'] or run['updated']
+
+
+    def _msg(self, body, function = None, always = False):
+        loc_list = [self.__class__.__name__]
+        if function is not None:
+            loc_list += [function]
+        if self.v and not always:
+            loc_list += ["verbose"]
+        if self.v or always:
+            print(f"[{':'.join(loc_list)}] {body}")
+
+
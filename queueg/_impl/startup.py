@@ -0,0 +1,106 @@
+
+
+
+
+import subprocess
+import sys
+
+
+# Startup budget of `import queueg`, in seconds.
+startup_budget = 0.25
+
+# Modules that `import queueg` must not load (cf. queueg.__getattr__).
+heavy_modules = [
+    "paramiko",
+    "numpy",
+    "scipy",
+    "matplotlib",
+    "mv1fw",
+]
+
+# Run in a fresh interpreter, so nothing is imported already.
+probe = """\
+import sys, time
+t0 = time.perf_counter()
+import {module}
+t1 = time.perf_counter()
+print(t1 - t0)
+print(' '.join([name for name in {heavy} if name in sys.modules]))
+"""
+
+
+
+def startup_time(
+        module = "queueg",
+        repeat = 5,
+):
+    """
+    Import time of a module, measured in fresh interpreters.
+
+    Arguments:
+
+        module (string):
+            module to import (default: "queueg")
+        repeat (integer):
+            number of interpreters; the fastest import is kept,
+            as the others only add noise (default: 5)
+
+    Returns:
+
+        pair (seconds, loaded), where `loaded` is the list
+            of heavy modules (cf. ``heavy_modules``) that the import loaded.
+
+    :meta private:
+    """
+    best = None
+    loaded = []
+    code = probe.format(module=module, heavy=heavy_modules)
+    for _ in range(repeat):
+        cp = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True)
+        if cp.returncode != 0:
+            raise ImportError(f"import {module} failed.\n2> {cp.stderr}")
+        lines = cp.stdout.splitlines()
+        seconds = float(lines[0])
+        loaded = lines[1].split() if len(lines) > 1 else []
+        best = seconds if best is None else min(best, seconds)
+    return best, loaded
+
+
+
+def check_startup(
+        budget = startup_budget,
+        module = "queueg",
+        repeat = 5,
+):
+    """
+    Guard the startup budget: raise if importing the module
+    is slower than the budget, or loads a heavy module.
+
+    Arguments:
+
+        budget (float):
+            seconds (default: ``startup_budget``)
+        module (string):
+        repeat (integer):
+
+    Returns:
+
+        the import time, in seconds.
+
+    :meta private:
+    """
+    seconds, loaded = startup_time(module=module, repeat=repeat)
+    if loaded:
+        raise RuntimeError(f"import {module} loads {', '.join(loaded)}.")
+    if seconds > budget:
+        raise RuntimeError(f"import {module} takes {seconds:.3f} s, over the budget of {budget:.3f} s.")
+    return seconds
+
+
+
+if __name__ == "__main__":
+    # > python -m queueg._impl.startup
+    seconds = check_startup()
+    print(f"import queueg: {seconds:.3f} s (budget {startup_budget:.3f} s)")
+
+
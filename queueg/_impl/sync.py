@@ -11,17 +11,30 @@ from os import (
     popen as os_popen,
     remove as os_remove,
     makedirs as os_makedirs,
+    urandom as os_urandom,
+    utime as os_utime,
+    replace as os_replace,
+    stat as os_stat,
 )
 from shutil import (
     copy as shutil_copy,
+    copyfile as shutil_copyfile,
 )
 from os.path import (
     join as os_path_join,
     exists as os_path_exists,
     expanduser as os_path_expanduser,
+    dirname as os_path_dirname,
+    relpath as os_path_relpath,
 )
 import atexit
+import shlex
+import stat
+import threading
 import time
+import json
+import hashlib
+import tarfile
 from re import (
     split as re_split,
     compile as re_compile,
@@ -39,14 +52,36 @@ from .._impl.ossys import (
     Age,
     cmd_stat_fmt,
     cmd_ls_fmt,
+    scan_tree,
 )
 from .._impl.ossys.ossys import (
     job_status_pp,
     ttyRead,
+    default_inventory_stem,
 )
 # from .._impl.path import Path
 from .._impl.conf import Conf
+from .._impl.catalog import (
+    Catalog,
+    find_runs,
+)
+from .._impl.location import Location
+from .._impl.blobstore import (
+    BlobStore,
+    blob_stem,
+    blob_digest,
+)
 from .._impl.types import parse_time
+from .._impl.synchelper import SyncHelper
+from .._impl.syncplan import (
+    CandidateTable,
+    SyncLeg,
+    SyncPlan,
+    pp_bytes,
+    estimate_durations,
+    compressibility,
+    compression_pays,
+)
 from .._impl.mode import (
     Mode,
     direct,
@@ -55,6 +90,14 @@ from .._impl.mode import (
 
 
 
+# Cipher preference, fastest first. AES is accelerated
+# on most processors, and GCM needs no separate MAC.
+fast_ciphers = [
+    "aes128-gcm@openssh.com",
+    "aes128-ctr",
+    "aes256-gcm@openssh.com",
+    "aes256-ctr",
+]
 
 
 
@@ -102,6 +145,28 @@ class Sync:
         bare (boolean):
             Set True if you only wish to use as a basic or "bare" SSH/SFTP.
             In this case Sync will skip acquiring the remote conf file. (default: False)
+        verbose (boolean):
+            Verbose output. (default: False)
+        helper (boolean):
+            Set True to start a long-lived helper process on the remote system
+            (it requires ``python3`` there). Remote commands, stats, listings
+            and directory creation are then sent as requests over a single channel,
+            instead of opening a new exec channel and remote shell for each.
+            See :any:`SyncHelper`. (default: False)
+        compress (optional boolean):
+            Transport-level (zlib) compression. If None, it is decided
+            from the link profile of the previous session with the same target:
+            the measured throughput (cf. :any:`Sync.measure_link`)
+            and the compressibility of the last transferred data. (default: None)
+        ciphers (optional list of string):
+            Preferred ciphers, in order. Ciphers the server does not accept
+            are skipped. (default: AES-GCM and AES-CTR, cf. ``fast_ciphers``)
+        bulk (optional boolean):
+            Transfer the files of a sync as a single tar stream,
+            instead of one file at a time. If None, bulk transfer is used
+            whenever it is estimated to be faster (cf. :any:`Sync.plan`), and
+            the stream is gzip-compressed whenever a sample
+            of the files shows that compression pays. (default: None)
 
     """
 
@@ -117,14 +182,21 @@ class Sync:
             port = 22,
             bare = False,
             verbose = False,
+            helper = False,
+            compress = None,
+            ciphers = None,
+            bulk = None,
     ):
-        self.conf = Conf()
+        self.conf = Conf.cached()
         # idea is that these are as-needed, just-in-time resources
         self._ssh = None
         self._sftp = None
         # needs to remain up while sftp is up
         self._transport0 = None
         self._transport = None
+        # long-lived remote helper process (optional)
+        self.use_helper = helper
+        self._helper = None
         # uname for target system
         self._uname = None
         # active SLURM jobs (list of job id numbers)
@@ -136,6 +208,14 @@ class Sync:
         # can be invoked with self.cd('last push')
         self.last_push_dir = None
         self.remote_wdir = None
+        # measured latency and throughput of the link (cf. measure_link),
+        # and whether they were measured in this session
+        self.link = None
+        self._link_measured = False
+        # transport options
+        self.compress = compress
+        self.ciphers = ciphers if ciphers is not None else fast_ciphers
+        self.bulk = bulk
         # verbose output
         self.v = verbose
         self.pkey_filename = pkey
@@ -146,6 +226,17 @@ class Sync:
             self.host = host
             # todo change target to target_cache_dir (?)
             self.target = self.target_name()
+            # > the link profile of a previous session, if any (cf. measure_link)
+            self.link = self._read_link_profile()
+            if self.link is not None and 'latency' not in self.link:
+                self.link = None
+            if self.compress is None:
+                # > decide from the link profile of the previous session
+                if self.link is not None and 'ratio' in self.link:
+                    rate = min(self.link['get'], self.link['put'])
+                    self.compress = compression_pays(self.link['ratio'], self.link['zlib'], rate)
+                else:
+                    self.compress = False
             if password is None or password == "":
                 p = prompt_user("Password: ", quiet = True)
                 self.password = p
@@ -242,6 +333,8 @@ class Sync:
                     port=self.port,
                     username=self.username,
                     auth_strategy=TwoFAKeyboardInteractiveHandler(username=self.username),
+                    compress=self.compress,
+                    transport_factory=self._transport_factory,
                 )
             else:
                 # check for host key, and password authentication
@@ -252,14 +345,42 @@ class Sync:
                     password=self.password,
                     key_filename=None,
                     pkey=self.pkey,
+                    compress=self.compress,
+                    transport_factory=self._transport_factory,
                 )
             self._uname = self.ssh("uname", strip=True)
             self._msg(f"Connected to remote {self._uname} system.", always=True)
+            transport = self._ssh.get_transport()
+            self._msg(f"cipher {transport.local_cipher}, compression {'on' if self.compress else 'off'}")
+        if self.use_helper and self._helper is None:
+            try:
+                self._helper = SyncHelper(self._ssh)
+                self._msg("Remote helper started.")
+            except SystemError as e:
+                self._msg(f"Remote helper not available, continuing without it. {e}", always=True)
         if self._sftp is None:
             self._sftp = self._ssh.open_sftp()
 
 
+    def _transport_factory(self, sock, **kwargs):
+        """
+        Create the transport, with the preferred ciphers first
+        (before the handshake, when they are negotiated).
+
+        :meta private:
+        """
+        transport = pm.Transport(sock, **kwargs)
+        options = transport.get_security_options()
+        supported = options.ciphers
+        preferred = [cipher for cipher in self.ciphers if cipher in supported]
+        options.ciphers = tuple(preferred + [cipher for cipher in supported if cipher not in preferred])
+        return transport
+
+
     def deinit(self):
+        if self._helper is not None:
+            self._helper.close()
+            self._helper = None
         if self._ssh is not None:
             self._ssh.close()
         if self._sftp is not None:
@@ -269,46 +390,733 @@ class Sync:
 
 
     def os_path_exists(self, path):
-        if self.host is not None:
+        if self._helper is not None:
+            return self._helper.request('stat', paths=[path], cwd=self.remote_wdir)[0] is not None
+        elif self.host is not None:
             output = self.ssh(f"test -e {path} && echo $?", strip=True)
             return output == '0'
         else:
             return os_path_exists(path)
 
     def mkdir_remote(self, path):
-        if self.host is not None:
-            self.ssh(f"mkdir -p {path}")
+        """
+        Create a directory, or a list of directories,
+        on the remote system (like ``mkdir -p``).
+
+        Arguments:
+
+            path (string or list of string):
+
+        """
+        paths = path if isinstance(path, list) else [path]
+        if self._helper is not None:
+            self._helper.request('mkdir', paths=paths, cwd=self.remote_wdir)
+        elif self.host is not None:
+            # > one remote command per chunk of directories,
+            #  rather than one per directory
+            chunk = 256
+            for i in range(0, len(paths), chunk):
+                self.ssh(f"mkdir -p {' '.join(paths[i:i+chunk])}")
         else:
-            try:
-                os_makedirs(path, exist_ok=True)
-            except OSError as error:
-                print(f"Error creating directory {path}: {error}")
+            for path in paths:
+                try:
+                    os_makedirs(path, exist_ok=True)
+                except OSError as error:
+                    print(f"Error creating directory {path}: {error}")
 
 
-    def _sync1way_impl(
+    def _decide(
             self,
             candidates,
-            pull = True,
     ):
-        updated = []
+        """
+        Sort candidates into updates, skips and creations,
+        without transferring anything.
+        A target age of 0 means the target artifact
+        does not exist (see :any:`Age`): it is created.
+        A target older than its source is overwritten,
+        and anything else is left alone.
+
+        Arguments:
+
+            candidates (:any:`CandidateTable`):
+
+        Returns:
+
+            triple of :any:`CandidateTable` (updated, leftalone, created)
+
+        """
+        return candidates.decide()
+
+
+    def _sync1way_impl(
+            self,
+            leg,
+            preserve_times = False,
+            blobs = True,
+    ):
+        """
+        Carry out a planned :any:`SyncLeg`.
+
+        Arguments:
+
+            leg (:any:`SyncLeg`):
+            preserve_times (boolean):
+                Give each transferred artifact the last-modified
+                timestamp of its source. (Default: False)
+            blobs (boolean):
+                If the Conf file sets ``dedup = true``, place the files
+                whose content the blob store of the target has from that store,
+                instead of transferring them (cf. _place_blobs). (Default: True)
+
+        Returns:
+
+            triple of lists of target paths (updated, leftalone, created)
+
+        """
+        # > build the target directory tree
+        if leg.pull:
+            for tgt_dir in leg.tgt_dirs:
+                os_makedirs(tgt_dir, exist_ok=True)
+        else:
+            self.mkdir_remote(leg.tgt_dirs)
+        # > files the target has in its blob store are not transferred
+        rest = leg
+        if blobs and self.host is not None and 'dedup' in self.conf and self.conf['dedup']:
+            placed = self._place_blobs(leg)
+            if placed:
+                rest = SyncLeg(
+                    pull=leg.pull,
+                    tgt_dirs=[],
+                    created=[candidate for candidate in leg.transfers() if candidate[0] not in placed],
+                    updated=[],
+                    leftalone=[],
+                )
+                rest.src_path = leg.src_path
+                rest.tgt_path = leg.tgt_path
+        # > transfer
+        if self._use_bulk(rest):
+            self._transfer_bulk(rest, compress=self._use_compression(rest))
+        else:
+            transfer = self.get if rest.pull else self.put
+            transfer([(candidate[0], candidate[2]) for candidate in rest.transfers()])
+        if preserve_times:
+            for candidate in leg.transfers():
+                times = (candidate[1], candidate[1])
+                if leg.pull or self.host is None:
+                    os_utime(candidate[2], times)
+                else:
+                    self._sftp.utime(candidate[2], times)
+        updated = [candidate[2] for candidate in leg.updated]
+        leftalone = [candidate[2] for candidate in leg.leftalone]
+        created = [candidate[2] for candidate in leg.created]
+        return updated, leftalone, created
+
+
+    def _place_blobs(
+            self,
+            leg,
+            batch = 256,
+    ):
+        """
+        Place the files of a leg whose content is in the blob store
+        of the target system (cf. :any:`BlobStore`, :any:`Sync.sync_blobs`)
+        by copying them from that store, on the target system,
+        instead of transferring them. Only the files with the size
+        of a blob of the local store are hashed (on the source system).
+        The copies are plain copies: on a push they get the mode
+        of their source, on a pull the default mode, as transferred files do.
+
+        Returns:
+
+            set of the source paths of the files placed.
+
+        :meta private:
+        """
+        store = BlobStore()
+        local_blobs, _ = scan_tree(store.path)
+        sizes = {local_blobs[rel][1] for rel in local_blobs}
+        candidates = [candidate for candidate in leg.transfers() if candidate[4] in sizes]
+        if not candidates:
+            return set()
+        placed = set()
+        if leg.pull:
+            # > hash the candidates on the remote system, one command per batch
+            local_digests = {blob_digest(rel): os_path_join(store.path, rel) for rel in local_blobs if not rel.endswith(".tmp")}
+            for i in range(0, len(candidates), batch):
+                chunk = candidates[i:i+batch]
+                output = self.ssh(f"{store.algorithm}sum -- {' '.join([shlex.quote(candidate[0]) for candidate in chunk])} 2>/dev/null; true")
+                digests = {}
+                for line in output.splitlines():
+                    fields = line.split(None, 1)
+                    if len(fields) == 2:
+                        digests[fields[1]] = fields[0]
+                for candidate in chunk:
+                    digest = digests.get(candidate[0])
+                    if digest in local_digests:
+                        shutil_copyfile(local_digests[digest], candidate[2])
+                        placed.add(candidate[0])
+        else:
+            remote_path = self._remote_blob_path()
+            rfiles, _ = self._scan(remote_path, [])
+            remote_digests = {blob_digest(rel): os_path_join(remote_path, rel) for rel in rfiles if not rel.endswith(".tmp")}
+            lines = []
+            for candidate in candidates:
+                digest = store.digest(candidate[0])
+                if digest in remote_digests:
+                    src = shlex.quote(remote_digests[digest])
+                    tgt = shlex.quote(candidate[2])
+                    mode = stat.S_IMODE(os_stat(candidate[0]).st_mode)
+                    lines.append((candidate[0], f"{{ cp -- {src} {tgt} && chmod {mode:o} {tgt} && echo {len(lines)}; }} 2>/dev/null"))
+            # > one command per batch, reporting the files placed
+            for i in range(0, len(lines), batch):
+                chunk = lines[i:i+batch]
+                output = self.ssh('; '.join([line for _, line in chunk]) + "; true")
+                done = {int(x) for x in output.split() if x.isdigit()}
+                placed |= {path for j, (path, _) in enumerate(chunk, start=i) if j in done}
+        self._msg(f"{len(placed)} of {len(leg.transfers())} files placed from the blob store.", function=self._place_blobs.__name__, always=True)
+        return placed
+
+
+    def _remote_blob_path(self):
+        """
+        Path of the blob store in the inventory directory of the remote system.
+
+        :meta private:
+        """
+        inventory_dir = self.rconf['inventory_dir']
+        remote_path = os_path_join(default_inventory_stem if inventory_dir == 'default' else inventory_dir, blob_stem)
+        if not remote_path.startswith('/'):
+            # > relative to the remote home directory, whatever the working directory (cf. cd)
+            home = self.ssh("echo $HOME", strip=True)
+            remote_path = os_path_join(home, remote_path)
+        return remote_path
+
+
+    def _use_bulk(self, leg):
+        """
+        Whether to transfer a leg as a single tar stream.
+
+        :meta private:
+        """
+        if self.host is None or len(leg.transfers()) == 0:
+            return False
+        if self.bulk is not None:
+            return self.bulk
+        if len(leg.transfers()) == 1:
+            return False
+        per_file, bulk = estimate_durations(leg, self._link_profile())
+        return bulk < per_file
+
+
+    def _link_profile(self):
+        """
+        The link profile: stored by a previous session (cf. __init__),
+        or else measured once in this session.
+
+        :meta private:
+        """
+        if self.link is None:
+            self.measure_link()
+        return self.link
+
+
+    def _use_compression(self, leg):
+        """
+        Whether to gzip the tar stream of a leg,
+        from the compressibility of a sample of its files.
+
+        :meta private:
+        """
+        if self.host is None or len(leg.transfers()) == 0:
+            return False
+        self._link_profile()
+        # > the sample is stored even when the transport compresses,
+        #   so that the next session decides again (cf. __init__)
+        ratio, zlib_rate = self._sample_compressibility(leg)
+        rate = self.link['get'] if leg.pull else self.link['put']
+        self.link['ratio'] = ratio
+        self.link['zlib'] = zlib_rate
+        self._write_link_profile()
+        if self.compress:
+            # > the transport compresses already
+            return False
+        pays = compression_pays(ratio, zlib_rate, rate)
+        self._msg(f"compression ratio {ratio:.2f}, compress: {pays}", function=self._use_compression.__name__)
+        return pays
+
+
+    def _sample_compressibility(
+            self,
+            leg,
+            nfiles = 8,
+            nbytes = 1 << 16,
+    ):
+        """
+        Compress the first bytes of a few of the files of a leg.
+
+        Returns:
+
+            pair (ratio, rate), see :any:`compressibility`
+
+        :meta private:
+        """
+        transfers = leg.transfers()
+        step = max(1, len(transfers) // nfiles)
+        sample = b""
+        for candidate in transfers[::step][:nfiles]:
+            if leg.pull:
+                with self._sftp.open(candidate[0], "rb") as f:
+                    sample += f.read(nbytes)
+            else:
+                with open(candidate[0], "rb") as f:
+                    sample += f.read(nbytes)
+        return compressibility(sample)
+
+
+    def _transfer_bulk(self, leg, compress):
+        """
+        Transfer the files of a leg as one tar stream
+        over an exec channel. The remote system needs `tar`.
+
+        Arguments:
+
+            leg (:any:`SyncLeg`):
+            compress (boolean):
+                gzip the stream.
+
+        :meta private:
+        """
+        rels = [os_path_relpath(candidate[0], leg.src_path) for candidate in leg.transfers()]
+        z = "z" if compress else ""
+        gz = "gz" if compress else ""
+        self._msg(f"{len(rels)} files, compress: {compress}", function=self._transfer_bulk.__name__)
+        if leg.pull:
+            _stdin, _stdout, _stderr = self._ssh.exec_command(f"tar -c{z}f - -C {shlex.quote(leg.src_path)} -T -")
+            # > the file list is written while the stream is read:
+            #   tar starts writing before the list ends, and would block
+            #   on a full channel window
+            def write_list():
+                _stdin.write('\n'.join(rels) + '\n')
+                _stdin.channel.shutdown_write()
+            writer = threading.Thread(target=write_list)
+            writer.start()
+            with tarfile.open(fileobj=_stdout, mode=f"r|{gz}") as tar:
+                if hasattr(tarfile, "data_filter"):
+                    tar.extractall(leg.tgt_path, filter="data")
+                else:
+                    tar.extractall(leg.tgt_path)
+            writer.join()
+        else:
+            _stdin, _stdout, _stderr = self._ssh.exec_command(f"tar -x{z}f - -C {shlex.quote(leg.tgt_path)}")
+            with tarfile.open(fileobj=_stdin, mode=f"w|{gz}") as tar:
+                for rel in rels:
+                    tar.add(os_path_join(leg.src_path, rel), arcname=rel)
+            _stdin.channel.shutdown_write()
+        status = _stdout.channel.recv_exit_status()
+        if status != 0:
+            error = _stderr.read().decode()
+            self._msg(f"[ERROR] Bulk transfer failed (exit status {status}).\n2> {error}", function=self._transfer_bulk.__name__, always=True)
+            raise SystemError
+
+
+    def _plan_leg(
+            self,
+            pull,
+            src_path,
+            tgt_path,
+            pass_dirs,
+    ):
+        """
+        Scan the source, and plan one direction of a sync.
+
+        Arguments:
+
+            pull (boolean):
+            src_path (string):
+            tgt_path (string):
+            pass_dirs (list of string):
+
+        Returns:
+
+            :any:`SyncLeg`
+
+        """
+        tgt_dirs = [tgt_path]
+        get_candidates = self.get_candidates_remote if pull else self.get_candidates_local
+        candidates = get_candidates(
+            src_path=src_path,
+            tgt_path=tgt_path,
+            pass_dirs=pass_dirs,
+            tgt_dirs=tgt_dirs,
+        )
+        updated, leftalone, created = self._decide(candidates)
+        leg = SyncLeg(
+            pull=pull,
+            tgt_dirs=tgt_dirs,
+            created=created,
+            updated=updated,
+            leftalone=leftalone,
+        )
+        leg.src_path = src_path
+        leg.tgt_path = tgt_path
+        return leg
+
+
+    def _plan_twoway(
+            self,
+            local_path,
+            remote_path,
+            pass_dirs,
+    ):
+        """
+        Plan a three-way sync of a local and a remote directory tree
+        against the base manifest stored by the last twoway sync
+        of the same pair of trees.
+        Each system is scanned once, and every file is classified
+        in a single pass over dictionaries keyed by relative path.
+
+        A file that changed on one system only (with respect to the base)
+        is transferred to the other system.
+        A file that changed on both systems is a conflict, and the youngest
+        version is kept. A file that is absent from one system
+        but unchanged on the other since the base is taken to have been deleted,
+        and is left alone (deletions are not propagated).
+        Without a base (first sync), the youngest version of every file is kept.
+
+        Arguments:
+
+            local_path (string):
+            remote_path (string):
+            pass_dirs (list of string):
+
+        Returns:
+
+            triple (legs, conflicts, base), where `legs` is a pair
+                of :any:`SyncLeg` (pull, push), `conflicts` is a list
+                of relative paths, and `base` a pair (path, manifest)
+                describing the base manifest once the sync is carried out.
+
+        """
+        # > one scan per system
+        rfiles, rdirs = self._scan(remote_path, pass_dirs)
+        lfiles, ldirs = self._scan(local_path, pass_dirs, loopback=True)
+        base_path = self._base_path(local_path, remote_path)
+        base = self._read_base(base_path, local_path, remote_path)
+        pull_created = []
+        pull_updated = []
+        push_created = []
+        push_updated = []
         leftalone = []
-        created = []
-        transfer = self.get if pull else self.put
-        for candidate in candidates:
-            path1, age1, path2, age2 = candidate
-            if self.os_path_exists(path2):
-                if age2 < age1:
-                    # target artifact has been updated.
-                    # > overwrite
-                    transfer((path1, path2))
-                    updated.append(path2)
+        conflicts = []
+        new_base = {}
+        for rel in rfiles:
+            rage, rsize = rfiles[rel]
+            pull_candidate = (os_path_join(remote_path, rel), rage, os_path_join(local_path, rel), 0, rsize)
+            if rel in lfiles:
+                lage, lsize = lfiles[rel]
+                pull_candidate = pull_candidate[:3] + (lage, rsize)
+                push_candidate = (os_path_join(local_path, rel), lage, os_path_join(remote_path, rel), rage, lsize)
+                if rel in base:
+                    lchanged = (lage != base[rel][0])
+                    rchanged = (rage != base[rel][1])
+                    if lchanged and rchanged:
+                        conflicts.append(rel)
                 else:
-                    # > do nothing
-                    leftalone.append(path2)
+                    # > no common ancestor: the youngest is kept
+                    lchanged = (lage > rage)
+                    rchanged = (rage > lage)
+                if rchanged and (not lchanged or rage > lage):
+                    pull_updated.append(pull_candidate)
+                    new_base[rel] = [rage, rage]
+                elif lchanged and (not rchanged or lage > rage):
+                    push_updated.append(push_candidate)
+                    new_base[rel] = [lage, lage]
+                else:
+                    leftalone.append(pull_candidate)
+                    new_base[rel] = [lage, rage]
+            elif rel in base and rage == base[rel][1]:
+                # > deleted on the local system: the base keeps the entry,
+                #   so that the next sync still sees a deletion
+                leftalone.append(pull_candidate)
+                new_base[rel] = base[rel]
             else:
-                transfer((path1, path2))
-                created.append(path2)
-        return updated, leftalone, created
+                pull_created.append(pull_candidate)
+                new_base[rel] = [rage, rage]
+        for rel in lfiles:
+            if rel in rfiles:
+                continue
+            lage, lsize = lfiles[rel]
+            push_candidate = (os_path_join(local_path, rel), lage, os_path_join(remote_path, rel), 0, lsize)
+            if rel in base and lage == base[rel][0]:
+                # > deleted on the remote system
+                leftalone.append(push_candidate)
+                new_base[rel] = base[rel]
+            else:
+                push_created.append(push_candidate)
+                new_base[rel] = [lage, lage]
+        # > passed directories were not scanned; keep what the base knows about them
+        for rel in base:
+            if rel not in new_base and set(rel.split('/')[:-1]) & set(pass_dirs):
+                new_base[rel] = base[rel]
+        # > mirror the directory trees
+        ldirs_ = set(ldirs)
+        rdirs_ = set(rdirs)
+        pull_dirs = [local_path] + [os_path_join(local_path, stem) for stem in rdirs if stem and stem not in ldirs_]
+        push_dirs = [remote_path] + [os_path_join(remote_path, stem) for stem in ldirs if stem and stem not in rdirs_]
+        pull = SyncLeg(
+            pull=True,
+            tgt_dirs=pull_dirs,
+            created=pull_created,
+            updated=pull_updated,
+            leftalone=leftalone,
+        )
+        pull.src_path = remote_path
+        pull.tgt_path = local_path
+        push = SyncLeg(
+            pull=False,
+            tgt_dirs=push_dirs,
+            created=push_created,
+            updated=push_updated,
+            leftalone=[],
+        )
+        push.src_path = local_path
+        push.tgt_path = remote_path
+        return [pull, push], conflicts, (base_path, new_base)
+
+
+    def _cache_dir(self):
+        """
+        Sync cache directory of the target (created if needed).
+
+        :meta private:
+        """
+        target = self.target if self.target is not None else "loopback"
+        return create_dir(os_environ["HOME"], default_conf_stemlist + ["sync", target])
+
+
+    def _read_link_profile(self):
+        """
+        Read the link profile stored by a previous session, or None.
+
+        :meta private:
+        """
+        path = os_path_join(self._cache_dir(), "link.json")
+        if not os_path_exists(path):
+            return None
+        try:
+            with open(path, "r") as f:
+                return json.load(f)
+        except ValueError:
+            return None
+
+
+    def _write_link_profile(self):
+        """
+        Store the link profile (cf. measure_link) for later sessions.
+
+        :meta private:
+        """
+        with open(os_path_join(self._cache_dir(), "link.json"), "w") as f:
+            json.dump(self.link, f)
+
+
+    def _base_path(self, local_path, remote_path):
+        """
+        Path of the base manifest of a pair of directory trees,
+        in the sync cache directory of the target.
+
+        :meta private:
+        """
+        cache_dir = self._cache_dir()
+        key = hashlib.sha1(f"{local_path}\n{remote_path}".encode()).hexdigest()[:16]
+        return os_path_join(cache_dir, f"base-{key}.json")
+
+
+    def _read_base(self, base_path, local_path, remote_path):
+        """
+        Read a base manifest, a dict mapping relative paths
+        to the pair [local age, remote age] at the time of the last twoway sync.
+        An empty dict is returned if there is no usable base.
+
+        :meta private:
+        """
+        if not os_path_exists(base_path):
+            return {}
+        try:
+            with open(base_path, "r") as f:
+                manifest = json.load(f)
+        except ValueError:
+            self._msg(f"Ignoring unreadable base manifest {base_path}", function=self._read_base.__name__, always=True)
+            return {}
+        if manifest['local'] != local_path or manifest['remote'] != remote_path:
+            return {}
+        return manifest['files']
+
+
+    def _write_base(self, base_path, local_path, remote_path, files):
+        """
+        Write a base manifest (atomically).
+
+        :meta private:
+        """
+        manifest = {
+            'local': local_path,
+            'remote': remote_path,
+            'files': files,
+        }
+        tmp_path = base_path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(manifest, f)
+        os_replace(tmp_path, base_path)
+
+
+    def plan(
+            self,
+            direction = 'pull',
+            location = None,
+            explicit_local_path = None,
+            explicit_remote_path = None,
+            pass_dirs = None,
+            measure = True,
+    ):
+        """
+        Dry run of a sync: scan both systems and decide,
+        for every candidate file, whether it would be
+        created, updated or left alone, without transferring
+        anything and without building the target directory tree.
+        The plan also reports the number of bytes to transfer,
+        a histogram of the file sizes, and durations estimated
+        from the measured throughput of the link (see :any:`Sync.measure_link`).
+
+        :any:`Sync.pull`, :any:`Sync.push` and :any:`Sync.twoway`
+        are carried out by first making a plan.
+
+        Arguments:
+
+            direction (string):
+                One of 'pull', 'push', or 'twoway'. (Default: 'pull')
+            location (:any:`Location`):
+            explicit_local_path (optional string):
+            explicit_remote_path (optional string):
+            pass_dirs (optional list of string):
+                Directories to skip while scanning the source
+                (for twoway, while scanning both systems).
+            measure (boolean):
+                Measure the link, if not measured already,
+                in order to estimate durations. (Default: True)
+
+        Returns:
+
+            :any:`SyncPlan`
+
+        """
+        if direction not in ['pull', 'push', 'twoway']:
+            raise ValueError(f"Unrecognized sync direction {direction}.")
+        if self.host is None and direction != 'push':
+            raise NotImplementedError
+        local_path = location.get_path(
+            create=False,
+            explicit_conf=self.conf,
+        ) if explicit_local_path is None else explicit_local_path
+        remote_path = location.get_path(
+            create=False,
+            explicit_conf=self.rconf,
+        ) if explicit_remote_path is None else explicit_remote_path
+        pass_dirs_ = [] if pass_dirs is None else pass_dirs
+        legs = []
+        if direction == 'pull':
+            legs.append(self._plan_leg(
+                pull=True,
+                src_path=remote_path,
+                tgt_path=local_path,
+                pass_dirs=pass_dirs_,
+            ))
+        if direction == 'push':
+            legs.append(self._plan_leg(
+                pull=False,
+                src_path=local_path,
+                tgt_path=remote_path,
+                pass_dirs=pass_dirs_,
+            ))
+        link = self.measure_link() if measure and self.host is not None else self.link
+        if direction == 'twoway':
+            legs, conflicts, base = self._plan_twoway(
+                local_path=local_path,
+                remote_path=remote_path,
+                pass_dirs=pass_dirs_,
+            )
+            plan = SyncPlan(legs=legs, link=link, conflicts=conflicts)
+            plan.base = base
+        else:
+            plan = SyncPlan(legs=legs, link=link)
+        self._msg(f"Plan:\n{plan}", function=self.plan.__name__)
+        return plan
+
+
+    def measure_link(
+            self,
+            nbytes = 1 << 22,
+            refresh = False,
+    ):
+        """
+        Measure the latency and the throughput
+        of the link to the remote system, in both directions.
+        Random bytes are streamed through an exec channel,
+        so nothing is written to either file system.
+        The measurement is kept, reused by :any:`Sync.plan`
+        for the rest of the session, and stored for later sessions,
+        which decide from it whether to transfer in bulk and to compress
+        until they measure again.
+
+        Arguments:
+
+            nbytes (integer):
+                Size of the sample streamed in each direction.
+                (Default: 4 MiB)
+            refresh (boolean):
+                Measure again, even if a measurement is available.
+                (Default: False)
+
+        Returns:
+
+            dict: latency (seconds) and throughputs 'get', 'put' (bytes per second),
+            or None in the loopback case.
+
+        """
+        if self.host is None:
+            return None
+        if self._link_measured and not refresh:
+            return self.link
+        # > latency, as an sftp round trip
+        t0 = time.perf_counter()
+        self._sftp.stat('.')
+        latency = time.perf_counter() - t0
+        # > remote to local
+        t0 = time.perf_counter()
+        _stdin, _stdout, _stderr = self._ssh.exec_command(f"head -c {nbytes} /dev/urandom")
+        n = len(_stdout.read())
+        get = n / max(time.perf_counter() - t0 - latency, 1e-6)
+        # > local to remote
+        t0 = time.perf_counter()
+        _stdin, _stdout, _stderr = self._ssh.exec_command("cat > /dev/null")
+        _stdin.write(os_urandom(nbytes))
+        _stdin.channel.shutdown_write()
+        _stdout.channel.recv_exit_status()
+        put = nbytes / max(time.perf_counter() - t0 - latency, 1e-6)
+        # > merged into the stored profile, which keeps the
+        #   compressibility of the last transferred data
+        if self.link is None:
+            self.link = self._read_link_profile() or {}
+        self.link.update({
+            'latency': latency,
+            'get': get,
+            'put': put,
+        })
+        self._link_measured = True
+        self._write_link_profile()
+        self._msg(f"latency {1000*latency:.1f} ms, get {pp_bytes(get)}/s, put {pp_bytes(put)}/s", function=self.measure_link.__name__)
+        return self.link
 
 
     def pull(
@@ -339,30 +1147,35 @@ class Sync:
             pass_dirs (optional list of string):
 
         """
-        # > build target path
-        tgt_path = location.get_path(
-            create=True,
-            explicit_conf=self.conf,
-        ) if explicit_path is not None else explicit_path
-        if self.host:
-            # > build source path
-            src_path = location.get_path(
-                create=False,
-                explicit_conf=self.rconf,
-            ) if explicit_remote_path is None else explicit_remote_path
-            self._msg(f"Underway.\n[remote]{src_path}\n\t|VVV|\n{tgt_path}", function=self.pull.__name__, always=True)
-            # > read the remote system, get all the candidates
-            candidates = self.get_candidates_remote(
-                src_path=src_path,
-                tgt_path=tgt_path,
-                pass_dirs=[] if pass_dirs is None else pass_dirs,
-            )
-            # > perform operation
-            updated, leftalone, created = self._sync1way_impl(candidates)
-            # > messages
-            self._transfer_messages(updated, leftalone, created, self.pull.__name__)
-        else:
-            raise NotImplementedError
+        # > read the remote system, get all the candidates
+        plan = self.plan(
+            direction='pull',
+            location=location,
+            explicit_local_path=explicit_path,
+            explicit_remote_path=explicit_remote_path,
+            pass_dirs=pass_dirs,
+            measure=False,
+        )
+        leg = plan.legs[0]
+        self._msg(f"Underway.\n[remote]{leg.src_path}\n\t|VVV|\n{leg.tgt_path}", function=self.pull.__name__, always=True)
+        # > perform operation
+        updated, leftalone, created = self._sync1way_impl(leg)
+        # > messages
+        self._transfer_messages(updated, leftalone, created, self.pull.__name__)
+        if location is not None and (updated or created):
+            # > the pulled runs can be found in the catalog;
+            #   the target path itself may hold many runs
+            pulled_dirs = set()
+            for path in updated + created:
+                stem = os_path_dirname(path)
+                while stem.startswith(leg.tgt_path) and stem not in pulled_dirs:
+                    pulled_dirs.add(stem)
+                    stem = os_path_dirname(stem)
+            catalog = Catalog()
+            for path, size in find_runs(leg.tgt_path).items():
+                run_location = Location.from_path(path, locale=location.locale, explicit_conf=self.conf)
+                if path in pulled_dirs and run_location is not None:
+                    catalog.record(location=run_location, status="pulled", size=size, path=path)
 
 
     def push(
@@ -427,18 +1240,17 @@ class Sync:
             explicit_conf=self.rconf,
         ) if tgt_epath is None else tgt_epath
         if not empty_push:
-            self._msg(f"Underway.\n{src_path}\n\t|VVV|\n[remote]{tgt_path}", function=self.push.__name__, always=True)
-            # > create the target path
-            self.mkdir_remote(tgt_path)
-            # self.ssh(f"mkdir -p {tgt_path}")
             # > read the local system, get all the candidates
-            candidates = self.get_candidates_local(
-                src_path=src_path,
-                tgt_path=tgt_path,
-                pass_dirs=pass_dirs if pass_dirs is not None else [],
+            plan = self.plan(
+                direction='push',
+                explicit_local_path=src_path,
+                explicit_remote_path=tgt_path,
+                pass_dirs=pass_dirs,
+                measure=False,
             )
+            self._msg(f"Underway.\n{src_path}\n\t|VVV|\n[remote]{tgt_path}", function=self.push.__name__, always=True)
             # > perform operation
-            updated, leftalone, created = self._sync1way_impl(candidates, pull=False)
+            updated, leftalone, created = self._sync1way_impl(plan.legs[0])
             # > messages
             updated = [f"[remote]{x}" for x in updated]
             leftalone = [f"[remote]{x}" for x in leftalone]
@@ -448,6 +1260,52 @@ class Sync:
 
 
 
+    def sync_blobs(
+            self,
+            direction = 'push',
+    ):
+        """
+        Sync the blob store (cf. :any:`BlobStore`) with the blob store
+        in the inventory directory of the remote system.
+        Blobs are named by their content, so a blob that
+        the target already has is never transferred,
+        whatever its last-modified timestamp.
+        Once the stores are synced, pull and push place the files
+        whose content the store of the target has from that store,
+        instead of transferring them, when the Conf file sets ``dedup = true``.
+
+        Arguments:
+
+            direction (string):
+                'push' or 'pull'. (Default: 'push')
+
+        """
+        if direction not in ['pull', 'push']:
+            raise ValueError(f"Unrecognized sync direction {direction}.")
+        local_path = BlobStore().path
+        remote_path = self._remote_blob_path()
+        pull = (direction == 'pull')
+        src_path, tgt_path = (remote_path, local_path) if pull else (local_path, remote_path)
+        sfiles, sdirs = self._scan(src_path, [], loopback=not pull)
+        tfiles, _ = self._scan(tgt_path, [], loopback=pull)
+        created = [
+            (os_path_join(src_path, rel), sfiles[rel][0], os_path_join(tgt_path, rel), 0, sfiles[rel][1])
+            for rel in sfiles if rel not in tfiles and not rel.endswith(".tmp")
+        ]
+        leg = SyncLeg(
+            pull=pull,
+            tgt_dirs=[tgt_path] + [os_path_join(tgt_path, stem) for stem in sdirs if stem],
+            created=created,
+            updated=[],
+            leftalone=[],
+        )
+        leg.src_path = src_path
+        leg.tgt_path = tgt_path
+        self._msg(f"{len(created)} blobs to transfer, {len(sfiles) - len(created)} already present.", function=self.sync_blobs.__name__, always=True)
+        if created:
+            self._sync1way_impl(leg, blobs=False)
+
+
     def twoway(
             self,
             location = None,
@@ -459,20 +1317,25 @@ class Sync:
         Intuitively, synchronize directory trees
         on two systems.
 
-        More precisely, a sync operation that
+        More precisely, a three-way sync operation that
         respects the last-modified information
         in the local system and the remote system,
         locking in any changes that were made on
         one system, but not the other.
+        Changes are detected against a base manifest,
+        a record of both trees kept (locally) by the last twoway sync
+        of the same pair of trees. Only the files that diverged are
+        transferred, in either direction, and each
+        transferred file keeps the last-modified timestamp of its source.
+        Deletions are not propagated: a file deleted on one system
+        is left alone on the other.
 
         If the same file is modified on both systems,
         there is no comparison (no "diff").
-        The youngest ("freshest", or most recently updated) file is kept.
-        So, this can work if a directory tree was updated
-        within separate "sectors" on the two systems,
-        but should not be used if there is any chance that updates
-        might overlap one another, in which case
-        some updates will be destroyed.
+        The youngest ("freshest", or most recently updated) file is kept,
+        and the file is reported as a conflict.
+        On the first twoway sync of a pair of trees there is no base,
+        and the youngest version of every file is kept.
 
         Arguments:
 
@@ -480,54 +1343,33 @@ class Sync:
             explicit_path (string):
             explicit_remote_path (string):
             pass_dirs_remote (list of string):
+                Directories to skip on both systems.
 
-        :meta private:
         """
-        # todo Work in progress.
-
-        # todo this could be fixed without too much trouble
-        #  by synchronizing another
-        #  pair of directory trees with a copy
-        #  that files can be diff'ed against. Then
-        #  this third (reference) system can be
-        #  updated with the changes from both
-        #  downstream systems.
-        #  UPDATE: I have some new notes on this somewhere.
-
-        # > build source path
-        src_path = location.get_path(
-            create = False,
-            explicit_conf=self.rconf,
-        ) if explicit_remote_path is None else explicit_remote_path
-        if self.host:
-            # > build target path
-            tgt_path = location.get_path(
-                create = True,
-                explicit_conf = self.conf,
-            ) if explicit_path is None else explicit_path
-            self._msg(f"Underway.\n[remote]{src_path}\n\t|VVV||^^^|\n{tgt_path}", function=self.twoway.__name__, always=True)
-            # > read the remote system, get all the candidates
-            candidates = self.get_candidates_remote(
-                src_path=src_path,
-                tgt_path=tgt_path,
-                pass_dirs=[] if pass_dirs_remote is None else pass_dirs_remote,
-            )
-            # > perform operation
-            updated, leftalone, created = self._sync1way_impl(candidates)
-            candidates = self.get_candidates_local(
-                src_path=src_path,
-                tgt_path=tgt_path,
-                pass_dirs=[],
-            )
-            # todo review this comparison
-            candidates = [candidate for candidate in candidates if candidate[0] not in updated + created]
-            updated2, leftalone2, created2 = self._sync1way_impl(candidates, pull=False)
-            updated2 = [f"[remote]{x}" for x in updated2]
-            leftalone2 = [f"[remote]{x}" for x in leftalone2]
-            created2 = [f"[remote]{x}" for x in created2]
-            self._transfer_messages(updated+updated2, leftalone+leftalone2, created+created2, function=self.twoway.__name__)
-        else:
-            raise NotImplementedError
+        # > read both systems, get all the candidates
+        plan = self.plan(
+            direction='twoway',
+            location=location,
+            explicit_local_path=explicit_path,
+            explicit_remote_path=explicit_remote_path,
+            pass_dirs=pass_dirs_remote,
+            measure=False,
+        )
+        leg, leg2 = plan.legs
+        self._msg(f"Underway.\n[remote]{leg.src_path}\n\t|VVV||^^^|\n{leg.tgt_path}", function=self.twoway.__name__, always=True)
+        # > perform operation
+        updated, leftalone, created = self._sync1way_impl(leg, preserve_times=True)
+        updated2, leftalone2, created2 = self._sync1way_impl(leg2, preserve_times=True)
+        # > record the new base
+        base_path, files = plan.base
+        self._write_base(base_path, leg.tgt_path, leg.src_path, files)
+        updated2 = [f"[remote]{x}" for x in updated2]
+        leftalone2 = [f"[remote]{x}" for x in leftalone2]
+        created2 = [f"[remote]{x}" for x in created2]
+        self._transfer_messages(updated+updated2, leftalone+leftalone2, created+created2, function=self.twoway.__name__)
+        if plan.conflicts:
+            self._msg("These files were changed on both systems, the youngest was kept:", function=self.twoway.__name__, always=True)
+            self._msg('\n'.join(plan.conflicts), always=True, as_is=True)
 
 
     def run(
@@ -794,9 +1636,15 @@ class Sync:
             if strip:
                 output = output.strip()
         else:
-            _stdin, _stdout, _stderr = self._ssh.exec_command(command)
-            output = _stdout.read().decode()
-            error = _stderr.read().decode()
+            if self._helper is not None:
+                # > a request to the remote helper, instead of a new exec channel
+                result = self._helper.request('run', command=command)
+                output = result['stdout']
+                error = result['stderr']
+            else:
+                _stdin, _stdout, _stderr = self._ssh.exec_command(command)
+                output = _stdout.read().decode()
+                error = _stderr.read().decode()
             if strip:
                 output = output.strip()
             if error:
@@ -918,72 +1766,105 @@ class Sync:
         Returns:
                 :any:`Age`:
         """
+        if self._helper is not None:
+            st = self._helper.request('stat', paths=[path], cwd=self.remote_wdir)[0]
+            return Age(age=st[1] if st is not None and st[0] else 0)
         # This ended up being messier than I had originally hoped.
         cmd = cmd_stat_fmt(path, uname=self._uname)
         age = self.ssh(cmd, strip=True)
         return Age(age=age)
 
 
-    def get_candidates_remote(
+    def hash(self, paths, algorithm = "sha256"):
+        """
+        Hash artifacts on the remote system.
+
+        Arguments:
+
+            paths (string or list of string):
+            algorithm (string):
+                A hash algorithm known to `hashlib`. (Default: sha256)
+
+        Returns:
+
+            list of string: hex digests (None for a missing artifact)
+        """
+        paths_ = paths if isinstance(paths, list) else [paths]
+        if self._helper is not None:
+            return self._helper.request('hash', paths=paths_, algorithm=algorithm, cwd=self.remote_wdir)
+        if algorithm != "sha256":
+            raise NotImplementedError
+        # > fall back on a shell utility, one artifact per command
+        tool = "shasum -a 256" if self._uname == 'Darwin' else "sha256sum"
+        digests = []
+        for path in paths_:
+            if self.os_path_exists(path):
+                digests.append(self.ssh(f"{tool} {path}", strip=True).split(" ")[0])
+            else:
+                digests.append(None)
+        return digests
+
+
+    def _scan(
             self,
-            src_path,
-            tgt_path,
+            path,
             pass_dirs,
+            loopback = False,
     ):
         """
-        Get candidates for a syncing operation,
-        by a recursive polling for information from
-        the file system.
+        Scan a directory tree with a single recursive listing.
 
-        This can be done using `ls`.
+        The local system is scanned in-process,
+        see :any:`scan_tree`. The remote system
+        is scanned using `ls`.
         Parsing of `ls` output makes assumptions
         about how ls behaves. Has
         been tested on Darwin (flavor of BSD)
         and Linux ITCINOOD.
 
-        Builds target directory tree as side effect.
-
         Arguments:
 
-            src_path (string):
-                source path
-            tgt_path (string):
-                uses the tgt_path as root path and create
-                the directory tree revealed while building the
-                candidate list.
+            path (string):
+                root of the directory tree
             pass_dirs (list of string):
-                Directories to skip during scan of remote
-                directory. These directories, if they exist, and their
+                Directories to skip during the scan.
+                These directories, if they exist, and their
                 contents will be left unchecked, and untouched.
+            loopback (boolean):
+                scan the local system rather than the remote system
 
         Returns:
 
-            list of pairs (path, age, tgt_path) where `name`
-                is a full path to an artifact and `age` is its age.
+            pair (files, dirs), where `files` is a dict mapping
+                the path of every file relative to `path`
+                to a pair (age, size), and `dirs` is the list of
+                the directories, relative to `path`, that were scanned
+                (the root is the empty string).
 
         :meta private:
         """
-        # todo get_candidates_remote's pass_dirs feature was
-        #  added as a hasty afterthought - my apologies :/
-        #  It's a needed feature, and when there is time
-        #  we need to implement a stable and comprehensive test.
-
-        # todo merge code for get_candidates_local and get_candidates_remote?
-        candidates = []
-        cmd = cmd_ls_fmt(src_path, uname=self._uname)
+        if loopback or self.host is None:
+            return scan_tree(path, pass_dirs)
+        if self._helper is not None:
+            listing = self._helper.request('list', path=path, pass_dirs=pass_dirs, cwd=self.remote_wdir)
+            files = {rel: tuple(x) for rel, x in listing['files'].items()}
+            return dict(sorted(files.items())), listing['dirs']
+        files = {}
+        dirs = []
+        cmd = cmd_ls_fmt(path, uname=self._uname)
         output = self.ssh(cmd)
+        # todo if there is a problem, STOP.
         blocks = output.strip().split("\n\n")
         # Assumption: When a full path is passed to ls,
         # the headings on the blocks in the recursive output
         # are all full paths. (ls -lR /full/path/to/X)
-        prefix = src_path
-        stemlist = []
+        stem = ""
         for block in blocks:
             pass_block = False
             lines = block.split("\n")
             for line in lines:
                 if pass_block:
-                    self._msg(f"Passing block:\n{block}", function=self.get_candidates_remote.__name__)
+                    self._msg(f"Passing block:\n{block}", function=self._scan.__name__)
                     break # from line loop
                 line = line.strip()
                 if line == "":
@@ -992,7 +1873,7 @@ class Sync:
                     continue
                 if line.endswith(":"):
                     prefix = line.split(":")[0]
-                    stem = prefix.removeprefix(src_path)
+                    stem = prefix.removeprefix(path)
                     # Does the OS's `ls` write /foo/bar/ or /foo/bar?
                     # I think I've seen both. :/
                     # I could use strip('/') but I
@@ -1010,17 +1891,77 @@ class Sync:
                             pass_block = True
                             break # from pass_dir loop
                     if not pass_block:
-                        if stemlist:
-                            create_dir(tgt_path, stem=stemlist)
+                        dirs.append(stem)
                     continue
                 cols = re_split(r" +", line)
                 name = cols[6]
                 if name[0] != '.' and cols[0][0] != 'd':
-                    path1 = os_path_join(prefix, name)
-                    age1 = int(cols[5])
-                    path2 = os_path_join(tgt_path, *stemlist, name)
-                    age2 = Age(path2).dtint
-                    candidates.append((path1, age1, path2, age2))
+                    rel = os_path_join(stem, name) if stem else name
+                    files[rel] = (int(cols[5]), int(cols[4]))
+        return files, dirs
+
+
+    def get_candidates_remote(
+            self,
+            src_path,
+            tgt_path,
+            pass_dirs,
+            tgt_dirs = None,
+    ):
+        """
+        Get candidates for a syncing operation,
+        by a recursive polling for information from
+        the file system, see :any:`Sync._scan`.
+
+        Builds target directory tree as side effect,
+        unless ``tgt_dirs`` is given.
+
+        Arguments:
+
+            src_path (string):
+                source path
+            tgt_path (string):
+                uses the tgt_path as root path and create
+                the directory tree revealed while building the
+                candidate list.
+            pass_dirs (list of string):
+                Directories to skip during scan of remote
+                directory. These directories, if they exist, and their
+                contents will be left unchecked, and untouched.
+            tgt_dirs (optional list of string):
+                If given, the directories of the target tree
+                are appended to this list instead of being created.
+
+        Returns:
+
+            :any:`CandidateTable`, a sequence of tuples (path1, age1, path2, age2, size1)
+                where `path1` is a full path to a source artifact, `path2` the full path
+                of the corresponding target artifact,
+                `age1` and `age2` their ages (0 if absent),
+                and `size1` the size of the source artifact in bytes.
+
+        :meta private:
+        """
+        # todo get_candidates_remote's pass_dirs feature was
+        #  added as a hasty afterthought - my apologies :/
+        #  It's a needed feature, and when there is time
+        #  we need to implement a stable and comprehensive test.
+        files, dirs = self._scan(src_path, pass_dirs)
+        for stem in dirs:
+            if tgt_dirs is None:
+                create_dir(tgt_path, stem=stem.split('/'))
+            elif stem:
+                tgt_dirs.append(os_path_join(tgt_path, stem))
+        rels = list(files)
+        ages2 = Age.batch([os_path_join(tgt_path, rel) for rel in rels])
+        candidates = CandidateTable(
+            src_root=src_path,
+            tgt_root=tgt_path,
+            rels=rels,
+            age1=[files[rel][0] for rel in rels],
+            size1=[files[rel][1] for rel in rels],
+            age2=[age2.dtint for age2 in ages2],
+        )
         self._msg(candidates, function=self.get_candidates_remote.__name__)
         return candidates
 
@@ -1030,9 +1971,11 @@ class Sync:
             src_path,
             tgt_path,
             pass_dirs,
+            tgt_dirs = None,
     ):
         """
-        Builds target directory tree as side effect.
+        Builds target directory tree as side effect,
+        unless ``tgt_dirs`` is given.
 
         Arguments:
 
@@ -1041,73 +1984,45 @@ class Sync:
             pass_dirs (list of string):
                 List of directory names to pass,
                 on a recursive basis.
+            tgt_dirs (optional list of string):
+                If given, the directories of the target tree
+                are appended to this list instead of being created.
 
         Returns:
 
-            candidate list
+            :any:`CandidateTable`, see :any:`Sync.get_candidates_remote`
 
         :meta private:
         """
-        candidates = []
-        cmd = cmd_ls_fmt(src_path)
-        output = self.ssh(cmd, loopback=True)
-        # todo if there is a problem, STOP.
-        blocks = output.strip().split("\n\n")
-        # Assumption: When a full path is passed to ls,
-        # the headings on the blocks in the recursive output
-        # are all full paths. (ls -lR /full/path/to/X)
-        root1 = src_path
-        stemlist = []
-        for block in blocks:
-            pass_block = False
-            lines = block.split("\n")
-            for line in lines:
-                if pass_block:
-                    self._msg(f"Passing block:\n{block}", function=self.get_candidates_local.__name__)
-                    break # from line loop
+        files, dirs = self._scan(src_path, pass_dirs, loopback=True)
+        for stem in dirs:
+            if stem:
+                tgt_path_stem = os_path_join(tgt_path, stem)
+                if tgt_dirs is not None:
+                    tgt_dirs.append(tgt_path_stem)
+                elif self.host is not None:
+                    # todo test unusual characters in the path
+                    self.ssh(f"mkdir -p {tgt_path_stem}")
                 else:
-                    line = line.strip()
-                    if line == "":
-                        continue
-                    if line.startswith("total"):
-                        continue
-                    if line.endswith(":"):
-                        root1 = line.split(":")[0]
-                        stem = root1.removeprefix(src_path)
-                        # Does the OS's `ls` write /foo/bar/ or /foo/bar?
-                        # I think I've seen both. :/
-                        # I could use strip('/') but I
-                        # want to be certain I have an empty
-                        # string in the case I am expecting one.
-                        if stem:
-                            while stem[0] == '/':
-                                stem = stem[1:]
-                            if stem:
-                                while stem[-1] == '/':
-                                    stem = stem[:-1]
-                        stemlist = stem.split('/')
-                        # todo document this loop
-                        for pass_dir in pass_dirs:
-                            if pass_dir in stemlist:
-                                pass_block = True
-                                break # from pass_dir loop
-                        if not pass_block:
-                            if stem:
-                                tgt_path_stem = os_path_join(tgt_path, stem)
-                                if self.host is not None:
-                                    # todo test unusual characters in the path
-                                    self.ssh(f"mkdir -p {tgt_path_stem}")
-                                else:
-                                    os_makedirs(tgt_path_stem, exist_ok=True)
-                        continue
-                    cols = re_split(r" +", line)
-                    name = cols[6]
-                    if name[0] != '.' and cols[0][0] != 'd':
-                        path1 = os_path_join(root1, name)
-                        age = int(cols[5])
-                        path2 = os_path_join(tgt_path, *stemlist, name)
-                        age2 = Age(age=self.ssh(cmd_stat_fmt(path2, uname=self._uname), strip=True)).dtint
-                        candidates.append((path1, age, path2, age2))
+                    os_makedirs(tgt_path_stem, exist_ok=True)
+        rels = list(files)
+        if self._helper is not None:
+            # > one request for the ages of all the targets
+            paths2 = [os_path_join(tgt_path, rel) for rel in rels]
+            stats = self._helper.request('stat', paths=paths2, cwd=self.remote_wdir)
+            ages2 = [st[1] if st is not None and st[0] else 0 for st in stats]
+        else:
+            # > one scan of the target tree, as for a pull
+            tfiles, _ = self._scan(tgt_path, pass_dirs)
+            ages2 = [tfiles[rel][0] if rel in tfiles else 0 for rel in rels]
+        candidates = CandidateTable(
+            src_root=src_path,
+            tgt_root=tgt_path,
+            rels=rels,
+            age1=[files[rel][0] for rel in rels],
+            size1=[files[rel][1] for rel in rels],
+            age2=ages2,
+        )
         self._msg(candidates, function=self.get_candidates_local.__name__)
         return candidates
 
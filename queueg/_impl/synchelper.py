@@ -0,0 +1,199 @@
+
+
+
+
+import base64
+import json
+import struct
+
+
+# The helper program that runs on the remote system.
+# It must run on any Python 3 the remote system is likely to have,
+# so it sticks to the standard library and to Python 3.6 syntax.
+helper_source = R"""
+import sys, os, json, struct, stat, hashlib, subprocess
+
+def read_frame():
+    head = sys.stdin.buffer.read(4)
+    if len(head) < 4:
+        return None
+    n = struct.unpack('>I', head)[0]
+    return json.loads(sys.stdin.buffer.read(n).decode('utf-8'))
+
+def write_frame(obj):
+    data = json.dumps(obj).encode('utf-8')
+    sys.stdout.buffer.write(struct.pack('>I', len(data)) + data)
+    sys.stdout.buffer.flush()
+
+def resolve(path, cwd):
+    return os.path.join(cwd, path) if cwd else path
+
+def op_stat(paths, cwd = None):
+    out = []
+    for path in paths:
+        try:
+            st = os.stat(resolve(path, cwd))
+            out.append([stat.S_ISREG(st.st_mode), int(st.st_mtime), st.st_size])
+        except OSError:
+            out.append(None)
+    return out
+
+def op_list(path, pass_dirs = None, cwd = None):
+    root = resolve(path, cwd)
+    pass_dirs = set(pass_dirs or [])
+    files = {}
+    dirs = []
+    if not os.path.isdir(root):
+        return {'files': files, 'dirs': dirs}
+    stack = [(root, '')]
+    while stack:
+        dpath, stem = stack.pop()
+        dirs.append(stem)
+        try:
+            entries = list(os.scandir(dpath))
+        except OSError:
+            continue
+        for entry in entries:
+            if entry.name[0] == '.':
+                continue
+            rel = stem + '/' + entry.name if stem else entry.name
+            if entry.is_dir(follow_symlinks=False):
+                if entry.name not in pass_dirs:
+                    stack.append((entry.path, rel))
+            else:
+                st = entry.stat(follow_symlinks=False)
+                files[rel] = [int(st.st_mtime), st.st_size]
+    return {'files': files, 'dirs': sorted(dirs)}
+
+def op_mkdir(paths, cwd = None):
+    for path in paths:
+        os.makedirs(resolve(path, cwd), exist_ok=True)
+    return None
+
+def op_hash(paths, algorithm = 'sha256', cwd = None):
+    out = []
+    for path in paths:
+        try:
+            h = hashlib.new(algorithm)
+            with open(resolve(path, cwd), 'rb') as f:
+                for chunk in iter(lambda: f.read(1 << 20), b''):
+                    h.update(chunk)
+            out.append(h.hexdigest())
+        except OSError:
+            out.append(None)
+    return out
+
+def op_run(command, cwd = None):
+    # the user's login shell, as for an exec channel, so that
+    # shell functions (e.g. `module`) are defined; csh takes -l alone
+    shell = os.environ.get('SHELL') or '/bin/sh'
+    if os.path.basename(shell) in ('csh', 'tcsh'):
+        args = [shell, '-c', command]
+    else:
+        args = [shell, '-l', '-c', command]
+    # stdin carries the frames: the command must not read it
+    cp = subprocess.run(args, cwd=cwd, stdin=subprocess.DEVNULL, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    return {
+        'stdout': cp.stdout.decode('utf-8', 'replace'),
+        'stderr': cp.stderr.decode('utf-8', 'replace'),
+        'returncode': cp.returncode,
+    }
+
+ops = {
+    'ping': lambda: 'pong',
+    'stat': op_stat,
+    'list': op_list,
+    'mkdir': op_mkdir,
+    'hash': op_hash,
+    'run': op_run,
+}
+
+while True:
+    request = read_frame()
+    if request is None:
+        break
+    op = request.pop('op')
+    try:
+        write_frame({'ok': True, 'result': ops[op](**request)})
+    except Exception as e:
+        write_frame({'ok': False, 'error': '%s: %s' % (type(e).__name__, e)})
+"""
+
+
+
+class SyncHelper:
+    """
+    Client of a long-lived helper process on the remote system,
+    started once per :any:`Sync` session.
+    Requests and results are JSON objects, framed by a 4-byte
+    (big-endian) length prefix, exchanged over the stdin and stdout
+    of a single exec channel. One request costs one round trip,
+    instead of the setup of a new exec channel and a new remote shell.
+
+    Operations:
+
+        - ``stat(paths)``: for each path, [is regular file, age, size] or None.
+        - ``list(path, pass_dirs)``: recursive listing, cf. :any:`scan_tree`.
+        - ``mkdir(paths)``: like ``mkdir -p``.
+        - ``hash(paths, algorithm)``: hex digest of each file, or None.
+        - ``run(command)``: run a command in the user's login shell (``$SHELL -l -c``),
+          with no standard input, returns stdout, stderr and return code.
+
+    Relative paths are resolved in the working directory ``cwd``,
+    if one is given with the request.
+
+    Parameters:
+
+        client (paramiko SSHClient):
+            An open connection.
+        python (string):
+            Python 3 interpreter on the remote system. (Default: ``python3``)
+
+    :meta private:
+    """
+
+    def __init__(
+            self,
+            client,
+            python = "python3",
+    ):
+        payload = base64.b64encode(helper_source.encode()).decode()
+        command = f"{python} -u -c \"import base64; exec(base64.b64decode('{payload}'))\""
+        self._stdin, self._stdout, self._stderr = client.exec_command(command)
+        if self.request('ping') != 'pong':
+            raise SystemError("The remote helper did not answer.")
+
+
+    def request(self, op, **kwargs):
+        """
+        Send a request and wait for its result.
+
+        Arguments:
+
+            op (string): operation
+            kwargs: arguments of the operation
+
+        Returns:
+
+            the result of the operation
+        """
+        kwargs['op'] = op
+        data = json.dumps(kwargs).encode()
+        self._stdin.write(struct.pack('>I', len(data)) + data)
+        self._stdin.flush()
+        head = self._stdout.read(4)
+        if len(head) < 4:
+            error = self._stderr.read().decode()
+            raise SystemError(f"The remote helper exited. {error}")
+        n = struct.unpack('>I', head)[0]
+        response = json.loads(self._stdout.read(n).decode())
+        if not response['ok']:
+            raise SystemError(f"The remote helper failed ({op}): {response['error']}")
+        return response['result']
+
+
+    def close(self):
+        # > end of stdin ends the helper
+        self._stdin.channel.shutdown_write()
+        self._stdin.channel.close()
+
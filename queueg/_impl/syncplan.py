@@ -0,0 +1,414 @@
+
+
+
+import sys
+import time
+import zlib
+
+from os.path import (
+    join as os_path_join,
+)
+from numpy import (
+    asarray as numpy_asarray,
+    array as numpy_array,
+    empty as numpy_empty,
+    arange as numpy_arange,
+    concatenate as numpy_concatenate,
+    flatnonzero as numpy_flatnonzero,
+    searchsorted as numpy_searchsorted,
+    bincount as numpy_bincount,
+    int32 as numpy_int32,
+    int64 as numpy_int64,
+)
+
+
+# Upper edges (in bytes) of the bins of the file-size histogram,
+# with labels. Files at least as large as the last edge
+# land in a final overflow bin.
+size_bins = [
+    (1 << 12, "< 4 KiB"),
+    (1 << 16, "4 KiB - 64 KiB"),
+    (1 << 20, "64 KiB - 1 MiB"),
+    (1 << 24, "1 MiB - 16 MiB"),
+    (1 << 28, "16 MiB - 256 MiB"),
+]
+size_bin_overflow = ">= 256 MiB"
+
+# Request/response round trips that sftp spends
+# on each file (open, stat, close, and a little slack),
+# independently of the size of the file.
+sftp_round_trips_per_file = 4
+
+
+
+def estimate_durations(leg, link):
+    """
+    Estimated durations (seconds) of the transfers of a :any:`SyncLeg`,
+    one file at a time (sftp) and as a single stream (bulk).
+
+    :meta private:
+    """
+    rate = link['get'] if leg.pull else link['put']
+    sizes = leg.sizes()
+    nbytes = int(sizes.sum())
+    nfiles = len(sizes)
+    per_file = nbytes / rate + nfiles * sftp_round_trips_per_file * link['latency']
+    bulk = nbytes / rate + link['latency'] if nfiles > 0 else 0.0
+    return per_file, bulk
+
+
+
+def compressibility(sample, level = 6):
+    """
+    Compress a sample with zlib.
+
+    Returns:
+
+        pair (ratio, rate): compressed size over original size,
+            and compression throughput in bytes per second.
+
+    :meta private:
+    """
+    if not sample:
+        return 1.0, float("inf")
+    t0 = time.perf_counter()
+    compressed = zlib.compress(sample, level)
+    elapsed = max(time.perf_counter() - t0, 1e-6)
+    return len(compressed) / len(sample), len(sample) / elapsed
+
+
+
+def compression_pays(ratio, zlib_rate, rate):
+    """
+    Whether compressing with a given ratio and throughput
+    saves time on a link of a given throughput (bytes per second):
+    the time saved on the wire, per byte, must exceed the time
+    spent compressing it.
+
+    :meta private:
+    """
+    return (1.0 - ratio) / rate > 1.0 / zlib_rate
+
+
+
+def pp_bytes(n):
+    """
+    Pretty print a number of bytes.
+
+    :meta private:
+    """
+    x = float(n)
+    for unit in ["B", "KiB", "MiB", "GiB", "TiB"]:
+        if x < 1024.0 or unit == "TiB":
+            break
+        x /= 1024.0
+    return f"{x:.1f} {unit}" if unit != "B" else f"{n} B"
+
+
+
+class CandidateTable:
+    """
+    Columnar table of sync candidates, as built by
+    :any:`Sync.get_candidates_remote` and :any:`Sync.get_candidates_local`.
+    Instead of one tuple of full paths per file, a table keeps
+    the two roots once, a prefix table of the directories
+    (relative to the roots), one interned file name per row,
+    and the ages and sizes in integer arrays.
+    Sub-tables (cf. :any:`CandidateTable.decide`) share the prefix table.
+
+    The table still behaves like a sequence of candidates:
+    indexing a row gives the tuple ``(path1, age1, path2, age2, size1)``.
+
+    Parameters:
+
+        src_root (string):
+            Root of the source tree.
+        tgt_root (string):
+            Root of the target tree.
+        rels (list of string):
+            Path of each file relative to the roots.
+        age1 (list of integer):
+            Age of each source artifact.
+        size1 (list of integer):
+            Size of each source artifact, in bytes.
+        age2 (list of integer):
+            Age of each target artifact (0 if absent).
+
+    :meta private:
+    """
+
+    def __init__(
+            self,
+            src_root,
+            tgt_root,
+            rels,
+            age1,
+            size1,
+            age2,
+    ):
+        self.src_root = src_root
+        self.tgt_root = tgt_root
+        # > prefix table
+        self.dirs = []
+        dir_ids = {}
+        self.dir_idx = numpy_empty(len(rels), dtype=numpy_int32)
+        self.names = []
+        for i, rel in enumerate(rels):
+            stem, _, name = rel.rpartition('/')
+            j = dir_ids.get(stem)
+            if j is None:
+                j = len(self.dirs)
+                dir_ids[stem] = j
+                self.dirs.append(stem)
+            self.dir_idx[i] = j
+            self.names.append(sys.intern(name))
+        self.age1 = numpy_asarray(age1, dtype=numpy_int64)
+        self.size1 = numpy_asarray(size1, dtype=numpy_int64)
+        self.age2 = numpy_asarray(age2, dtype=numpy_int64)
+
+
+    def _take(self, rows):
+        """
+        Sub-table of the given rows.
+
+        :meta private:
+        """
+        out = CandidateTable.__new__(CandidateTable)
+        out.src_root = self.src_root
+        out.tgt_root = self.tgt_root
+        out.dirs = self.dirs
+        out.dir_idx = self.dir_idx[rows]
+        out.names = [self.names[i] for i in rows]
+        out.age1 = self.age1[rows]
+        out.size1 = self.size1[rows]
+        out.age2 = self.age2[rows]
+        return out
+
+
+    def decide(self):
+        """
+        Sort the rows into updates, skips and creations,
+        in one vectorized comparison of the ages.
+        A target age of 0 means the target artifact does not exist.
+
+        Returns:
+
+            triple of :any:`CandidateTable` (updated, leftalone, created)
+
+        """
+        created = (self.age2 == 0)
+        updated = ~created & (self.age2 < self.age1)
+        leftalone = ~(created | updated)
+        return (
+            self._take(numpy_flatnonzero(updated)),
+            self._take(numpy_flatnonzero(leftalone)),
+            self._take(numpy_flatnonzero(created)),
+        )
+
+
+    def rel(self, i):
+        """
+        Relative path of row ``i``.
+        """
+        stem = self.dirs[self.dir_idx[i]]
+        return f"{stem}/{self.names[i]}" if stem else self.names[i]
+
+
+    def __len__(self):
+        return len(self.names)
+
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return self._take(numpy_arange(len(self))[i])
+        rel = self.rel(i)
+        return (
+            os_path_join(self.src_root, rel),
+            int(self.age1[i]),
+            os_path_join(self.tgt_root, rel),
+            int(self.age2[i]),
+            int(self.size1[i]),
+        )
+
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+
+    def __add__(self, other):
+        if other.dirs is not self.dirs:
+            raise ValueError("Only sub-tables of the same table can be concatenated.")
+        out = CandidateTable.__new__(CandidateTable)
+        out.src_root = self.src_root
+        out.tgt_root = self.tgt_root
+        out.dirs = self.dirs
+        out.dir_idx = numpy_concatenate([self.dir_idx, other.dir_idx])
+        out.names = self.names + other.names
+        out.age1 = numpy_concatenate([self.age1, other.age1])
+        out.size1 = numpy_concatenate([self.size1, other.size1])
+        out.age2 = numpy_concatenate([self.age2, other.age2])
+        return out
+
+
+    def __repr__(self):
+        return f"CandidateTable({len(self)} candidates, {self.src_root} -> {self.tgt_root})"
+
+
+
+class SyncLeg:
+    """
+    One direction of a planned sync: the decisions taken
+    for each candidate, without any transfer having taken place.
+    Candidates are tuples ``(path1, age1, path2, age2, size1)``,
+    see :any:`Sync.get_candidates_remote`, held either in lists
+    or in a :any:`CandidateTable`.
+
+    Parameters:
+
+        pull (boolean):
+            Direction of the leg, True for remote to local.
+        tgt_dirs (list of string):
+            Target directories that must exist before the transfer.
+        created (list of candidates):
+            Candidates absent from the target.
+        updated (list of candidates):
+            Candidates older in the target than in the source.
+        leftalone (list of candidates):
+            Candidates that will be skipped.
+
+    :meta private:
+    """
+
+    def __init__(
+            self,
+            pull,
+            tgt_dirs,
+            created,
+            updated,
+            leftalone,
+    ):
+        self.pull = pull
+        self.tgt_dirs = tgt_dirs
+        self.created = created
+        self.updated = updated
+        self.leftalone = leftalone
+
+
+    def transfers(self):
+        return self.created + self.updated
+
+
+    def sizes(self):
+        """
+        Sizes of the transferred files, as an integer array.
+        """
+        transfers = self.transfers()
+        if isinstance(transfers, CandidateTable):
+            return transfers.size1
+        return numpy_array([candidate[4] for candidate in transfers], dtype=numpy_int64)
+
+
+
+class SyncPlan:
+    """
+    Result of a dry run of :any:`Sync`,
+    returned by :any:`Sync.plan`.
+    Summarizes what a pull, push or twoway sync would do
+    and what it would cost, without transferring anything.
+
+    The estimated durations use the link throughput and latency
+    measured by :any:`Sync.measure_link`.
+    The per-file estimate models sftp transfers one file at a time,
+    paying a few round trips for every file,
+    while the bulk estimate models a single stream (e.g. a tar archive)
+    that pays the latency once.
+    Comparing the two helps decide between per-file transfer
+    and a bulk mode.
+
+    Attributes:
+
+        legs (list of :any:`SyncLeg`):
+            One leg for pull or push, two legs for twoway.
+        nfiles (integer):
+            Number of files that would be transferred.
+        nbytes (integer):
+            Number of bytes that would be transferred.
+        conflicts (list of string):
+            For twoway, relative paths of files changed on both systems.
+        histogram (dict[string] of integer):
+            File count of the transferred files, per size bin.
+        duration (float or None):
+            Estimated duration (seconds) of a per-file transfer,
+            or None if the link was not measured.
+        duration_bulk (float or None):
+            Estimated duration (seconds) of a single-stream transfer,
+            or None if the link was not measured.
+
+    :meta private:
+    """
+
+    def __init__(
+            self,
+            legs,
+            link = None,
+            conflicts = None,
+    ):
+        self.legs = legs
+        self.link = link
+        self.conflicts = conflicts if conflicts is not None else []
+        # base manifest, for twoway (cf. Sync.twoway)
+        self.base = None
+        self.nfiles = 0
+        self.nbytes = 0
+        self.histogram = {label: 0 for _, label in size_bins}
+        self.histogram[size_bin_overflow] = 0
+        self.duration = None
+        self.duration_bulk = None
+        edges = [edge for edge, _ in size_bins]
+        labels = [label for _, label in size_bins] + [size_bin_overflow]
+        for leg in self.legs:
+            sizes = leg.sizes()
+            self.nfiles += len(sizes)
+            self.nbytes += int(sizes.sum())
+            # > bin i holds the sizes below edge i (and at least edge i-1)
+            counts = numpy_bincount(numpy_searchsorted(edges, sizes, side='right'), minlength=len(labels))
+            for label, count in zip(labels, counts):
+                self.histogram[label] += int(count)
+        if self.link is not None:
+            self.duration = 0.0
+            self.duration_bulk = 0.0
+            for leg in self.legs:
+                per_file, bulk = estimate_durations(leg, self.link)
+                self.duration += per_file
+                self.duration_bulk += bulk
+
+
+    def created(self):
+        return [x for leg in self.legs for x in leg.created]
+
+
+    def updated(self):
+        return [x for leg in self.legs for x in leg.updated]
+
+
+    def leftalone(self):
+        return [x for leg in self.legs for x in leg.leftalone]
+
+
+    def __str__(self):
+        lines = [
+            f"create: {sum([len(leg.created) for leg in self.legs])}, "
+            f"update: {sum([len(leg.updated) for leg in self.legs])}, "
+            f"skip: {sum([len(leg.leftalone) for leg in self.legs])}",
+            f"transfer: {self.nfiles} files, {pp_bytes(self.nbytes)}",
+        ]
+        if self.conflicts:
+            lines.append(f"conflicts: {len(self.conflicts)}")
+        for label in self.histogram:
+            if self.histogram[label] > 0:
+                lines.append(f"\t{label}: {self.histogram[label]}")
+        if self.duration is not None:
+            lines.append(f"estimated duration: {self.duration:.1f} s per file, {self.duration_bulk:.1f} s bulk")
+        return '\n'.join(lines)
+
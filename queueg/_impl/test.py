@@ -51,7 +51,7 @@ class Test:
         self.mode = mode
         self.testdict = tests if tests is not None else {}
         self.v = verbose
-        self.conf = Conf()
+        self.conf = Conf.cached()
         self.env = self.conf['env']
         if self.conf['venv_manager'] != 'conda':
             raise NotImplementedError
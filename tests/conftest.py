@@ -0,0 +1,15 @@
+import pytest
+
+
+
+@pytest.fixture
+def home(tmp_path, monkeypatch):
+    """
+    A fresh home directory, so that the QueueG
+    configuration directory and caches are private to a test.
+    """
+    path = tmp_path / "home"
+    path.mkdir()
+    monkeypatch.setenv("HOME", str(path))
+    monkeypatch.delenv("QUEUEG_CONF_DIR", raising=False)
+    return path
@@ -0,0 +1,34 @@
+import os
+
+from queueg._impl.ossys import Age
+
+
+
+def test_age_compares_at_the_coarser_resolution(tmp_path):
+    path = tmp_path / "f"
+    path.write_text("x")
+    os.utime(path, ns=(1700000000123456789, 1700000000123456789))
+    local = Age(path=str(path))
+    assert local.ns == 1700000000123456789
+    # > the same file, seen in seconds (e.g. remotely)
+    assert local == Age(age=1700000000)
+    assert not local < Age(age=1700000000)
+    assert Age(age=1699999999) < local
+    # > two local ages keep nanoseconds
+    other = tmp_path / "g"
+    other.write_text("y")
+    os.utime(other, ns=(1700000000123456790, 1700000000123456790))
+    assert local < Age(path=str(other))
+
+
+def test_age_batch_matches_age(tmp_path):
+    paths = []
+    for i in range(3):
+        path = tmp_path / f"f{i}"
+        path.write_text("x")
+        os.utime(path, (1000 + i, 1000 + i))
+        paths.append(str(path))
+    paths.append(str(tmp_path / "missing"))
+    ages = Age.batch(paths)
+    assert [age.dtint for age in ages] == [1000, 1001, 1002, 0]
+    assert ages == [Age(path=path) for path in paths]
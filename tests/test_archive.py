@@ -0,0 +1,53 @@
+import os
+import tarfile
+import zipfile
+
+import pytest
+
+from queueg import zip_something_up
+
+
+
+def _tree(root):
+    (root / "src" / "sub").mkdir(parents=True)
+    (root / "src" / "skip").mkdir()
+    (root / "src" / "a.txt").write_text("a" * 1000)
+    (root / "src" / "sub" / "b.dat").write_text("1 2 3\n" * 100)
+    (root / "src" / "sub" / "empty").write_text("")
+    (root / "src" / "skip" / "c.txt").write_text("c")
+    (root / "src" / ".hidden").write_text("h")
+    # > a name with regular expression metacharacters
+    (root / "src" / "x[1]+.txt").write_text("x")
+    return {str(root): {"src": ["skip"]}}
+
+
+def test_zip(tmp_path, monkeypatch):
+    sources = _tree(tmp_path)
+    # > a.txt is large: compressed as it is read, the others are read ahead
+    monkeypatch.setattr("queueg._impl.ossys.ossys.zip_stream_threshold", 500)
+    out = tmp_path / "out"
+    out.mkdir()
+    path = zip_something_up(sources, "arch", zip_path=str(out), max_workers=3)
+    with zipfile.ZipFile(path) as z:
+        assert z.testzip() is None
+        assert sorted(z.namelist()) == ["arch/src/a.txt", "arch/src/sub/b.dat", "arch/src/sub/empty", "arch/src/x[1]+.txt"]
+        assert z.read("arch/src/sub/b.dat") == b"1 2 3\n" * 100
+        assert z.getinfo("arch/src/a.txt").compress_type == zipfile.ZIP_DEFLATED
+
+
+def test_tar_incremental(tmp_path):
+    sources = _tree(tmp_path)
+    out = tmp_path / "out"
+    out.mkdir()
+    first = zip_something_up(sources, "arch", zip_path=str(out), fmt="tar", incremental=True)
+    (tmp_path / "src" / "a.txt").write_text("changed")
+    os.utime(tmp_path / "src" / "a.txt", (1, 1))
+    second = zip_something_up(sources, "arch", zip_path=str(out), fmt="tar", incremental=True)
+    assert first.endswith("arch.tar") and second.endswith("arch.1.tar")
+    with tarfile.open(second) as tar:
+        assert tar.getnames() == ["arch/src/a.txt"]
+
+
+def test_unknown_format(tmp_path):
+    with pytest.raises(ValueError):
+        zip_something_up({}, "arch", zip_path=str(tmp_path), fmt="rar")
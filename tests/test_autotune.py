@@ -0,0 +1,43 @@
+import shutil
+
+import pytest
+
+from queueg.C.C_impl.autotune import (
+    TuningStore,
+    autotune_candidates,
+)
+
+
+cc = shutil.which("gcc") or shutil.which("cc")
+
+
+
+def test_candidates_keep_results():
+    assert not any(["-ffast-math" in flags for flags in autotune_candidates])
+
+
+@pytest.mark.skipif(cc is None, reason="no C compiler")
+def test_key(tmp_path):
+    (tmp_path / "inc").mkdir()
+    (tmp_path / "inc" / "a.h").write_text("#define N 1\n")
+    (tmp_path / "m.c").write_text('#include "a.h"\nint main(void){return N;}\n')
+    def key(compiler_args):
+        return TuningStore.key(cc, ["m.c"], compiler_args, ["inc"], str(tmp_path))
+    first = key(["-O2", "-Wall"])
+    # > the flags that a tuning replaces are not part of the key
+    assert key(["-O3", "-march=native", "-Wall"]) == first
+    # > other arguments are
+    assert key(["-O2"]) != first
+    assert key(["-O2", "-Wall", "-DM=2"]) != first
+    # > and so are the headers
+    (tmp_path / "inc" / "a.h").write_text("#define N 2\n")
+    assert key(["-O2", "-Wall"]) != first
+    assert TuningStore.key(cc, ["missing.c"], [], [], str(tmp_path)) is None
+
+
+def test_store(tmp_path):
+    store = TuningStore(path=str(tmp_path / "tunings.json"))
+    store.store("k", ["-O3"], {"-O3": 1.0}, host="h")
+    assert store.lookup("k", host="h") == {'flags': ["-O3"], 'timings': {"-O3": 1.0}}
+    assert store.lookup("k", host="other") is None
+    assert list(tmp_path.iterdir()) == [tmp_path / "tunings.json"]
@@ -0,0 +1,82 @@
+import os
+import stat
+from concurrent.futures import ThreadPoolExecutor
+
+from queueg import BlobStore
+
+
+
+def _mode(path):
+    return stat.S_IMODE(os.stat(path).st_mode)
+
+
+def test_put_stores_each_content_once(tmp_path):
+    store = BlobStore(path=str(tmp_path / "blobs"))
+    (tmp_path / "a").write_text("same")
+    (tmp_path / "b").write_text("same")
+    (tmp_path / "c").write_text("other")
+    digests = [store.put(str(tmp_path / name)) for name in "abc"]
+    assert digests[0] == digests[1] != digests[2]
+    assert digests[0] in store
+    assert store.digest(str(tmp_path / "a")) == digests[0]
+    blobs = [name for _, _, names in os.walk(tmp_path / "blobs") for name in names]
+    assert len(blobs) == 2
+    assert _mode(store.blob_path(digests[0])) == 0o444
+
+
+def test_concurrent_puts(tmp_path):
+    store = BlobStore(path=str(tmp_path / "blobs"))
+    for i in range(16):
+        (tmp_path / f"f{i}").write_text("shared input")
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        digests = list(pool.map(store.put, [str(tmp_path / f"f{i}") for i in range(16)]))
+    assert len(set(digests)) == 1
+    leftovers = [name for _, _, names in os.walk(tmp_path / "blobs") for name in names if name.endswith(".tmp")]
+    assert leftovers == []
+
+
+def test_link_keeps_the_mode(tmp_path):
+    store = BlobStore(path=str(tmp_path / "blobs"))
+    script = tmp_path / "run.sh"
+    script.write_text("#!/bin/sh\n")
+    os.chmod(script, 0o755)
+    data = tmp_path / "in.dat"
+    data.write_text("1 2 3\n")
+    os.chmod(data, 0o644)
+    readonly = tmp_path / "ro.dat"
+    readonly.write_text("1 2 3\n")
+    os.chmod(readonly, 0o444)
+    (tmp_path / "out").mkdir()
+    for src in [script, data, readonly]:
+        dst = tmp_path / "out" / src.name
+        store.link(str(src), str(dst))
+        assert dst.read_text() == src.read_text()
+        assert _mode(dst) == _mode(src)
+    # > the writable copy of a read-only blob is independent of the blob
+    dst = tmp_path / "out" / "w.dat"
+    store.link(str(data), str(dst), writable=True)
+    dst.write_text("changed")
+    assert data.read_text() == "1 2 3\n"
+    assert open(store.blob_path(store.digest(str(data)))).read() == "1 2 3\n"
+
+
+def test_link_shares_the_blob_of_its_mode(tmp_path):
+    store = BlobStore(path=str(tmp_path / "blobs"))
+    (tmp_path / "out").mkdir()
+    srcs = []
+    for i, mode in enumerate([0o644, 0o644, 0o755]):
+        src = tmp_path / f"in{i}"
+        src.write_text("shared input")
+        os.chmod(src, mode)
+        srcs.append(src)
+    dsts = [tmp_path / "out" / src.name for src in srcs]
+    for src, dst in zip(srcs, dsts):
+        store.link(str(src), str(dst))
+        assert _mode(dst) == _mode(src)
+    digest = store.digest(str(srcs[0]))
+    assert digest in store
+    # > one blob per mode, the files of a mode share it (hard links, or reflinks)
+    blobs = sorted(os.listdir(tmp_path / "blobs" / digest[:2]))
+    assert blobs == [f"{digest[2:]}.644", f"{digest[2:]}.755"]
+    if os.stat(dsts[0]).st_nlink > 1:
+        assert os.stat(dsts[0]).st_ino == os.stat(dsts[1]).st_ino == os.stat(store.blob_path(digest, 0o644)).st_ino
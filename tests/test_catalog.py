@@ -0,0 +1,100 @@
+import os
+import sqlite3
+
+from queueg import Catalog, Location
+from queueg._impl.catalog import find_runs
+
+
+
+def _run(path, nbytes):
+    os.makedirs(os.path.join(path, "dat"), exist_ok=True)
+    os.makedirs(os.path.join(path, "etc"), exist_ok=True)
+    with open(os.path.join(path, "dat", "out.dat"), "wb") as f:
+        f.write(b"x" * nbytes)
+
+
+def test_location_from_path(tmp_path):
+    conf = {'index_dir': str(tmp_path)}
+    location = Location.from_path(str(tmp_path / "proj" / "2024" / "5" / "17" / "cavity" / "re100"), explicit_conf=conf)
+    assert location.stemlist == ["proj", "2024", "5", "17", "cavity", "re100"]
+    assert location.get_handle_list() == ["cavity", "re100"]
+    assert location.get_path(explicit_conf=conf) == str(tmp_path / "proj" / "2024" / "5" / "17" / "cavity" / "re100")
+    # > no handle, no datestamp, or outside of the locale
+    assert Location.from_path(str(tmp_path / "proj" / "2024" / "5"), explicit_conf=conf) is None
+    assert Location.from_path(str(tmp_path / "proj" / "cavity"), explicit_conf=conf) is None
+    assert Location.from_path("/elsewhere/proj/2024/cavity", explicit_conf=conf) is None
+
+
+def test_find_runs_nested(tmp_path):
+    _run(str(tmp_path / "p" / "2024" / "h"), 10)
+    # > a run nested in the handle of another, and one in its data directory (ignored)
+    _run(str(tmp_path / "p" / "2024" / "h" / "r1"), 20)
+    _run(str(tmp_path / "p" / "2024" / "h" / "dat" / "run0"), 5)
+    (tmp_path / "p" / "2025" / "g").mkdir(parents=True)
+    (tmp_path / "p" / "2025" / "g" / "resources.json").write_text("{}")
+    runs = find_runs(str(tmp_path))
+    assert runs == {
+        str(tmp_path / "p" / "2024" / "h"): 15,
+        str(tmp_path / "p" / "2024" / "h" / "r1"): 20,
+        str(tmp_path / "p" / "2025" / "g"): 2,
+    }
+
+
+def test_catalog_record_and_query(tmp_path):
+    conf = {'index_dir': str(tmp_path)}
+    catalog = Catalog(path=str(tmp_path / "catalog.sqlite3"))
+    for day, code in [("3", "A1"), ("3", "A2"), ("4", "A2")]:
+        path = str(tmp_path / "p" / "2024" / "5" / day / "cavity")
+        _run(path, 8)
+        location = Location.from_path(path, explicit_conf=conf)
+        catalog.record(location=location, code=code, status="done", path=path, usage={'user': 1.5, 'maxrss': 1024, 'nvcsw': 7, 'nivcsw': 2})
+    runs = catalog.query(handle="cavity", month=5, code="A2")
+    assert sorted([run['day'] for run in runs]) == [3, 4]
+    assert {run['size'] for run in runs} == {8}
+    assert runs[0]['cpu_user'] == 1.5 and runs[0]['maxrss'] == 1024
+    assert runs[0]['nvcsw'] == 7 and runs[0]['nivcsw'] == 2
+    assert len(catalog.query(project="p*")) == 3
+    catalog.remove(str(tmp_path / "p" / "2024" / "5" / "3" / "cavity"))
+    assert len(catalog.query()) == 1
+
+
+def test_catalog_migration(tmp_path, monkeypatch):
+    path = str(tmp_path / "catalog.sqlite3")
+    # > a catalog from before the resource accounting
+    db = sqlite3.connect(path)
+    db.execute(
+        "CREATE TABLE runs (path TEXT NOT NULL, code TEXT NOT NULL DEFAULT '', locale TEXT, project TEXT, "
+        "date TEXT, year INTEGER, month INTEGER, day INTEGER, handle TEXT, runtag TEXT, status TEXT, "
+        "started REAL, duration REAL, size INTEGER, updated REAL, PRIMARY KEY (path, code))"
+    )
+    db.execute("INSERT INTO runs (path, status) VALUES ('/x', 'done')")
+    db.commit()
+    db.close()
+    # > another process adds a column after we have listed the columns
+    class Racing:
+        def __init__(self, db):
+            self.db = db
+        def __getattr__(self, name):
+            return getattr(self.db, name)
+        def __enter__(self):
+            return self.db.__enter__()
+        def __exit__(self, *args):
+            return self.db.__exit__(*args)
+        def execute(self, sql, *args):
+            cursor = self.db.execute(sql, *args)
+            if sql.startswith("PRAGMA"):
+                rows = cursor.fetchall()
+                other = sqlite3.connect(path)
+                other.execute("ALTER TABLE runs ADD COLUMN nvcsw INTEGER")
+                other.commit()
+                other.close()
+                return rows
+            return cursor
+    connect = Catalog._connect
+    monkeypatch.setattr(Catalog, "_connect", lambda self: Racing(connect(self)))
+    Catalog(path=path)
+    monkeypatch.setattr(Catalog, "_connect", connect)
+    catalog = Catalog(path=path)
+    columns = {row[1] for row in sqlite3.connect(path).execute("PRAGMA table_info(runs)")}
+    assert {"cpu_user", "maxrss", "nvcsw", "nivcsw"} <= columns
+    assert catalog.query(status="done")[0]['path'] == "/x"
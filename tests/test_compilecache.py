@@ -0,0 +1,57 @@
+import shutil
+import subprocess
+
+import pytest
+
+from queueg.C.C_impl.compilecache import (
+    CompileCache,
+    parse_depfile,
+)
+
+
+cc = shutil.which("gcc") or shutil.which("cc")
+
+
+
+def test_parse_depfile(tmp_path):
+    text = "m.o: m.c \\\n  a.h sub/b.h\n"
+    assert parse_depfile(text, str(tmp_path)) == sorted([
+        str(tmp_path / "m.c"),
+        str(tmp_path / "a.h"),
+        str(tmp_path / "sub" / "b.h"),
+    ])
+
+
+def test_key(home, tmp_path):
+    cache = CompileCache(path=str(tmp_path / "cc"))
+    (tmp_path / "m.c").write_text("int main(){return 0;}\n")
+    def key(**kwargs):
+        args = dict(compiler_name="cc", source_names=["m.c"], compiler_args=["-O2"],
+                    include_paths=[], library_paths=[], library_handles=[], cwd=str(tmp_path))
+        args.update(kwargs)
+        return cache.key(**args)
+    first = key()
+    assert key() == first
+    assert key(compiler_args=["-O3"]) != first
+    assert key(include_paths=["inc"]) != first
+    assert key(source_names=["missing.c"]) is None
+    (tmp_path / "m.c").write_text("int main(){return 1;}\n")
+    assert key() != first
+
+
+@pytest.mark.skipif(cc is None, reason="no C compiler")
+def test_store_and_lookup_follow_headers(home, tmp_path):
+    cache = CompileCache(path=str(tmp_path / "cc"))
+    (tmp_path / "a.h").write_text("#define X 1\n")
+    (tmp_path / "m.c").write_text('#include "a.h"\nint main(){return X;}\n')
+    args = dict(compiler_name=cc, source_names=["m.c"], compiler_args=[], include_paths=[], cwd=str(tmp_path))
+    key = cache.key(library_paths=[], library_handles=[], **args)
+    target = str(tmp_path / "m")
+    subprocess.run([cc, "m.c", "-o", "m"], cwd=str(tmp_path), check=True)
+    cache.store(key, target, **args)
+    restored = str(tmp_path / "restored")
+    assert cache.lookup(key, restored)
+    assert open(restored, "rb").read() == open(target, "rb").read()
+    # > a changed header misses, with the same first key
+    (tmp_path / "a.h").write_text("#define X 2\n")
+    assert not cache.lookup(key, restored)
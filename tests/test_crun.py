@@ -0,0 +1,98 @@
+import shutil
+
+import pytest
+
+from queueg import (
+    CRun,
+    Location,
+    MPIRun,
+)
+from queueg.C.C_impl.crunbase import CRunBase
+
+
+cc = shutil.which("gcc")
+
+program = """\
+#include <stdio.h>
+int main(int argc, char **argv) {
+    double s = 0.0;
+    for (int i = 0; i < 100000; i++) s += 0.5*i;
+    printf("%f %d\\n", s, argc);
+    return 0;
+}
+"""
+
+
+
+@pytest.fixture
+def case(home, tmp_path, monkeypatch):
+    """
+    A working directory with a small C program, cf. ``m.c``.
+    """
+    path = tmp_path / "case"
+    path.mkdir()
+    (path / "m.c").write_text(program)
+    monkeypatch.chdir(path)
+    return path
+
+
+def _location(handle):
+    return Location(project="p", dateYMD="2024/5/17", handle=handle)
+
+
+@pytest.mark.skipif(cc is None, reason="no C compiler")
+@pytest.mark.parametrize("exec_name", [None, "env"])
+def test_pgo(case, exec_name):
+    # > a launcher given as a string, e.g. "mpirun"
+    run = CRunBase(_location("pgo"), "m.c", compiler_name="gcc", always_compiler_args=["-O2"], exec_name=exec_name)
+    run.start(program_args=["a"], training_args=[])
+    assert run.returncode == 0
+    assert run.training_args == [[]]
+    # > the profile is cached
+    run = CRunBase(_location("pgo2"), "m.c", compiler_name="gcc", always_compiler_args=["-O2"], exec_name=exec_name)
+    run.start(training_args=[["1"], ["2"]])
+    assert run.returncode == 0
+
+
+@pytest.mark.skipif(cc is None, reason="no C compiler")
+def test_pgo_parallel_build(case):
+    run = CRun("m.c", _location("pgo"), parallel_build=2)
+    run.start(training_args=["x"])
+    assert run.returncode == 0
+
+
+def test_pgo_refused_in_batch_mode(case):
+    run = MPIRun("m.c", _location("mpi"), cluster_tasks=(1, 2))
+    with pytest.raises(ValueError):
+        run.start(training_args=[])
+
+
+@pytest.mark.skipif(cc is None, reason="no C compiler")
+def test_autotune(case):
+    run = CRunBase(_location("tune"), "m.c", compiler_name="gcc", always_compiler_args=["-Wall", "-O0"], exec_name="env")
+    winner = run.autotune(program_args=["1"], candidates=[["-O1"], ["-O2"]], repeat=1)
+    assert winner in [["-O1"], ["-O2"]]
+    run = CRun("m.c", _location("tuned"))
+    run.always_compiler_args = ["-Wall", "-O0"]
+    run.start()
+    assert run.tuned_flags == winner
+    # > other arguments: another target, no tuning
+    run.start(compiler_args=["-DX=1"])
+    assert run.tuned_flags is None
+
+
+@pytest.mark.skipif(cc is None, reason="no C compiler")
+def test_no_tuning_no_key(case, monkeypatch):
+    # > with no tuning on this host, start() does not compute the key
+    def key(*args, **kwargs):
+        raise AssertionError("key computed")
+    monkeypatch.setattr("queueg.C.C_impl.autotune.TuningStore.key", staticmethod(key))
+    run = CRun("m.c", _location("plain"))
+    run.start()
+    assert run.returncode == 0 and run.tuned_flags is None
+
+
+def test_autotune_refused_in_batch_mode(case):
+    run = MPIRun("m.c", _location("mpi"), cluster_tasks=(1, 2))
+    with pytest.raises(ValueError):
+        run.autotune()
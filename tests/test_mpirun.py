@@ -0,0 +1,39 @@
+import pytest
+
+from queueg.C.mpirun import (
+    mpi_launcher,
+    scaling_metrics,
+)
+
+
+
+def test_mpi_launcher():
+    assert mpi_launcher(["mpiexec", "-n", "4"], 16) == ["mpiexec", "-n", "16"]
+    assert mpi_launcher(["mpirun", "--oversubscribe", "-np", "2", "--bind-to", "core"], 8) == ["mpirun", "--oversubscribe", "-np", "8", "--bind-to", "core"]
+    assert mpi_launcher(["srun"], 3) == ["srun", "-n", "3"]
+
+
+def test_strong_scaling():
+    rows = [
+        {'n': 1, 'time': None},
+        {'n': 2, 'time': 8.0},
+        {'n': 4, 'time': 5.0},
+        {'n': 8, 'time': 2.0},
+    ]
+    done = scaling_metrics(rows, weak=False)
+    assert [row['n'] for row in done] == [2, 4, 8]
+    # > relative to the first configuration that ran
+    assert rows[0]['speedup'] is None and rows[0]['efficiency'] is None
+    assert [row['speedup'] for row in done] == pytest.approx([1.0, 1.6, 4.0])
+    assert [row['efficiency'] for row in done] == pytest.approx([1.0, 0.8, 1.0])
+
+
+def test_weak_scaling():
+    rows = [
+        {'n': 1, 'time': 2.0},
+        {'n': 4, 'time': 2.5},
+    ]
+    scaling_metrics(rows, weak=True)
+    assert rows[1]['efficiency'] == pytest.approx(0.8)
+    assert rows[1]['speedup'] == pytest.approx(3.2)
+    assert scaling_metrics([{'n': 1, 'time': None}], weak=True) == []
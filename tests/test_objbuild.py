@@ -0,0 +1,84 @@
+import os
+import shutil
+import time
+
+import pytest
+
+from queueg.C.C_impl.objbuild import (
+    compile_objects,
+    object_name,
+    stale,
+)
+
+
+cc = shutil.which("gcc") or shutil.which("cc")
+
+
+
+def test_object_name_is_injective():
+    names = ["foo.c", "foo.cpp", "a/b.c", "a__b.c", "a_b.c", "../x.c", "__/x.c", "a%2Fb.c"]
+    objects = [object_name(name) for name in names]
+    assert len(set(objects)) == len(names)
+    assert all(['/' not in obj and obj.endswith(".o") for obj in objects])
+
+
+def test_stale(tmp_path):
+    obj = tmp_path / "m.c.o"
+    dep = tmp_path / "m.c.d"
+    (tmp_path / "m.c").write_text("")
+    (tmp_path / "a.h").write_text("")
+    assert stale(str(obj), str(dep), str(tmp_path))
+    obj.write_text("")
+    dep.write_text("m.c.o: m.c a.h\n")
+    os.utime(tmp_path / "m.c", (1000, 1000))
+    os.utime(tmp_path / "a.h", (1000, 1000))
+    os.utime(obj, (2000, 2000))
+    assert not stale(str(obj), str(dep), str(tmp_path))
+    # > equal times count as older
+    os.utime(tmp_path / "a.h", (2000, 2000))
+    assert stale(str(obj), str(dep), str(tmp_path))
+    os.remove(tmp_path / "a.h")
+    assert stale(str(obj), str(dep), str(tmp_path))
+
+
+@pytest.mark.skipif(cc is None, reason="no C compiler")
+def test_compile_objects_reuses_objects(home, tmp_path):
+    src = tmp_path / "src"
+    src.mkdir()
+    (src / "sub").mkdir()
+    (src / "common.h").write_text("#define N 1\n")
+    names = ["a.c", "b.c", "sub/b.c", "sub__b.c"]
+    for i, name in enumerate(names):
+        (src / name).write_text(f'#include "{"../" if "/" in name else ""}common.h"\nint f{i}(void){{return N;}}\n')
+    def build():
+        return compile_objects(cc, names, ["-O0"], [], str(src), max_workers=2)
+    objects, results = build()
+    assert len(set(objects)) == 4
+    assert sorted([r[0] for r in results]) == sorted(names)
+    assert all([r[1] == 0 for r in results])
+    assert all([os.path.isfile(obj) for obj in objects])
+    assert not [name for name in os.listdir(os.path.dirname(objects[0])) if name.endswith(".tmp")]
+    _, results = build()
+    assert results == []
+    # > one source changed: one object rebuilt
+    time.sleep(0.01)
+    (src / "b.c").write_text('#include "common.h"\nint g(void){return N;}\n')
+    _, results = build()
+    assert [r[0] for r in results] == ["b.c"]
+    # > the shared header changed: every object rebuilt
+    time.sleep(0.01)
+    (src / "common.h").write_text("#define N 2\n")
+    _, results = build()
+    assert sorted([r[0] for r in results]) == sorted(names)
+    # > other flags, other objects
+    other, _ = compile_objects(cc, names, ["-O1"], [], str(src))
+    assert set(other).isdisjoint(objects)
+
+
+@pytest.mark.skipif(cc is None, reason="no C compiler")
+def test_failed_compilation_leaves_no_object(home, tmp_path):
+    (tmp_path / "bad.c").write_text("int f(void){return}\n")
+    objects, results = compile_objects(cc, ["bad.c"], [], [], str(tmp_path))
+    assert results[0][1] != 0
+    assert not os.path.exists(objects[0])
+    assert os.listdir(os.path.dirname(objects[0])) == []
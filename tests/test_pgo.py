@@ -0,0 +1,47 @@
+import shutil
+
+import pytest
+
+from queueg.C.C_impl.compilecache import CompileCache
+from queueg.C.C_impl.pgo import (
+    profile_dir,
+    profile_files,
+)
+
+
+cc = shutil.which("gcc") or shutil.which("cc")
+
+
+
+@pytest.mark.skipif(cc is None, reason="no C compiler")
+def test_profile_dir(home, tmp_path):
+    (tmp_path / "lib").mkdir()
+    (tmp_path / "lib" / "libfoo.a").write_bytes(b"1")
+    (tmp_path / "a.h").write_text("#define N 1\n")
+    (tmp_path / "m.c").write_text('#include "a.h"\nint main(void){return N;}\n')
+    def key(training_args = None):
+        return profile_dir(cc, ["m.c"], ["-O2"], [], ["lib"], ["foo"], training_args or [[]], [], str(tmp_path))
+    first = key()
+    assert key() == first
+    assert key([["-n", "1"]]) != first
+    # > a header, or a library linked against, changed
+    (tmp_path / "a.h").write_text("#define N 2\n")
+    second = key()
+    assert second != first
+    (tmp_path / "lib" / "libfoo.a").write_bytes(b"2")
+    assert key() not in [first, second]
+    assert profile_dir(cc, ["missing.c"], [], [], [], [], [[]], [], str(tmp_path)) is None
+
+
+def test_profile_data_in_compile_key(tmp_path):
+    (tmp_path / "m.c").write_text("int main(void){return 0;}\n")
+    data = tmp_path / "data" / "tmp" / "obj"
+    data.mkdir(parents=True)
+    (data / "m.gcda").write_bytes(b"a")
+    cache = CompileCache(path=str(tmp_path / "cc"))
+    def key():
+        return cache.key("gcc", ["m.c"], ["-fprofile-use=data"], [], [], [], str(tmp_path), extra_files=profile_files(str(tmp_path / "data")))
+    assert profile_files(str(tmp_path / "data")) == [str(data / "m.gcda")]
+    first = key()
+    (data / "m.gcda").write_bytes(b"b")
+    assert key() != first
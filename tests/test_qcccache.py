@@ -0,0 +1,47 @@
+import os
+import shutil
+
+import pytest
+
+from queueg.C.C_impl.qcccache import QccCache
+
+
+cpp = shutil.which("cpp")
+
+
+
+@pytest.mark.skipif(cpp is None, reason="no C preprocessor")
+def test_key_follows_included_headers(tmp_path, monkeypatch):
+    basilisk = tmp_path / "basilisk"
+    (basilisk / "grid").mkdir(parents=True)
+    (basilisk / "grid" / "quadtree.h").write_text("// grid\n")
+    monkeypatch.setenv("BASILISK", str(basilisk))
+    case = tmp_path / "case"
+    (case / "inc").mkdir(parents=True)
+    (case / "inc" / "params.h").write_text("#define L 1\n")
+    (case / "cavity.c").write_text('#include "grid/quadtree.h"\n#include "inc/params.h"\nint main() { return L; }\n')
+    cache = QccCache(path=str(tmp_path / "qcc"))
+    def key():
+        return cache.key("cavity.c", ["-source", "-O3", "-D_MPI=1"], [], str(case))
+    first = key()
+    assert key() == first
+    # > a header in a subdirectory, not next to the script
+    (case / "inc" / "params.h").write_text("#define L 2\n")
+    second = key()
+    assert second != first
+    # > the Basilisk tree rebuilt during the session
+    (basilisk / "grid" / "quadtree.h").write_text("// grid, rebuilt\n")
+    os.utime(basilisk / "grid" / "quadtree.h", (1, 1))
+    assert key() not in [first, second]
+    assert cache.key("missing.c", [], [], str(case)) is None
+
+
+def test_store_and_lookup(tmp_path):
+    cache = QccCache(path=str(tmp_path / "qcc"))
+    (tmp_path / "_cavity.c").write_text("int main() { return 0; }\n")
+    key = "ab" + "0" * 62
+    assert not cache.lookup(key, str(tmp_path / "out.c"))
+    cache.store(key, str(tmp_path / "_cavity.c"))
+    assert cache.lookup(key, str(tmp_path / "out.c"))
+    assert (tmp_path / "out.c").read_text() == "int main() { return 0; }\n"
+    assert os.listdir(tmp_path / "qcc" / "ab") == ["0" * 62 + ".c"]
@@ -0,0 +1,110 @@
+import datetime
+import os
+
+import pytest
+
+from queueg import Catalog, Conf, Location, Retention
+
+
+
+def _run(path, nbytes = 10):
+    for stem in ["dat", "etc"]:
+        os.makedirs(os.path.join(path, stem), exist_ok=True)
+    with open(os.path.join(path, "dat", "out.dat"), "wb") as f:
+        f.write(b"x" * nbytes)
+    with open(os.path.join(path, "etc", "log.txt"), "wb") as f:
+        f.write(b"y" * nbytes)
+    return path
+
+
+@pytest.fixture
+def index(home):
+    return Conf.cached()['index_dir']
+
+
+def _day(days_ago):
+    date = datetime.date.today() - datetime.timedelta(days=days_ago)
+    return [str(date.year), str(date.month), str(date.day)]
+
+
+def _path(index, project, days_ago, handle):
+    return os.path.join(index, project, *_day(days_ago), handle)
+
+
+
+def test_keep_last_per_handle(index):
+    paths = [_run(_path(index, "p", days, "h")) for days in [1, 2, 3, 4]]
+    other = _run(_path(index, "p", 100, "g"))
+    catalog = Catalog()
+    report = Retention(keep_last=2, catalog=catalog).apply(dry_run=True)
+    assert sorted(report.removed) == sorted(paths[2:])
+    assert report.nbytes == 2*20
+    assert all([os.path.isdir(path) for path in paths])
+    report = Retention(keep_last=2, catalog=catalog).apply()
+    assert [os.path.isdir(path) for path in paths] == [True, True, False, False]
+    assert os.path.isdir(other)
+
+
+def test_keep_days_and_prune(index):
+    young = _run(_path(index, "p", 1, "h"))
+    old = _run(_path(index, "p", 40, "g"))
+    report = Retention(keep_days=60, prune={'dat': 30}).apply()
+    assert report.removed == []
+    assert report.pruned == [os.path.join(old, "dat")]
+    assert os.path.isdir(os.path.join(young, "dat"))
+    assert not os.path.isdir(os.path.join(old, "dat"))
+    assert os.path.isdir(os.path.join(old, "etc"))
+
+
+def test_quota_removes_oldest_first(index):
+    paths = [_run(_path(index, "p", days, f"h{days}")) for days in [10, 20, 30]]
+    report = Retention(keep_days=5, quota=45).apply()
+    assert report.removed == [paths[2]]
+    assert [os.path.isdir(path) for path in paths] == [True, True, False]
+
+
+def test_runs_unknown_to_the_catalog_and_conditions(index):
+    a = _run(_path(index, "p", 50, "h"))
+    b = _run(_path(index, "q", 50, "h"))
+    report = Retention(keep_days=7).apply(dry_run=True, project="q")
+    assert report.removed == [b]
+    report = Retention(keep_days=7).apply(dry_run=True, handle="h*")
+    assert sorted(report.removed) == sorted([a, b])
+    with pytest.raises(ValueError):
+        Retention(keep_days=7).apply(dry_run=True, colour="red")
+
+
+def test_nested_kept_run_protects_its_parent(index):
+    parent = _run(_path(index, "p", 50, "h"))
+    child = _run(os.path.join(parent, "r1"))
+    newer = _run(_path(index, "p", 1, "h"))
+    # > the parent is not among the newest runs of its handle,
+    #   but the run nested in it is the newest of its own
+    report = Retention(keep_last=1).apply()
+    assert report.removed == []
+    assert os.path.isdir(child)
+    # > without a keep policy protecting the child, both go, counted once
+    report = Retention(keep_days=7).apply(dry_run=True)
+    assert sorted(report.removed) == sorted([parent, child])
+    assert report.nbytes == 40
+    assert report.kept == [newer]
+
+
+def test_numeric_stems_that_are_not_a_date(index):
+    path = _run(os.path.join(index, "p", "2024", "42", "h"))
+    report = Retention(keep_days=7).apply(dry_run=True)
+    # > month 42: the age is the last modification, so the run is young
+    assert report.removed == []
+    assert report.kept == [path]
+
+
+def test_catalog_describes_known_runs(index):
+    a = _run(_path(index, "p", 50, "h"))
+    b = _run(_path(index, "p", 51, "h"))
+    catalog = Catalog()
+    catalog.record(location=Location.from_path(a), code="A1", status="done", path=a)
+    report = Retention(keep_days=7, catalog=catalog).apply(dry_run=True, code="A1")
+    assert report.removed == [a]
+    report = Retention(keep_days=7, catalog=catalog).apply()
+    assert sorted(report.removed) == sorted([a, b])
+    assert catalog.query() == []
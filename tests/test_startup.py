@@ -0,0 +1,34 @@
+import subprocess
+import sys
+
+import pytest
+
+from queueg._impl.startup import (
+    check_startup,
+    heavy_modules,
+    startup_budget,
+    startup_time,
+)
+
+
+
+def test_startup_budget():
+    seconds, loaded = startup_time(repeat=3)
+    assert loaded == []
+    assert not set(loaded) & set(heavy_modules)
+    assert seconds <= startup_budget
+    assert check_startup(repeat=3) <= startup_budget
+
+
+def test_check_startup_raises_on_heavy_import():
+    with pytest.raises(RuntimeError):
+        check_startup(module="queueg._impl.syncplan", repeat=1)
+
+
+@pytest.mark.parametrize("name", ["C", "Cpp", "Python", "PyPinnch", "experiment"])
+def test_subpackages(name):
+    # > in a fresh interpreter, so that the subpackage is not imported already
+    code = f"import queueg, types; assert isinstance(queueg.{name}, types.ModuleType)"
+    cp = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True)
+    # > (or it imports a dependency that is not installed)
+    assert cp.returncode == 0 or "No module named" in cp.stderr, cp.stderr
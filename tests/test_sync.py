@@ -0,0 +1,228 @@
+import os
+import json
+import shutil
+
+import pytest
+
+from queueg import Sync
+
+
+
+def _carry_out(sync, plan):
+    """
+    Carry out a twoway plan on two local trees, as Sync.twoway would:
+    copy the created and updated files, keeping their timestamps,
+    then record the new base.
+    """
+    for leg in plan.legs:
+        for src, _, tgt, _, _ in leg.created + leg.updated:
+            os.makedirs(os.path.dirname(tgt), exist_ok=True)
+            shutil.copy2(src, tgt)
+    base_path, files = plan.base
+    sync._write_base(base_path, plan.legs[0].tgt_path, plan.legs[0].src_path, files)
+
+
+def _plan(sync, local, remote):
+    legs, conflicts, base = sync._plan_twoway(local_path=str(local), remote_path=str(remote), pass_dirs=[])
+    plan = type("Plan", (), {})()
+    plan.legs, plan.conflicts, plan.base = legs, conflicts, base
+    return plan
+
+
+def _names(candidates):
+    return sorted([os.path.basename(c[0]) for c in candidates])
+
+
+def _touch(path, text, age):
+    path.write_text(text)
+    os.utime(path, (age, age))
+
+
+
+def test_twoway_first_sync_keeps_youngest(home, tmp_path):
+    local = tmp_path / "local"
+    remote = tmp_path / "remote"
+    local.mkdir()
+    remote.mkdir()
+    _touch(local / "a", "old", 1000)
+    _touch(remote / "a", "new", 2000)
+    _touch(local / "b", "b", 1000)
+    _touch(remote / "c", "c", 1000)
+    sync = Sync("loopback")
+    pull, push = _plan(sync, local, remote).legs
+    assert _names(pull.updated) == ["a"]
+    assert _names(pull.created) == ["c"]
+    assert _names(push.created) == ["b"]
+    assert push.updated == []
+
+
+def test_twoway_classifies_against_base(home, tmp_path):
+    local = tmp_path / "local"
+    remote = tmp_path / "remote"
+    local.mkdir()
+    remote.mkdir()
+    for name in ["a", "b", "c"]:
+        _touch(local / name, name, 1000)
+        _touch(remote / name, name, 1000)
+    sync = Sync("loopback")
+    _carry_out(sync, _plan(sync, local, remote))
+    # > a changed locally, b remotely, c on both sides
+    _touch(local / "a", "a2", 3000)
+    _touch(remote / "b", "b2", 3000)
+    _touch(local / "c", "c2", 2000)
+    _touch(remote / "c", "c3", 4000)
+    plan = _plan(sync, local, remote)
+    pull, push = plan.legs
+    assert _names(push.updated) == ["a"]
+    assert _names(pull.updated) == ["b", "c"]
+    assert plan.conflicts == ["c"]
+
+
+def test_twoway_deletion_is_not_resurrected(home, tmp_path):
+    local = tmp_path / "local"
+    remote = tmp_path / "remote"
+    local.mkdir()
+    remote.mkdir()
+    _touch(local / "x", "x", 1000)
+    _touch(remote / "y", "y", 1000)
+    sync = Sync("loopback")
+    # > first sync: both files on both systems
+    _carry_out(sync, _plan(sync, local, remote))
+    assert sorted(os.listdir(local)) == ["x", "y"]
+    assert sorted(os.listdir(remote)) == ["x", "y"]
+    # > delete on each side, then sync twice
+    os.remove(local / "y")
+    os.remove(remote / "x")
+    for _ in range(2):
+        plan = _plan(sync, local, remote)
+        pull, push = plan.legs
+        assert pull.created == [] and pull.updated == []
+        assert push.created == [] and push.updated == []
+        assert _names(pull.leftalone) == ["x", "y"]
+        _carry_out(sync, plan)
+    assert os.listdir(local) == ["x"]
+    assert os.listdir(remote) == ["y"]
+
+
+def _remote(monkeypatch, **kwargs):
+    """
+    A Sync to a remote target, without connecting.
+    """
+    monkeypatch.setattr(Sync, "init", lambda self: None)
+    return Sync("user@host", password="x", bare=True, **kwargs)
+
+
+def _leg(tmp_path, n):
+    from queueg._impl.syncplan import SyncLeg
+    candidates = []
+    for i in range(n):
+        path = tmp_path / f"f{i}.txt"
+        path.write_text("compressible " * 1000)
+        candidates.append((str(path), 1000, f"/remote/f{i}.txt", None, path.stat().st_size))
+    return SyncLeg(pull=False, tgt_dirs=[], created=candidates, updated=[], leftalone=[])
+
+
+def test_stored_link_profile_decides(home, tmp_path, monkeypatch):
+    cache = home / ".config" / "QueueG" / "sync" / "user--host"
+    cache.mkdir(parents=True)
+    # > a slow link with a high latency, and data that compress well
+    profile = {'latency': 0.1, 'get': 1e5, 'put': 1e5, 'ratio': 0.1, 'zlib': 1e8}
+    (cache / "link.json").write_text(json.dumps(profile))
+    measured = []
+    monkeypatch.setattr(Sync, "measure_link", lambda self, **kwargs: measured.append(1))
+    sync = _remote(monkeypatch)
+    assert sync.link == profile
+    # > the transport compresses, from the stored profile
+    assert sync.compress is True
+    leg = _leg(tmp_path, 20)
+    assert sync._use_bulk(leg)
+    # > per-transfer compression, when the transport does not compress
+    sync = _remote(monkeypatch, compress=False)
+    assert sync._use_bulk(leg)
+    assert sync._use_compression(leg)
+    assert measured == []
+    stored = json.loads((cache / "link.json").read_text())
+    assert stored['ratio'] < 0.1 and stored['latency'] == 0.1
+
+
+def test_link_measured_once_without_profile(home, tmp_path, monkeypatch):
+    def measure_link(self, **kwargs):
+        if self.link is None:
+            self.link = {'latency': 0.1, 'get': 1e5, 'put': 1e5}
+        return self.link
+    monkeypatch.setattr(Sync, "measure_link", measure_link)
+    sync = _remote(monkeypatch, compress=False)
+    assert sync.link is None and sync.compress is False
+    assert sync._use_bulk(_leg(tmp_path, 20))
+    assert sync.link['latency'] == 0.1
+
+
+def _blob_sync(monkeypatch, tmp_path):
+    """
+    A Sync whose remote system is a local directory.
+    """
+    sync = _remote(monkeypatch)
+    monkeypatch.setattr(sync, "ssh", lambda command, strip = False: Sync.ssh(sync, command, strip=strip, loopback=True))
+    monkeypatch.setattr(sync, "_scan", lambda path, pass_dirs: Sync._scan(sync, path, pass_dirs, loopback=True))
+    sync.rconf = {'inventory_dir': str(tmp_path / "remote_inventory")}
+    return sync
+
+
+def test_push_places_blobs_from_the_remote_store(home, tmp_path, monkeypatch):
+    from queueg import BlobStore
+    from queueg._impl.syncplan import SyncLeg
+    sync = _blob_sync(monkeypatch, tmp_path)
+    (tmp_path / "src").mkdir()
+    (tmp_path / "tgt").mkdir()
+    shared = tmp_path / "src" / "shared.dat"
+    shared.write_text("shared input")
+    os.chmod(shared, 0o755)
+    other = tmp_path / "src" / "other.dat"
+    other.write_text("other input!")
+    BlobStore().put(str(shared))
+    BlobStore(path=sync._remote_blob_path()).put(str(shared))
+    candidates = [(str(path), 1000, str(tmp_path / "tgt" / path.name), None, path.stat().st_size) for path in [shared, other]]
+    leg = SyncLeg(pull=False, tgt_dirs=[], created=candidates, updated=[], leftalone=[])
+    assert sync._place_blobs(leg) == {str(shared)}
+    assert (tmp_path / "tgt" / "shared.dat").read_text() == "shared input"
+    assert os.stat(tmp_path / "tgt" / "shared.dat").st_mode & 0o777 == 0o755
+    assert not (tmp_path / "tgt" / "other.dat").exists()
+
+
+@pytest.mark.skipif(shutil.which("sha256sum") is None, reason="no sha256sum")
+def test_pull_places_blobs_from_the_local_store(home, tmp_path, monkeypatch):
+    from queueg import BlobStore
+    from queueg._impl.syncplan import SyncLeg
+    sync = _blob_sync(monkeypatch, tmp_path)
+    (tmp_path / "remote").mkdir()
+    (tmp_path / "local").mkdir()
+    shared = tmp_path / "remote" / "shared dat"
+    shared.write_text("shared input")
+    other = tmp_path / "remote" / "other.dat"
+    other.write_text("other input!")
+    BlobStore().put(str(shared), 0o644)
+    candidates = [(str(path), 1000, str(tmp_path / "local" / path.name), None, path.stat().st_size) for path in [shared, other]]
+    leg = SyncLeg(pull=True, tgt_dirs=[], created=candidates, updated=[], leftalone=[])
+    assert sync._place_blobs(leg) == {str(shared)}
+    assert (tmp_path / "local" / "shared dat").read_text() == "shared input"
+    assert not (tmp_path / "local" / "other.dat").exists()
+
+
+def test_push_target_ages_from_one_scan(home, tmp_path, monkeypatch):
+    sync = _blob_sync(monkeypatch, tmp_path)
+    commands = []
+    monkeypatch.setattr(sync, "ssh", lambda command, strip = False: commands.append(command))
+    scanned = []
+    monkeypatch.setattr(sync, "_scan", lambda path, pass_dirs, loopback = False: scanned.append((path, loopback)) or Sync._scan(sync, path, pass_dirs, loopback=True))
+    (tmp_path / "src" / "sub").mkdir(parents=True)
+    (tmp_path / "tgt").mkdir()
+    for rel in ["a.txt", "sub/b.txt", "sub/c.txt"]:
+        (tmp_path / "src" / rel).write_text(rel)
+    (tmp_path / "tgt" / "a.txt").write_text("a.txt")
+    os.utime(tmp_path / "tgt" / "a.txt", (1000, 1000))
+    candidates = sync.get_candidates_local(str(tmp_path / "src"), str(tmp_path / "tgt"), [], tgt_dirs=[])
+    assert commands == []
+    # > the local source, then the remote target, each in one scan
+    assert scanned == [(str(tmp_path / "src"), True), (str(tmp_path / "tgt"), False)]
+    ages2 = {os.path.relpath(path2, tmp_path / "tgt"): age2 for _, _, path2, age2, _ in candidates}
+    assert ages2 == {"a.txt": 1000, os.path.join("sub", "b.txt"): 0, os.path.join("sub", "c.txt"): 0}
@@ -0,0 +1,85 @@
+import pytest
+
+from queueg._impl.syncplan import (
+    CandidateTable,
+    SyncLeg,
+    SyncPlan,
+    compression_pays,
+    estimate_durations,
+    pp_bytes,
+)
+
+
+
+def _table():
+    return CandidateTable(
+        src_root="/src",
+        tgt_root="/tgt",
+        rels=["a", "d/b", "d/c", "d/e/f"],
+        age1=[10, 20, 30, 40],
+        size1=[1, 2, 3, 4],
+        age2=[0, 25, 10, 40],
+    )
+
+
+
+def test_candidate_table_rows():
+    table = _table()
+    assert len(table) == 4
+    assert table.dirs == ["", "d", "d/e"]
+    assert table[1] == ("/src/d/b", 20, "/tgt/d/b", 25, 2)
+    assert [row[0] for row in table[1:3]] == ["/src/d/b", "/src/d/c"]
+    assert [table.rel(i) for i in range(4)] == ["a", "d/b", "d/c", "d/e/f"]
+
+
+def test_candidate_table_decide():
+    updated, leftalone, created = _table().decide()
+    assert [row[0] for row in created] == ["/src/a"]
+    assert [row[0] for row in updated] == ["/src/d/c"]
+    assert [row[0] for row in leftalone] == ["/src/d/b", "/src/d/e/f"]
+    # > sub-tables share the prefix table, and concatenate
+    both = created + updated
+    assert [row[4] for row in both] == [1, 3]
+    with pytest.raises(ValueError):
+        both + _table()
+
+
+def test_sync_plan_totals():
+    updated, leftalone, created = _table().decide()
+    leg = SyncLeg(pull=True, tgt_dirs=[], created=created, updated=updated, leftalone=leftalone)
+    link = {'latency': 0.5, 'get': 2.0, 'put': 1.0}
+    plan = SyncPlan(legs=[leg], link=link)
+    assert plan.nfiles == 2
+    assert plan.nbytes == 4
+    assert plan.histogram["< 4 KiB"] == 2
+    per_file, bulk = estimate_durations(leg, link)
+    assert bulk == pytest.approx(4/2.0 + 0.5)
+    assert per_file == pytest.approx(4/2.0 + 2*4*0.5)
+    assert plan.duration == pytest.approx(per_file)
+
+
+def test_sync_plan_list_legs():
+    leg = SyncLeg(
+        pull=False,
+        tgt_dirs=[],
+        created=[("/a", 1, "/b", 0, 1 << 20)],
+        updated=[],
+        leftalone=[("/c", 1, "/d", 1, 5)],
+    )
+    plan = SyncPlan(legs=[leg])
+    assert plan.nfiles == 1
+    assert plan.histogram["1 MiB - 16 MiB"] == 1
+    assert plan.duration is None
+
+
+def test_compression_pays():
+    # > a slow link: compressing by half at 100 MB/s pays
+    assert compression_pays(0.5, 100e6, 1e6)
+    # > a fast link, or incompressible data: it does not
+    assert not compression_pays(0.5, 100e6, 1e9)
+    assert not compression_pays(1.0, 100e6, 1e6)
+
+
+def test_pp_bytes():
+    assert pp_bytes(512) == "512 B"
+    assert pp_bytes(3 << 20) == "3.0 MiB"